@@ -0,0 +1,162 @@
+import collections
+import http.server
+import json
+import socketserver
+import threading
+import time
+import urllib.parse
+
+
+class FakeVaultServer(object):
+    """A local, in-memory stand-in for Vault's KV HTTP API
+
+    Serves reads (GET), lists (LIST, or GET with ?list=true) and writes (PUT
+    or POST) under /v1/, like a Vault server with a KV secrets engine
+    mounted at /secret. With kv_version=2, secrets are served at the
+    /secret/data/... and /secret/metadata/... endpoints instead, and every
+    write increments the secret's version. Any token is accepted.
+
+    Each request waits latency seconds before responding, to simulate a
+    remote Vault.
+
+    Attributes:
+        secrets: dict mapping paths (e.g., /secret/landscape/clouds/minikube)
+            to data dicts
+        versions: dict mapping paths to their version (int)
+        latency: Seconds each request waits
+        kv_version: KV secrets engine version, 1 or 2
+        request_counts: Counter of requests by operation (read, list,
+            metadata, write)
+        url: The server's address, for VAULT_ADDR
+    """
+
+    def __init__(self, latency=0.0, kv_version=1, port=0):
+        self.secrets = {}
+        self.versions = {}
+        self.latency = latency
+        self.kv_version = kv_version
+        self.request_counts = collections.Counter()
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(('127.0.0.1', port), _FakeVaultHandler)
+        self._server.fake_vault = self
+        self._thread = None
+
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}'.format(self._server.server_address[1])
+
+
+    def start(self):
+        """Serves requests on a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+    def write(self, vault_path, data):
+        """Stores data at a (KV version 1 style) path, as a Vault write"""
+        vault_path = '/' + vault_path.strip('/')
+        with self._lock:
+            self.secrets[vault_path] = dict(data)
+            self.versions[vault_path] = self.versions.get(vault_path, 0) + 1
+
+
+    def reset_counts(self):
+        """Zeroes request_counts, and returns what they were"""
+        with self._lock:
+            counts = dict(self.request_counts)
+            self.request_counts.clear()
+        return counts
+
+
+    def handle(self, method, raw_path, body):
+        """Serves a request
+
+        Returns:
+            A tuple of (HTTP status, response dict or None)
+        """
+        time.sleep(self.latency)
+        url = urllib.parse.urlparse(raw_path)
+        query = urllib.parse.parse_qs(url.query)
+        path = '/' + '/'.join([p for p in url.path.split('/') if p][1:])
+        is_list = method == 'LIST' or query.get('list', [''])[0].lower() == 'true'
+        endpoint = None
+        if self.kv_version == 2:
+            mount, _, endpoint_path = path.lstrip('/').partition('/')
+            endpoint, _, secret_path = endpoint_path.partition('/')
+            path = '/{0}/{1}'.format(mount, secret_path).rstrip('/')
+        if is_list:
+            operation = 'list'
+        elif method in ('PUT', 'POST'):
+            operation = 'write'
+        elif endpoint == 'metadata':
+            operation = 'metadata'
+        else:
+            operation = 'read'
+        with self._lock:
+            self.request_counts[operation] += 1
+
+        if operation == 'write':
+            data = json.loads(body or '{}')
+            if self.kv_version == 2:
+                data = data.get('data', {})
+            self.write(path, data)
+            return 204, None
+        with self._lock:
+            if operation == 'list':
+                return self._list(path)
+            if path not in self.secrets:
+                return 404, {'errors': []}
+            data = dict(self.secrets[path])
+            version = self.versions[path]
+        if operation == 'metadata':
+            return 200, {'data': {'current_version': version,
+                                  'versions': {str(version): {}}}}
+        if self.kv_version == 2:
+            return 200, {'data': {'data': data,
+                                  'metadata': {'version': version}}}
+        return 200, {'data': data}
+
+
+    def _list(self, path):
+        prefix = path.rstrip('/') + '/'
+        keys = set()
+        for secret_path in self.secrets:
+            if secret_path.startswith(prefix):
+                subkey, slash, _ = secret_path[len(prefix):].partition('/')
+                keys.add(subkey + slash)
+        if not keys:
+            return 404, {'errors': []}
+        return 200, {'data': {'keys': sorted(keys)}}
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class _FakeVaultHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else None
+        status, response = self.server.fake_vault.handle(self.command,
+                                                         self.path, body)
+        payload = json.dumps(response).encode('utf-8') if response is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_PUT = do_POST = do_LIST = _respond
+
+    def log_message(self, format, *args):
+        pass
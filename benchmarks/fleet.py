@@ -0,0 +1,80 @@
+import os
+
+import yaml
+
+
+def generate_fleet(fake_vault, landscaper_dir, clouds=3, clusters=30,
+                   namespaces=20, charts_per_namespace=50, secrets_every=4,
+                   git_branch='master'):
+    """Generates a synthetic inventory and Landscaper repository
+
+    Clouds (unmanaged) and clusters are written to fake_vault, clusters
+    spread round-robin across clouds and all subscribed to git_branch.
+    Every namespace gets charts_per_namespace Landscaper YAML files in
+    landscaper_dir/all, and every secrets_every'th chart reads a secret
+    from Vault.
+
+    Args:
+        fake_vault: FakeVaultServer to write clouds, clusters and chart
+            secrets to
+        landscaper_dir: Directory to write Landscaper YAML to
+        clouds: Number of clouds
+        clusters: Number of clusters
+        namespaces: Number of namespaces
+        charts_per_namespace: Number of charts in each namespace
+        secrets_every: Every n'th chart has secrets (0 for none)
+        git_branch: Landscaper branch the clusters subscribe to
+
+    Returns:
+        A dict describing the fleet: counts of clouds, clusters, charts
+        and secrets, and the name of the first cluster
+    """
+    cloud_names = ['cloud-{0:04d}'.format(i) for i in range(clouds)]
+    for cloud_name in cloud_names:
+        fake_vault.write('/secret/landscape/clouds/' + cloud_name,
+                         {'provisioner': 'unmanaged'})
+    cluster_names = ['cluster-{0:05d}'.format(i) for i in range(clusters)]
+    for i, cluster_name in enumerate(cluster_names):
+        fake_vault.write('/secret/landscape/clusters/' + cluster_name,
+                         {'cloud_id': cloud_names[i % clouds],
+                          'landscaper_branch': git_branch,
+                          'kubernetes_apiserver': 'https://{0}.example.com'.format(cluster_name),
+                          'kubernetes_client_key': 'client-key',
+                          'kubernetes_client_certificate': 'client-certificate',
+                          'kubernetes_apiserver_cacert': 'apiserver-ca'})
+
+    charts = 0
+    secrets = 0
+    for n in range(namespaces):
+        namespace = 'ns-{0:03d}'.format(n)
+        namespace_dir = os.path.join(landscaper_dir, 'all', namespace)
+        if not os.path.exists(namespace_dir):
+            os.makedirs(namespace_dir)
+        for c in range(charts_per_namespace):
+            chart_name = 'chart-{0:04d}'.format(c)
+            chart_info = {
+                'name': chart_name,
+                'namespace': namespace,
+                'release': {'chart': 'stable/{0}:1.0.{1}'.format(chart_name, c),
+                            'version': '2.{0}.0'.format(c)},
+                'configuration': {'replicaCount': 1 + c % 3,
+                                  'image': {'tag': 'v{0}'.format(c)}},
+            }
+            if secrets_every and c % secrets_every == 0:
+                secret_key = chart_name + '-password'
+                chart_info['secrets'] = [secret_key]
+                fake_vault.write('/secret/landscape/charts/{0}/{1}/{2}'.format(
+                                     git_branch, namespace, chart_name),
+                                 {secret_key: 'secret-{0}-{1}'.format(n, c)})
+                secrets += 1
+            with open(os.path.join(namespace_dir, chart_name + '.yaml'), 'w') as f:
+                yaml.safe_dump(chart_info, f, default_flow_style=False)
+            charts += 1
+    return {
+        'clouds': clouds,
+        'clusters': clusters,
+        'namespaces': namespaces,
+        'charts': charts,
+        'chart_secrets': secrets,
+        'first_cluster': cluster_names[0],
+    }
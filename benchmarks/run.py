@@ -0,0 +1,240 @@
+#! /usr/bin/env python3
+
+"""
+Times landscape commands against a fake Vault and a synthetic fleet
+
+Run from the repository root with python -m benchmarks.run [options]
+
+Usage: run.py [options]
+
+Options:
+    --clouds=<n>                 Clouds in the fleet [default: 3].
+    --clusters=<n>               Clusters in the fleet [default: 30].
+    --namespaces=<n>             Namespaces per cluster [default: 20].
+    --charts-per-namespace=<n>   Landscaper YAML files per namespace [default: 50].
+    --secrets-every=<n>          Every <n>th chart reads Vault secrets [default: 4].
+    --latency=<seconds>          Fake Vault response time [default: 0.002].
+    --shim-latency=<seconds>     Time each fake kubectl, helm, terraform, ...
+                                 command takes [default: 0.05].
+    --shim-rules=<path>          JSON list of extra rules for the fake commands
+                                 (canned output, failures; see shims.py).
+    --kv-version=<version>       Fake Vault KV secrets engine version [default: 1].
+    --repeat=<n>                 Run each benchmark <n> times [default: 3].
+    --only=<names>               Comma-separated benchmarks to run (default: all).
+    --landscape-args=<args>      Extra options for every landscape command,
+                                 e.g. "--max-workers=16".
+    --output=<path>              Write results as JSON to <path>
+                                 [default: .landscape/benchmarks/latest.json].
+    --compare=<path>             Compare results with an earlier --output.
+    --keep                       Keep the generated Landscaper YAML.
+"""
+
+import docopt
+import json
+import os
+import platform
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from .fakevault import FakeVaultServer
+from .fleet import generate_fleet
+from .shims import CommandShims
+
+# name: landscape arguments. {cluster} and {landscaper_dir} are filled in
+BENCHMARKS = [
+    ('cloud-list', ['cloud', 'list']),
+    ('cluster-list', ['cluster', 'list']),
+    ('charts-list', ['charts', '--cluster={cluster}',
+                     '--landscaper-dir={landscaper_dir}', 'list']),
+    ('charts-converge-dry-run', ['--dry-run', 'charts', '--cluster={cluster}',
+                                 '--landscaper-dir={landscaper_dir}', 'converge']),
+    ('charts-converge', ['charts', '--cluster={cluster}',
+                         '--landscaper-dir={landscaper_dir}', 'converge']),
+    ('cluster-converge', ['cluster', '--cluster={cluster}', 'converge']),
+]
+
+
+def main():
+    args = docopt.docopt(__doc__)
+    selected = [b for b in (args['--only'] or '').split(',') if b]
+    unknown = set(selected) - set([name for name, _ in BENCHMARKS])
+    if unknown:
+        sys.exit("ERROR: unknown benchmarks: {0}".format(', '.join(sorted(unknown))))
+
+    fake_vault = FakeVaultServer(latency=float(args['--latency']),
+                                 kv_version=int(args['--kv-version'])).start()
+    workdir = tempfile.mkdtemp(prefix='landscape-benchmark-')
+    try:
+        landscaper_dir = os.path.join(workdir, 'landscaper')
+        started = time.time()
+        fleet = generate_fleet(fake_vault, landscaper_dir,
+                               clouds=int(args['--clouds']),
+                               clusters=int(args['--clusters']),
+                               namespaces=int(args['--namespaces']),
+                               charts_per_namespace=int(args['--charts-per-namespace']),
+                               secrets_every=int(args['--secrets-every']))
+        print("Generated {0} clouds, {1} clusters, {2} charts in {3:.1f}s".format(
+            fleet['clouds'], fleet['clusters'], fleet['charts'],
+            time.time() - started))
+        shim_rules = []
+        if args['--shim-rules']:
+            with open(args['--shim-rules']) as rules_file:
+                shim_rules = json.load(rules_file)
+        shims = CommandShims(os.path.join(workdir, 'bin'), rules=shim_rules,
+                             latency=float(args['--shim-latency'])).install()
+        env = dict(shims.env(),
+                   VAULT_ADDR=fake_vault.url,
+                   VAULT_TOKEN='benchmark',
+                   VAULT_KV_VERSION=args['--kv-version'])
+        extra_args = shlex.split(args['--landscape-args'] or '')
+        extra_args.append('--artifacts-dir=' + os.path.join(workdir, 'artifacts'))
+        # kubectl config set writes here
+        env['KUBECONFIG'] = os.path.join(workdir, 'kubeconfig')
+
+        results = []
+        for name, landscape_args in BENCHMARKS:
+            if selected and name not in selected:
+                continue
+            command = [a.format(cluster=fleet['first_cluster'],
+                                landscaper_dir=landscaper_dir)
+                       for a in landscape_args]
+            runs = [run_landscape(extra_args + command, env, fake_vault, shims)
+                    for _ in range(int(args['--repeat']))]
+            result = summarize(name, command, runs)
+            results.append(result)
+            print(format_result(result))
+    finally:
+        fake_vault.stop()
+        if args['--keep']:
+            print("Landscaper YAML kept in {0}".format(workdir))
+        else:
+            shutil.rmtree(workdir)
+
+    report = {
+        'started': started,
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'parameters': {
+            'latency': float(args['--latency']),
+            'shim_latency': float(args['--shim-latency']),
+            'kv_version': int(args['--kv-version']),
+            'repeat': int(args['--repeat']),
+            'landscape_args': args['--landscape-args'],
+        },
+        'fleet': fleet,
+        'results': results,
+    }
+    output_dir = os.path.dirname(args['--output'])
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(args['--output'], 'w') as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+    print("Results written to {0}".format(args['--output']))
+
+    if args['--compare']:
+        with open(args['--compare']) as baseline:
+            print(format_comparison(json.load(baseline), report))
+
+
+def run_landscape(landscape_args, env, fake_vault, shims):
+    """Runs a landscape command, measuring it
+
+    Args:
+        landscape_args: Arguments to landscape
+        env: Environment of the command
+        fake_vault: FakeVaultServer the command reads from
+        shims: CommandShims standing in for kubectl, helm, ...
+
+    Returns:
+        A dict with the command's wall time (seconds), Vault requests by
+        operation, processes run by command, peak memory (KiB), return code
+        and last lines of output
+    """
+    fake_vault.reset_counts()
+    shims.reset()
+    command = [sys.executable, '-m', 'landscape.main'] + landscape_args
+    started = time.time()
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT)
+    output = process.stdout.read()
+    # wait4 reports the peak memory of this command alone, unlike
+    # getrusage(RUSAGE_CHILDREN)
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    wall_time = time.time() - started
+    vault_requests = fake_vault.reset_counts()
+    return {
+        'wall_seconds': round(wall_time, 4),
+        'vault_requests': vault_requests,
+        'processes': shims.counts(),
+        'peak_rss_kib': rusage.ru_maxrss,
+        'returncode': process.returncode,
+        'output_tail': output.decode('utf-8', 'replace').splitlines()[-5:],
+    }
+
+
+def summarize(name, command, runs):
+    """Median wall time, and the worst peak memory, of a benchmark's runs"""
+    wall_times = sorted([r['wall_seconds'] for r in runs])
+    return {
+        'name': name,
+        'command': command,
+        'wall_seconds_median': wall_times[len(wall_times) // 2],
+        'wall_seconds_min': wall_times[0],
+        'vault_requests': sum(runs[-1]['vault_requests'].values()),
+        'vault_requests_by_operation': runs[-1]['vault_requests'],
+        'processes': sum(runs[-1]['processes'].values()),
+        'processes_by_command': runs[-1]['processes'],
+        'peak_rss_kib': max([r['peak_rss_kib'] for r in runs]),
+        'failed_runs': len([r for r in runs if r['returncode'] != 0]),
+        'runs': runs,
+    }
+
+
+def format_result(result):
+    line = "{0:<26} {1:>8.3f}s  {2:>7} Vault requests  {3:>5} processes  {4:>8} KiB peak".format(
+        result['name'], result['wall_seconds_median'],
+        result['vault_requests'], result['processes'], result['peak_rss_kib'])
+    if result['failed_runs']:
+        line += "  ({0} failed: {1})".format(result['failed_runs'],
+            ' | '.join(result['runs'][-1]['output_tail'][-2:]))
+    return line
+
+
+def format_comparison(baseline, report):
+    """Changes in wall time, Vault requests and peak memory since a baseline"""
+    baseline_results = dict([(r['name'], r) for r in baseline['results']])
+    lines = ["Compared with {0}:".format(baseline.get('git_revision'))]
+    for result in report['results']:
+        before = baseline_results.get(result['name'])
+        if not before:
+            continue
+        lines.append("{0:<26} wall {1}  Vault requests {2}  processes {3}  peak memory {4}".format(
+            result['name'],
+            _change(before['wall_seconds_median'], result['wall_seconds_median']),
+            _change(before['vault_requests'], result['vault_requests']),
+            _change(before.get('processes'), result['processes']),
+            _change(before['peak_rss_kib'], result['peak_rss_kib'])))
+    return '\n'.join(lines)
+
+
+def _change(before, after):
+    if not before:
+        return "{0} -> {1}".format(before, after)
+    return "{0:+.1f}%".format(100.0 * (after - before) / before)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#! /usr/bin/env python3
+
+import collections
+import json
+import os
+import random
+import re
+import stat
+import sys
+import time
+
+# executables landscape runs, which CommandShims replaces
+SHIMMED_COMMANDS = ['kubectl', 'helm', 'minikube', 'gcloud', 'terraform',
+                    'landscaper']
+
+# canned outputs which let converges run to completion, after any rules
+# passed to CommandShims
+DEFAULT_RULES = [
+    # tiller is already running
+    {'command': 'kubectl', 'args': r'^get pod .*status\.phase',
+     'stdout': 'Running'},
+    {'command': 'kubectl', 'args': r'^config current-context',
+     'stdout': 'minikube\n'},
+    {'command': 'helm', 'args': r'^list .*--output=json', 'stdout': '[]\n'},
+    {'command': 'helm', 'args': r'^get values ', 'stdout': '{}\n'},
+    {'command': 'minikube', 'args': r'^status', 'stdout': 'Running\n'},
+]
+
+CONFIG_FILENAME = 'shims.json'
+INVOCATIONS_FILENAME = 'invocations.jsonl'
+
+
+class CommandShims(object):
+    """Fake kubectl, helm, minikube, gcloud, terraform and landscaper
+
+    install() writes an executable for each command into directory. Put
+    env()'s PATH in front of a landscape command's, and each invocation is
+    recorded (see invocations() and counts()) and answered by the first
+    matching rule, after waiting latency seconds.
+
+    A rule is a dict:
+      command: The executable (e.g., kubectl)
+      args: Regular expression searched for in the space-joined arguments
+        (optional)
+      stdout, stderr: Canned output (optional)
+      exit_code: Exit code (default: 0)
+      latency: Seconds to wait, instead of the default latency (optional)
+      fail_first: Exit 1 for the first <n> matching invocations (optional)
+      fail_rate: Exit 1 for this fraction of invocations (optional)
+
+    Arguments are recorded verbatim (e.g., kubectl config set credentials),
+    so only use shims with synthetic inventories.
+
+    Attributes:
+        directory: Where the executables, configuration and invocation
+            record are written
+        rules: Rules, matched before DEFAULT_RULES
+        latency: Seconds each invocation takes, by default
+        commands: Executables to replace
+    """
+
+    def __init__(self, directory, rules=None, latency=0.0,
+                 commands=SHIMMED_COMMANDS):
+        self.directory = os.path.abspath(directory)
+        self.rules = list(rules or [])
+        self.latency = latency
+        self.commands = commands
+
+
+    def install(self):
+        """Writes the executables and their configuration. Returns self"""
+        counters_dir = os.path.join(self.directory, 'counters')
+        if not os.path.exists(counters_dir):
+            os.makedirs(counters_dir)
+        with open(os.path.join(self.directory, CONFIG_FILENAME), 'w') as config:
+            json.dump({'latency': self.latency,
+                       'rules': self.rules + DEFAULT_RULES}, config, indent=2)
+        for command in self.commands:
+            shim_path = os.path.join(self.directory, command)
+            with open(shim_path, 'w') as shim:
+                shim.write('#!/bin/sh\nexec "{0}" "{1}" "{2}" {3} "$@"\n'.format(
+                    sys.executable, os.path.abspath(__file__), self.directory,
+                    command))
+            os.chmod(shim_path, os.stat(shim_path).st_mode |
+                     stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        self.reset()
+        return self
+
+
+    def reset(self):
+        """Forgets recorded invocations, and fail_first counts"""
+        open(os.path.join(self.directory, INVOCATIONS_FILENAME), 'w').close()
+        counters_dir = os.path.join(self.directory, 'counters')
+        for counter in os.listdir(counters_dir):
+            os.remove(os.path.join(counters_dir, counter))
+
+
+    def env(self, base_env=None):
+        """base_env (default: os.environ) with the shims first in PATH"""
+        env = dict(os.environ if base_env is None else base_env)
+        env['PATH'] = self.directory + os.pathsep + env.get('PATH', '')
+        return env
+
+
+    def invocations(self):
+        """Recorded invocations, as a list of dicts with command, args, cwd,
+        started, seconds, exit_code and rule (index, or None) keys
+        """
+        invocations = []
+        with open(os.path.join(self.directory, INVOCATIONS_FILENAME)) as record:
+            for line in record:
+                if line.strip():
+                    invocations.append(json.loads(line))
+        return invocations
+
+
+    def counts(self):
+        """Invocations by command (dict)"""
+        return dict(collections.Counter([i['command'] for i in self.invocations()]))
+
+
+def run_shim(directory, command, args):
+    """Answers an invocation of a shimmed command, and records it
+
+    Returns:
+        The exit code (int)
+    """
+    started = time.time()
+    with open(os.path.join(directory, CONFIG_FILENAME)) as config_file:
+        config = json.load(config_file)
+    joined_args = ' '.join(args)
+    rule_index = None
+    rule = {}
+    for index, candidate in enumerate(config['rules']):
+        if candidate['command'] == command and \
+                re.search(candidate.get('args', ''), joined_args):
+            rule_index, rule = index, candidate
+            break
+
+    time.sleep(rule.get('latency', config['latency']))
+    exit_code = rule.get('exit_code', 0)
+    if rule.get('fail_first') and \
+            _count_invocation(directory, rule_index) <= rule['fail_first']:
+        exit_code = 1
+    elif random.random() < rule.get('fail_rate', 0):
+        exit_code = 1
+    sys.stdout.write(rule.get('stdout', ''))
+    sys.stderr.write(rule.get('stderr', ''))
+
+    invocation = json.dumps({'command': command, 'args': args,
+                             'cwd': os.getcwd(), 'started': started,
+                             'seconds': round(time.time() - started, 4),
+                             'exit_code': exit_code, 'rule': rule_index})
+    # a single O_APPEND write, so concurrent shims don't interleave lines
+    record_fd = os.open(os.path.join(directory, INVOCATIONS_FILENAME),
+                        os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    try:
+        os.write(record_fd, (invocation + '\n').encode('utf-8'))
+    finally:
+        os.close(record_fd)
+    return exit_code
+
+
+def _count_invocation(directory, rule_index):
+    """Counts an invocation matching a rule. Returns the count so far"""
+    counter_fd = os.open(os.path.join(directory, 'counters', str(rule_index)),
+                         os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    try:
+        os.write(counter_fd, b'.')
+        return os.fstat(counter_fd).st_size
+    finally:
+        os.close(counter_fd)
+
+
+if __name__ == "__main__":
+    sys.exit(run_shim(sys.argv[1], sys.argv[2], sys.argv[3:]))
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+from .fakevault import FakeVaultServer
+from .fleet import generate_fleet
+from .shims import CommandShims
+
+def test_shims_record_and_replay(tmpdir):
+	shims = CommandShims(str(tmpdir.join('bin')), rules=[
+		{'command': 'helm', 'args': '^version', 'stdout': 'v2.8.2\n', 'fail_first': 1},
+	]).install()
+	def helm(*args):
+		return subprocess.run(['helm'] + list(args), env=shims.env(),
+		                      stdout=subprocess.PIPE, universal_newlines=True)
+	assert helm('version').returncode == 1
+	retried = helm('version')
+	assert retried.returncode == 0
+	assert retried.stdout == 'v2.8.2\n'
+	assert helm('list', '--output=json').stdout == '[]\n'
+	assert shims.counts() == {'helm': 3}
+	assert [i['exit_code'] for i in shims.invocations()] == [1, 0, 0]
+
+def test_charts_converge_runs_landscaper_once_per_namespace(tmpdir):
+	fake_vault = FakeVaultServer().start()
+	try:
+		landscaper_dir = str(tmpdir.join('landscaper'))
+		fleet = generate_fleet(fake_vault, landscaper_dir, clouds=1, clusters=2,
+		                       namespaces=3, charts_per_namespace=4)
+		shims = CommandShims(str(tmpdir.join('bin'))).install()
+		env = dict(shims.env(), VAULT_ADDR=fake_vault.url, VAULT_TOKEN='test')
+		converge = subprocess.run([sys.executable, '-m', 'landscape.main',
+		                           '--artifacts-dir=' + str(tmpdir.join('artifacts')),
+		                           'charts', '--cluster=' + fleet['first_cluster'],
+		                           '--landscaper-dir=' + landscaper_dir, 'converge'],
+		                          env=env, cwd=os.path.dirname(os.path.dirname(__file__)),
+		                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+	finally:
+		fake_vault.stop()
+	assert converge.returncode == 0, converge.stdout
+	assert shims.counts() == {'landscaper': 3}
+	applied = sorted([a for i in shims.invocations() for a in i['args']
+	                  if a.startswith('--namespace=')])
+	assert applied == ['--namespace=ns-000', '--namespace=ns-001', '--namespace=ns-002']
@@ -0,0 +1,65 @@
+"""Where clouds, clusters and chart secrets are stored
+
+A backend stores JSON data at Vault-style paths (/secret/landscape/...).
+Backends have VaultClient's interface:
+
+  list(path), read(path), write(path, data), read_metadata(path),
+  current_version(path), dump_vault_from_prefix(prefix, strip_root_key),
+  get_vault_data(path), list_vault_prefix(path) and kv_version
+
+Backends are selected with a URL (landscape --backend=<url>):
+
+  vault: Vault at VAULT_ADDR (the default)
+  sqlite:///<path>: SQLiteBackend, a local SQLite file
+"""
+
+import threading
+
+from .vault import VaultClient
+from .backend_sqlite import SQLiteBackend
+
+SQLITE_URL_PREFIX = 'sqlite:///'
+
+_backend_url = 'vault'
+_sqlite_backends = {}
+_lock = threading.Lock()
+
+
+def configure_backend(backend_url):
+    """Selects the backend returned by secrets_backend()
+
+    Args:
+        backend_url: vault, or sqlite:///<path>
+
+    Returns:
+        None.
+
+    Raises:
+        ValueError: if backend_url isn't a supported backend
+    """
+    global _backend_url
+    if backend_url != 'vault' and not backend_url.startswith(SQLITE_URL_PREFIX):
+        raise ValueError("Unsupported backend: {0}. Use vault or "
+                         "sqlite:///<path>".format(backend_url))
+    _backend_url = backend_url
+
+
+def is_vault_backend():
+    """True if secrets_backend() returns a VaultClient"""
+    return _backend_url == 'vault'
+
+
+def secrets_backend():
+    """A client for the configured backend
+
+    Returns:
+        A new VaultClient, or the (shared) SQLiteBackend for the configured
+        file
+    """
+    if is_vault_backend():
+        return VaultClient()
+    db_path = _backend_url[len(SQLITE_URL_PREFIX):]
+    with _lock:
+        if db_path not in _sqlite_backends:
+            _sqlite_backends[db_path] = SQLiteBackend(db_path)
+        return _sqlite_backends[db_path]
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteBackend(object):
+    """Inventory and secrets in a local SQLite file, instead of Vault
+
+    Has the same interface and semantics as VaultClient (KV version 2):
+    paths look like Vault paths (e.g., /secret/landscape/clouds/minikube),
+    list() returns subkeys with directories suffixed by /, read() returns
+    {'data': ...} or None, and every write() increments the path's version.
+
+    Paths are the table's primary key, so reads are index lookups and lists
+    and dumps are index range scans. Each thread has its own connection.
+
+    Seed a replica from Vault with `landscape vault export` followed by
+    `landscape --backend=sqlite:///<db_path> vault import`.
+
+    Attributes:
+        db_path: The SQLite database file
+        kv_version: Always 2. Every path has a version
+    """
+
+    kv_version = 2
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS secrets ('
+                               'path TEXT PRIMARY KEY, '
+                               'data TEXT NOT NULL, '
+                               'version INTEGER NOT NULL, '
+                               'updated REAL NOT NULL)')
+
+
+    def list(self, vault_path):
+        """
+        List subkeys at a path
+
+        Returns:
+            {'data': {'keys': [...]}}, or None if there are no subkeys
+        """
+        prefix = _normalize(vault_path) + '/'
+        subkeys = set()
+        for (path,) in self._descendants(prefix, 'path'):
+            relative_path = path[len(prefix):]
+            subkey, slash, _ = relative_path.partition('/')
+            subkeys.add(subkey + slash)
+        if not subkeys:
+            return None
+        return {'data': {'keys': sorted(subkeys)}}
+
+
+    def read(self, vault_path):
+        """
+        Read a path
+
+        Returns:
+            {'data': ..., 'metadata': {'version': ...}}, or None if the path
+            doesn't exist
+        """
+        row = self._connection().execute(
+            'SELECT data, version FROM secrets WHERE path = ?',
+            (_normalize(vault_path),)).fetchone()
+        if not row:
+            return None
+        return {'data': json.loads(row[0]), 'metadata': {'version': row[1]}}
+
+
+    def write(self, vault_path, data):
+        """
+        Write data to a path, replacing what was there
+
+        Returns:
+            None
+        """
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO secrets (path, data, version, updated) '
+                'VALUES (?, ?, COALESCE((SELECT version FROM secrets '
+                'WHERE path = ?), 0) + 1, ?)',
+                (_normalize(vault_path), json.dumps(data, sort_keys=True),
+                 _normalize(vault_path), time.time()))
+
+
+    def read_metadata(self, vault_path):
+        """
+        Version metadata of a path
+
+        Returns:
+            A dict with a current_version key, or None if the path doesn't
+            exist
+        """
+        row = self._connection().execute(
+            'SELECT version FROM secrets WHERE path = ?',
+            (_normalize(vault_path),)).fetchone()
+        if not row:
+            return None
+        return {'current_version': row[0]}
+
+
+    def current_version(self, vault_path):
+        """
+        Version of a path (int), or None if it doesn't exist
+        """
+        metadata = self.read_metadata(vault_path)
+        return metadata and metadata['current_version']
+
+
+    def dump_vault_from_prefix(self, path_prefix, strip_root_key=False):
+        """
+        Dump data at prefix into dict, as VaultClient.dump_vault_from_prefix
+
+        A prefix with subkeys becomes nested dicts of their data, read with
+        a single range scan. Otherwise, it's the prefix's own data.
+
+        Raises:
+            ValueError: if nothing exists at the prefix
+        """
+        path_prefix = _normalize(path_prefix)
+        prefix_keyname = path_prefix.split('/')[-1]
+        dumped = {}
+        found = False
+        for path, data in self._descendants(path_prefix + '/', 'path, data'):
+            found = True
+            components = path[len(path_prefix) + 1:].split('/')
+            node = dumped
+            for component in components:
+                node = node.setdefault(component, {})
+            node.update(json.loads(data))
+        if not found:
+            dumped = self.get_vault_data(path_prefix)
+        if strip_root_key:
+            return dumped
+        return {prefix_keyname: dumped}
+
+
+    def get_vault_data(self, vault_path):
+        """
+        Get data for a specific path
+
+        Raises:
+            ValueError: if the path doesn't exist
+        """
+        response = self.read(vault_path)
+        if not response:
+            raise ValueError('Vault data missing at path: {0}'.format(vault_path))
+        return response['data']
+
+
+    def list_vault_prefix(self, vault_path):
+        """
+        List subkeys at a path
+
+        Raises:
+            ValueError: if there are no subkeys
+        """
+        listing = self.list(vault_path)
+        if not listing:
+            raise ValueError('Vault data missing at path: {0}'.format(vault_path))
+        return listing['data']
+
+
+    def _descendants(self, prefix, columns):
+        # every path starting with prefix (which ends in /) sorts between
+        # prefix and prefix with its / replaced by 0, the next character
+        return self._connection().execute(
+            'SELECT {0} FROM secrets WHERE path >= ? AND path < ? '
+            'ORDER BY path'.format(columns), (prefix, prefix[:-1] + '0'))
+
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            logging.debug("Opening {0}".format(self.db_path))
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+
+def _normalize(vault_path):
+    return '/' + vault_path.strip('/')
@@ -13,12 +13,15 @@ class LandscaperChart(object):
         release (dict): Chart and version k/v pairs
         configuration (dict): Configuration overrides for Chart values
         secrets (list): Secrets to be pulled from Vault
+        filepath (str): Path to the Landscaper YAML file
+        blob (str): git blob hash of the YAML, if read from git, or None
 	"""
     def __init__(self, **kwargs):
         self.name = kwargs['name']
         self.namespace = kwargs['namespace']
         self.release = kwargs['release']
         self.filepath = kwargs['filepath']
+        self.blob = kwargs.get('blob')
 
         # configuration and secrets are optional fields in landscaper yaml
         self.configuration = {}
@@ -44,3 +47,40 @@ class LandscaperChart(object):
         return "{0}/{1}".format(self.namespace, self.name)
 
 
+    @property
+    def release_name(self):
+        """Name of the Helm release deployed for the chart
+
+        Landscaper names releases <namespace>-<name>
+        """
+        return "{0}-{1}".format(self.namespace, self.name)
+
+
+def landscaper_yaml_errors(chart_info):
+    """Checks a parsed Landscaper YAML file against the fields landscape uses
+
+    Args:
+        chart_info (dict): The parsed YAML
+
+    Returns:
+        A list of problems (str). Empty if chart_info is valid.
+    """
+    if not isinstance(chart_info, dict):
+        return ['not a YAML mapping']
+    errors = []
+    for required_field in ['name', 'namespace']:
+        if not isinstance(chart_info.get(required_field), str) or not chart_info[required_field]:
+            errors.append("missing or non-string {0}".format(required_field))
+    release = chart_info.get('release')
+    if not isinstance(release, dict):
+        errors.append('missing release')
+    else:
+        for release_field in ['chart', 'version']:
+            if not release.get(release_field):
+                errors.append("missing release.{0}".format(release_field))
+    if not isinstance(chart_info.get('configuration', {}), dict):
+        errors.append('configuration is not a mapping')
+    secrets = chart_info.get('secrets', [])
+    if not isinstance(secrets, list) or not all([isinstance(s, str) for s in secrets]):
+        errors.append('secrets is not a list of names')
+    return errors
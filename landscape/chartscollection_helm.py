@@ -0,0 +1,190 @@
+import os
+import sys
+import logging
+import tempfile
+import concurrent.futures
+
+import yaml
+
+from .chartscollection_landscaper import LandscaperChartsCollection
+from .timeline import traced
+from .commandrunner import command_runner
+from .metrics import run_metrics
+
+class HelmChartsCollection(LandscaperChartsCollection):
+    """Deploys Landscaper YAML with helm, one release at a time
+
+    Reads the same chart YAML and Vault secrets as LandscaperChartsCollection,
+    but runs `helm upgrade --install` for each release instead of
+    `landscaper apply` for each namespace. Releases in a namespace are
+    deployed concurrently, and other releases in the namespace aren't
+    reconciled.
+
+    The release name is <namespace>-<name>, as Landscaper names releases.
+    Secrets are passed to the chart as values under the `secrets` key
+    (e.g., .Values.secrets.admin-password), rather than through a
+    Kubernetes secret.
+
+    Attributes:
+        max_workers: Maximum number of releases deployed at once, per namespace
+    """
+
+    # helm adds no values of its own
+    DRIVER_VALUES = []
+
+    def __init__(self, path_to_landscaper_repo, dry_run=False, max_workers=4,
+                 **kwargs):
+        super(HelmChartsCollection, self).__init__(path_to_landscaper_repo,
+                                                   dry_run=dry_run, **kwargs)
+        self.max_workers = max_workers
+
+
+    def converge_namespace(self, namespace, dry_run):
+        """Deploys every release in a namespace with helm, concurrently
+
+        Args:
+            namespace: The namespace to apply
+            dry_run: flag for simulating convergence
+
+        Returns:
+            None.
+        """
+        charts_in_namespace = [c for c in self.charts if c.namespace == namespace]
+        if self.skip_unchanged:
+            changed_releases = self.changed_releases(max_workers=self.max_workers)
+            changed_charts = [c for c in charts_in_namespace
+                              if c.release_name in changed_releases]
+            run_metrics.increment('landscape_incremental_releases',
+                                  len(changed_charts), outcome='applied',
+                                  cluster=self.cluster_id)
+            run_metrics.increment('landscape_incremental_releases',
+                                  len(charts_in_namespace) - len(changed_charts),
+                                  outcome='skipped', cluster=self.cluster_id)
+            charts_in_namespace = changed_charts
+            if not charts_in_namespace:
+                logging.info("Releases in {0} unchanged. Skipping".format(namespace))
+                return
+        failed_releases = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            deploys = {}
+            for chart in charts_in_namespace:
+                deploys[executor.submit(self.deploy_release, chart, dry_run)] = chart
+            for deploy in concurrent.futures.as_completed(deploys):
+                if deploy.exception():
+                    logging.error("Failed to deploy {0}: {1}".format(
+                        deploys[deploy], deploy.exception()))
+                    failed_releases.append(str(deploys[deploy]))
+        if failed_releases:
+            sys.exit("ERROR: failed to deploy {0}".format(
+                ', '.join(sorted(failed_releases))))
+
+
+    @traced('charts', lambda self, chart, *args: {'cluster': self.cluster_id,
+                                                  'release': str(chart)})
+    def deploy_release(self, chart, dry_run):
+        """Runs helm upgrade --install for a single chart
+
+        Values (configuration and secrets) are passed in a temporary file,
+        readable only by the current user, so secrets don't appear in argv.
+
+        Args:
+            chart: The LandscaperChart to deploy
+            dry_run: flag for simulating convergence
+
+        Returns:
+            None.
+        """
+        values = self.desired_release_values(chart)
+        values_fd, values_path = tempfile.mkstemp(prefix='landscape-values-',
+                                                  suffix='.yaml')
+        try:
+            with os.fdopen(values_fd, 'w') as values_file:
+                yaml.safe_dump(values, values_file, default_flow_style=False)
+            helm_cmd = helm_upgrade_argv(chart, self.cluster_id, values_path)
+            if dry_run:
+                helm_cmd.append('--dry-run')
+            logging.info('Executing: ' + ' '.join(helm_cmd))
+            deploy_failed = command_runner.run(helm_cmd, label=str(chart)).failed
+        finally:
+            os.remove(values_path)
+        if deploy_failed:
+            sys.exit("ERROR: non-zero retval for {}".format(' '.join(helm_cmd)))
+
+
+    def desired_release_values(self, chart):
+        """Values a chart's release should be deployed with
+
+        Args:
+            chart: The LandscaperChart
+
+        Returns:
+            A dict of configuration and, under the secrets key, secrets
+        """
+        values = dict(chart.configuration)
+        if chart.secrets:
+            values['secrets'] = self.release_secrets(chart)
+        return values
+
+
+    def release_secrets(self, chart):
+        """Reads the secrets a chart declares from Vault
+
+        Args:
+            chart: The LandscaperChart
+
+        Returns:
+            A dict of secret name to value, for the chart's declared secrets
+
+        Raises:
+            ValueError: if a declared secret is missing from Vault
+        """
+        vault_secrets = self.vault_secrets_for_chart(chart.namespace, chart.name)
+        missing_secrets = [s for s in chart.secrets if s not in vault_secrets]
+        if missing_secrets:
+            raise ValueError("Missing secrets for {0}: {1}".format(
+                chart, ', '.join(missing_secrets)))
+        return {s: vault_secrets[s] for s in chart.secrets}
+
+
+    def _secrets_for_namespace(self, namespace, charts):
+        """Checks every chart in a namespace for missing secrets
+
+        Secrets are passed to each release separately, so charts declaring the
+        same secret name don't collide.
+
+        Returns:
+            A tuple of ({}, list of problems)
+        """
+        problems = []
+        for chart in charts:
+            if chart.namespace == namespace and chart.secrets:
+                try:
+                    self.release_secrets(chart)
+                except ValueError as e:
+                    problems.append(str(e))
+        return {}, problems
+
+
+def helm_upgrade_argv(chart, kube_context, values_path):
+    """argv installing or upgrading a chart's release
+
+    Args:
+        chart: The LandscaperChart
+        kube_context: Kubernetes context to deploy to
+        values_path: Path to the release's values file
+
+    Returns:
+        A list
+    """
+    # release.version is the release's own version. The chart's version is
+    # the suffix of release.chart, e.g. stable/jenkins:0.1.0
+    chart_ref, _, chart_version = chart.release['chart'].partition(':')
+    helm_cmd = ['helm', 'upgrade', '--install',
+                chart.release_name,
+                chart_ref,
+                '--namespace=' + chart.namespace,
+                '--kube-context=' + kube_context,
+                '--values=' + values_path]
+    if chart_version:
+        helm_cmd.append('--version=' + chart_version)
+    return helm_cmd
@@ -1,14 +1,32 @@
 import os
 import fnmatch
 import yaml
-import subprocess
 import sys
 import logging
+import concurrent.futures
+import contextlib
+import shutil
+import tempfile
+import threading
+import hvac
+import requests
 
-from .vault import VaultClient
 from .chartscollection import ChartsCollection
-from .chart_landscaper import LandscaperChart
+from .chart_landscaper import (LandscaperChart, landscaper_yaml_errors)
 from .clustercollection import ClusterCollection
+from .timeline import traced
+from .commandrunner import command_runner
+from .releaseinventory import (ReleaseInventory, chart_version_name)
+from .gittree import git_object_store
+from .secretindex import chart_secrets_path
+from .backend import secrets_backend
+from .metrics import run_metrics
+
+# errors reading a chart's secrets, reported as preflight problems: missing
+# data, Vault errors (e.g., Forbidden, InvalidPath) and connection failures
+PREFLIGHT_SECRET_ERRORS = (ValueError, hvac.exceptions.VaultError,
+                           requests.exceptions.RequestException)
+
 
 class LandscaperChartsCollection(ChartsCollection):
     """Loads up a directory of chart yaml for use by Landscaper
@@ -21,7 +39,21 @@ class LandscaperChartsCollection(ChartsCollection):
         charts: An integer count of the eggs we have laid.
         cluster_branch:  The branch of the landscaper repo that the cluster subscribes to
     """
-    def __init__(self, path_to_landscaper_repo, dry_run=False, **kwargs):
+
+    # namespaces applied first, in this order, before all other namespaces
+    PRIORTY_NAMESPACES = [
+        'auto-approve-csrs',
+        'kube-system',
+    ]
+
+    # values landscaper adds to every release it deploys
+    DRIVER_VALUES = [
+        '_landscaperMetadata',
+        'secretsRef',
+    ]
+
+    def __init__(self, path_to_landscaper_repo, dry_run=False,
+                 skip_unchanged=False, git_objects=False, **kwargs):
         """Initializes a set of charts for a cluster.
 
         Determines which yaml files in the directory structure should be applied
@@ -33,6 +65,11 @@ class LandscaperChartsCollection(ChartsCollection):
         Args:
             context_name: The Kubernetes context name in which to apply charts.
             namespace_selection: A List of namespaces for which to apply charts.
+            skip_unchanged: Don't apply charts whose deployed release is
+                already up-to-date.
+            git_objects: Read Landscaper YAML from the cluster's landscaper
+                branch in git, instead of the path_to_landscaper_repo
+                working tree.
 
         Returns:
             None.
@@ -50,6 +87,16 @@ class LandscaperChartsCollection(ChartsCollection):
         self.namespace_selection = kwargs['namespace_selection']
         self._charts = []
         self.workdir = path_to_landscaper_repo
+        # chart secrets resolved by preflight(), by (namespace, chart name)
+        self._chart_secrets = {}
+        self.skip_unchanged = skip_unchanged
+        self.git_objects = git_objects
+        # only converge these namespaces, if set (e.g., by
+        # restrict_to_changes_since())
+        self.changed_namespaces = None
+        self.release_inventory = ReleaseInventory(self.cluster_id)
+        self._changed_releases = None
+        self._changed_releases_lock = threading.Lock()
 
         # self.cluster_branch = self.__get_landscaper_branch_that_cluster_subscribes_to()
         # self.charts = self.__load_landscaper_yaml_for_cloud_type_and_namespace_selection(namespace_selection)
@@ -121,26 +168,80 @@ class LandscaperChartsCollection(ChartsCollection):
         Raises:
             None.
         """
-        landscaper_path = [self.workdir + '/' + s for s in self._chart_collections()]
         cluster_ns_subscriptions = self.cluster.namespace_subscriptions
-
-        files = self._landscaper_filenames_in_dirs(landscaper_path)
         charts = []
-        for landscaper_yaml in files:
-            with open(landscaper_yaml) as f:
-                chart_info = yaml.load(f)
-                chart_namespace = chart_info['namespace']
-                # load the chart if it matches a namespace selector list param
-                # or if there's no namespace selector list, load all
-                if chart_namespace in cluster_ns_subscriptions or not cluster_ns_subscriptions:
-                    if chart_namespace in self.namespace_selection or not self.namespace_selection:
-                        # Add path to landscaper yaml inside Chart object
-                        chart_info['filepath'] = landscaper_yaml
-                        chart = LandscaperChart(**chart_info)
-                        charts.append(chart)
+        for landscaper_yaml, chart_info, errors, blob in self._landscaper_yaml():
+            # preflight() reports every problem. Only fail on files which
+            # can't be loaded at all here
+            if not isinstance(chart_info, dict) or 'namespace' not in chart_info:
+                raise ValueError("Invalid Landscaper YAML {0}: {1}".format(
+                    landscaper_yaml, ', '.join(errors)))
+            chart_namespace = chart_info['namespace']
+            # load the chart if it matches a namespace selector list param
+            # or if there's no namespace selector list, load all
+            if self._namespace_selected(chart_namespace, cluster_ns_subscriptions):
+                # Add path to landscaper yaml inside Chart object. Parsed
+                # YAML may be cached, so don't modify it
+                chart_info = dict(chart_info)
+                chart_info['filepath'] = landscaper_yaml
+                chart_info['blob'] = blob
+                chart = LandscaperChart(**chart_info)
+                charts.append(chart)
         return charts
 
 
+    def _landscaper_yaml(self, max_workers=4):
+        """Reads and validates every Landscaper YAML file for the cluster
+
+        Files are read from the working tree, or with git_objects, from git
+
+        Args:
+            max_workers: Maximum number of files read at once
+
+        Returns:
+            A list of (path, parsed YAML, list of problems, git blob hash or
+            None) tuples
+        """
+        if self.git_objects:
+            return self._landscaper_yaml_from_git()
+        landscaper_path = [self.workdir + '/' + s for s in self._chart_collections()]
+        files = self._landscaper_filenames_in_dirs(landscaper_path)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return [(landscaper_yaml, chart_info, errors, None)
+                    for landscaper_yaml, (chart_info, errors)
+                    in zip(files, executor.map(_load_landscaper_yaml, files))]
+
+
+    def _landscaper_yaml_from_git(self):
+        """Reads Landscaper YAML from the cluster's branch, without checkout
+
+        Paths are reported as if the branch were checked out in workdir
+        """
+        git_store = git_object_store(self.workdir)
+        git_branch = self.git_branch
+        root_tree = git_store.resolve_tree([git_branch, 'origin/' + git_branch])
+        workdir_prefix = git_store.prefix()
+        landscaper_yaml = []
+        for collection in self._chart_collections():
+            collection_tree = git_store.subtree(root_tree, workdir_prefix + collection)
+            if not collection_tree:
+                continue
+            for yaml_path, blob in git_store.yaml_blobs(collection_tree):
+                chart_info, errors = git_store.landscaper_yaml(blob)
+                landscaper_yaml.append((os.path.join(self.workdir, collection, yaml_path),
+                                        chart_info, errors, blob))
+        return landscaper_yaml
+
+
+    def _namespace_selected(self, chart_namespace, cluster_ns_subscriptions):
+        """True if the cluster subscribes to, and the user selected, a namespace
+        """
+        if chart_namespace in cluster_ns_subscriptions or not cluster_ns_subscriptions:
+            if chart_namespace in self.namespace_selection or not self.namespace_selection:
+                return True
+        return False
+
+
     def _chart_collections(self):
         """Find out the cluster's cloud ID and what its provisioner is
             This is used to determine which charts to load
@@ -178,22 +279,158 @@ class LandscaperChartsCollection(ChartsCollection):
          - get secrets from Vault as environment variables
          - run landscaper apply
         """
-        namespaces_to_apply = self.__namespaces()
+        namespaces_to_apply = self.namespaces()
         for namespace in namespaces_to_apply:
-            envvar_secrets_for_namespace = self.get_landscaper_envvars_for_namespace(namespace)
-            # Get list of yaml files
-            yamlfiles_in_namespace = [item.filepath for item in self.charts if item.namespace == namespace]
+            self.converge_namespace(namespace, dry_run)
+
+
+    def converge_namespace(self, namespace, dry_run):
+        """Gets secrets for a namespace from Vault and applies its charts
+
+        Args:
+            namespace: The namespace to apply
+            dry_run: flag for simulating convergence
+
+        Returns:
+            None.
+        """
+        if self.skip_unchanged:
+            changed_releases = self.changed_releases()
+            namespace_releases = [r for r in changed_releases
+                                  if changed_releases[r]['namespace'] == namespace]
+            if not namespace_releases:
+                logging.info("Releases in {0} unchanged. Skipping".format(namespace))
+                run_metrics.increment('landscape_incremental_namespaces',
+                                      mode='skip_unchanged', outcome='skipped',
+                                      cluster=self.cluster_id)
+                return
+            run_metrics.increment('landscape_incremental_namespaces',
+                                  mode='skip_unchanged', outcome='applied',
+                                  cluster=self.cluster_id)
+        envvar_secrets_for_namespace = self.get_landscaper_envvars_for_namespace(namespace)
+        # Get list of yaml files
+        charts_in_namespace = [item for item in self.charts if item.namespace == namespace]
+        with self.landscaper_files(charts_in_namespace) as yamlfiles_in_namespace:
             self.deploy_charts_for_namespace(yamlfiles_in_namespace, namespace, envvar_secrets_for_namespace, dry_run)
 
 
-    def __namespaces(self):
+    @contextlib.contextmanager
+    def landscaper_files(self, charts):
+        """Paths of the Landscaper YAML files of charts, for landscaper apply
+
+        Charts read from git are written to a temporary directory, removed
+        when the context exits.
+
+        Args:
+            charts: LandscaperCharts
+
+        Returns:
+            A context manager yielding a list of paths
+        """
+        if not self.git_objects:
+            yield [chart.filepath for chart in charts]
+            return
+        git_store = git_object_store(self.workdir)
+        materialized_dir = tempfile.mkdtemp(prefix='landscape-charts-')
+        try:
+            materialized_files = []
+            for chart in charts:
+                chart_path = os.path.join(materialized_dir,
+                                          os.path.relpath(chart.filepath, self.workdir))
+                if not os.path.exists(os.path.dirname(chart_path)):
+                    os.makedirs(os.path.dirname(chart_path))
+                with open(chart_path, 'wb') as chart_file:
+                    chart_file.write(git_store.read_blob(chart.blob))
+                materialized_files.append(chart_path)
+            yield materialized_files
+        finally:
+            shutil.rmtree(materialized_dir)
+
+
+    def changed_releases(self, max_workers=4):
+        """Releases whose deployed state differs from the Landscaper YAML
+
+        Compares the chart, version and values of every release against what
+        helm reports as deployed. Computed once, then cached.
+
+        Args:
+            max_workers: Maximum concurrent helm get values commands
+
+        Returns:
+            A dict mapping release names to dicts with namespace and reason
+            keys, for releases which need to be applied. Includes deployed
+            releases in the selected namespaces which aren't in Landscaper
+            YAML, since landscaper deletes them.
+        """
+        with self._changed_releases_lock:
+            if self._changed_releases is None:
+                charts = self.charts
+                desired_releases = {}
+                for chart in charts:
+                    desired_releases[chart.release_name] = {
+                        'chart': chart_version_name(chart.release),
+                        'namespace': chart.namespace,
+                        'values': self.desired_release_values(chart),
+                    }
+                namespaces = sorted(set([c.namespace for c in charts]))
+                changed = self.release_inventory.diff(desired_releases,
+                                                      max_workers=max_workers,
+                                                      namespaces=namespaces,
+                                                      ignore_values=self.DRIVER_VALUES)
+                deployed = self.release_inventory.releases()
+                self._changed_releases = {}
+                for release_name, reason in changed.items():
+                    if release_name in desired_releases:
+                        namespace = desired_releases[release_name]['namespace']
+                    else:
+                        namespace = deployed[release_name]['namespace']
+                    self._changed_releases[release_name] = {
+                        'namespace': namespace,
+                        'reason': reason,
+                    }
+            return self._changed_releases
+
+
+    def desired_release_values(self, chart):
+        """Values a chart's release should be deployed with
+
+        landscaper passes secrets through a Kubernetes secret, not values, so
+        secret changes aren't detected for this driver.
+
+        Args:
+            chart: The LandscaperChart
+
+        Returns:
+            A dict of values
+        """
+        return dict(chart.configuration)
+
+
+    def diff(self, max_workers=4):
+        """Pretty-prints releases which need to be applied
+
+        Returns:
+            A new-line separated str of releases in format:
+            namespace/release: reason
+        """
+        changed_releases = self.changed_releases(max_workers=max_workers)
+        output_lines = []
+        for release_name in sorted(changed_releases,
+                                   key=lambda r: (changed_releases[r]['namespace'], r)):
+            output_lines.append("{0}/{1}: {2}".format(
+                changed_releases[release_name]['namespace'],
+                release_name,
+                changed_releases[release_name]['reason']))
+        return '\n'.join(output_lines)
+
+
+    def namespaces(self):
         """Returns a list of namespaces defined in all charts for provisioner
            This means all namespaces in 1 of minikube, terraform, or unmanaged
+
+           PRIORTY_NAMESPACES are listed first
         """
-        PRIORTY_NAMESPACES = [
-            'auto-approve-csrs',
-            'kube-system',
-        ]
+        PRIORTY_NAMESPACES = LandscaperChartsCollection.PRIORTY_NAMESPACES
         sorted_namespaces = []
         nsdict = {}
         all_provisioner_charts = self.charts
@@ -203,6 +440,9 @@ class LandscaperChartsCollection(ChartsCollection):
             if not candidate_ns in nsdict:
                 nsdict[candidate_ns] = 1
 
+        if self.changed_namespaces is not None:
+            nsdict = {ns: 1 for ns in nsdict if ns in self.changed_namespaces}
+
         # install the high-priority namespaces first
         for priority_namespace in PRIORTY_NAMESPACES:
             if priority_namespace in nsdict:
@@ -216,48 +456,208 @@ class LandscaperChartsCollection(ChartsCollection):
         return sorted_namespaces
 
 
+    def preflight(self, max_workers=4):
+        """Checks every selected chart and its secrets, before applying any
+
+        Runs concurrently:
+         - validates every Landscaper YAML file
+         - reads every declared secret from Vault. Secrets are kept, so
+           converging doesn't read them again
+        Then checks every namespace for missing secrets and environment
+        variable collisions between charts.
+
+        Args:
+            max_workers: Maximum number of files or Vault secrets read at once
+
+        Returns:
+            A list of problems (str). Empty if the charts can be applied.
+        """
+        cluster_ns_subscriptions = self.cluster.namespace_subscriptions
+        problems = []
+        for landscaper_yaml, chart_info, errors, _ in self._landscaper_yaml(max_workers):
+            if isinstance(chart_info, dict) and \
+                    isinstance(chart_info.get('namespace'), str) and \
+                    not self._namespace_selected(chart_info['namespace'],
+                                                 cluster_ns_subscriptions):
+                continue
+            problems += ["{0}: {1}".format(landscaper_yaml, e) for e in errors]
+        if problems:
+            # charts can't be loaded
+            return problems
+
+        charts = self.charts
+        git_branch = self.git_branch
+        charts_with_secrets = [c for c in charts if c.secrets]
+        def read_chart_secrets(chart):
+            try:
+                return self.vault_secrets_for_chart(chart.namespace, chart.name,
+                                                    git_branch=git_branch)
+            except PREFLIGHT_SECRET_ERRORS as e:
+                return e
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for chart, chart_secrets in zip(charts_with_secrets,
+                    executor.map(read_chart_secrets, charts_with_secrets)):
+                if isinstance(chart_secrets, PREFLIGHT_SECRET_ERRORS):
+                    problems.append("{0}: {1}".format(chart, chart_secrets))
+                else:
+                    self._chart_secrets[(chart.namespace, chart.name)] = chart_secrets
+        if problems:
+            return problems
+
+        for namespace in sorted(set([c.namespace for c in charts])):
+            _, namespace_problems = self._secrets_for_namespace(namespace, charts)
+            problems += namespace_problems
+        return problems
+
+
+    def restrict_to_changes_since(self, git_ref):
+        """Only converge namespaces whose Landscaper YAML changed since git_ref
+
+        If any of PRIORTY_NAMESPACES changed, all of them are converged (first,
+        in order), since later namespaces may depend on the whole group.
+
+        A namespace left with no charts (all moved or deleted) isn't
+        converged, as there's nothing to apply to it. It's logged, so that
+        its releases can be deleted by hand.
+
+        Args:
+            git_ref: A git revision, e.g. the last deployed commit
+
+        Returns:
+            A sorted list of the namespaces which will be converged
+        """
+        self.changed_namespaces = None
+        all_namespaces = self.namespaces()
+        changed_namespaces = self.namespaces_changed_since(git_ref)
+        if changed_namespaces.intersection(self.PRIORTY_NAMESPACES):
+            changed_namespaces.update(self.PRIORTY_NAMESPACES)
+        emptied_namespaces = changed_namespaces.difference(
+            all_namespaces, self.PRIORTY_NAMESPACES)
+        if emptied_namespaces:
+            logging.warning("No charts left in {0} since {1}. Not converging "
+                            "them".format(', '.join(sorted(emptied_namespaces)),
+                                          git_ref))
+        self.changed_namespaces = changed_namespaces
+        namespaces = self.namespaces()
+        run_metrics.increment('landscape_incremental_namespaces',
+                              len(namespaces), mode='changed_since',
+                              outcome='applied', cluster=self.cluster_id)
+        run_metrics.increment('landscape_incremental_namespaces',
+                              len(all_namespaces) - len(namespaces),
+                              mode='changed_since', outcome='skipped',
+                              cluster=self.cluster_id)
+        logging.info("Changed since {0}: {1}".format(git_ref,
+                                                      ', '.join(namespaces) or 'nothing'))
+        return namespaces
+
+
+    def namespaces_changed_since(self, git_ref):
+        """Namespaces of the Landscaper YAML files changed since a git revision
+
+        Files are compared with the working tree, or with git_objects, with
+        the cluster's landscaper branch. Both the current and the earlier
+        namespace of each changed file count, so moving a chart to another
+        namespace changes both.
+
+        Args:
+            git_ref: A git revision
+
+        Returns:
+            A set of namespace names
+        """
+        git_store = git_object_store(self.workdir)
+        collections = self._chart_collections()
+        diff_cmd = ['git', 'diff', '--name-only', '--relative', '--no-renames', git_ref]
+        if self.git_objects:
+            diff_cmd.append(git_store.resolve_tree([self.git_branch,
+                                                    'origin/' + self.git_branch]))
+        diff_cmd += ['--'] + collections
+        git_diff = command_runner.run(diff_cmd, cwd=self.workdir, echo=False)
+        if git_diff.failed:
+            raise ValueError("git diff against {0} failed: {1}".format(
+                git_ref, git_diff.stderr.strip()))
+        changed_paths = [p for p in git_diff.output.splitlines() if p.endswith('.yaml')]
+
+        current_namespaces = {}
+        for chart in self.charts:
+            current_namespaces[os.path.relpath(chart.filepath, self.workdir)] = chart.namespace
+        earlier_tree = git_store.subtree(git_store.resolve_tree([git_ref]),
+                                         git_store.prefix())
+        changed_namespaces = set()
+        for changed_path in changed_paths:
+            if changed_path in current_namespaces:
+                changed_namespaces.add(current_namespaces[changed_path])
+            earlier_blob = earlier_tree and git_store.blob_at(earlier_tree, changed_path)
+            if earlier_blob:
+                chart_info, _ = git_store.landscaper_yaml(earlier_blob)
+                if isinstance(chart_info, dict) and isinstance(chart_info.get('namespace'), str):
+                    changed_namespaces.add(chart_info['namespace'])
+        return changed_namespaces
+
+
+    @traced('charts', lambda self, namespace: {'cluster': self.cluster_id,
+                                               'namespace': namespace})
     def get_landscaper_envvars_for_namespace(self, namespace):
         # pull secrets from Vault and apply them as env vars
+        secrets_env, problems = self._secrets_for_namespace(namespace, self.charts)
+        if problems:
+            for problem in problems:
+                logging.error(problem)
+            sys.exit(1)
+        landscaper_env_vars = self.vault_secrets_to_envvars(secrets_env)
+        return landscaper_env_vars
+
+
+    def _secrets_for_namespace(self, namespace, charts):
+        """Gathers the secrets of every chart in a namespace
+
+        Args:
+            namespace: The namespace
+            charts: LandscaperCharts to gather secrets from
+
+        Returns:
+            A tuple of (secrets dict, list of problems). Problems are missing
+            secrets and secrets whose environment variables would collide.
+        """
         secrets_env = {}
-        for chart_release_definition in self.charts:
+        envvar_owners = {}
+        problems = []
+        for chart_release_definition in charts:
             if chart_release_definition.namespace == namespace and chart_release_definition.secrets:
                 chart_secrets_envvars = self.vault_secrets_for_chart(
                                             chart_release_definition.namespace,
                                             chart_release_definition.name)
 
-                # Check if this chart's secrets would conflict with existing
-                # environment variables. Update the env vars with them, if not.
-                # Generate error message if key already exists.
+                # Check if this chart's secrets would conflict with the
+                # environment variables of another chart. Update the env vars
+                # with them, if not.
                 for envvar_key, envvar_val in chart_secrets_envvars.items():
-                    if envvar_key not in secrets_env:
-                        secrets_env[envvar_key] = envvar_val
+                    envvar_name = self.helm_secret_name_to_envvar_name(envvar_key)
+                    if envvar_name in envvar_owners:
+                        problems.append("Environment variable {0} set by both {1} and {2}".format(
+                            envvar_name, envvar_owners[envvar_name], chart_release_definition))
                     else:
-                        raise ValueError("Environment variable {0} already set in environment! Aborting.")
+                        envvar_owners[envvar_name] = chart_release_definition
+                        secrets_env[envvar_key] = envvar_val
 
                 # check each landscaper yaml secret to make sure it's been pulled
                 # from Vault.
-                # Build a list of missing secrets
-                vault_missing_secrets = []
                 for landscaper_secret in chart_release_definition.secrets:
-                    # Generate error message if secret(s) missing
-                    if landscaper_secret not in secrets_env:
-                        vault_missing_secrets.append(landscaper_secret)
-                # Report on any missing secrets
-                if vault_missing_secrets:
-                    for missing_secret in vault_missing_secrets:
-                        logging.error('Missing landscaper secret ' + missing_secret)
-                    sys.exit(1)
-
-        landscaper_env_vars = self.vault_secrets_to_envvars(secrets_env)
-        return landscaper_env_vars
+                    if landscaper_secret not in chart_secrets_envvars:
+                        problems.append("Missing landscaper secret {0} for {1}".format(
+                            landscaper_secret, chart_release_definition))
+        return secrets_env, problems
 
 
+    @traced('charts', lambda self, landscaper_filepaths, k8s_namespace, *args: {
+                'cluster': self.cluster_id,
+                'namespace': k8s_namespace})
     def deploy_charts_for_namespace(self, landscaper_filepaths, k8s_namespace, envvars, simulate):
         """Pulls secrets from Vault and converges charts using Landscaper.
 
-        Helm Tiller must already be installed. Injects environment variables 
-        pulled from Vault into local environment variables, so landscaper can
-        apply the secrets from Vault.
+        Helm Tiller must already be installed. Injects environment variables
+        pulled from Vault into the landscaper process's environment, so
+        landscaper can apply the secrets from Vault.
 
         Args:
             dry_run: flag for simulating convergence
@@ -272,46 +672,72 @@ class LandscaperChartsCollection(ChartsCollection):
         # Build up a list of namespaces to apply, and deploy them
         # Note: Deploying a single chart is not possible when more than 2
         #       at in a namespace. This is because Landscaper wipes the ns 1st 
-        ls_apply_cmd = 'landscaper apply -v --namespace=' + \
-                            k8s_namespace + \
-                            ' --context=' + self.cluster_id
+        ls_apply_cmd = ['landscaper', 'apply', '-v',
+                        '--namespace=' + k8s_namespace,
+                        '--context=' + self.cluster_id]
         # point Landscaper at the right helm home directory
         # (it doesn't respect the HELM_HOME environment variable)
         if 'HELM_HOME' in os.environ:
             helm_home = os.environ['HELM_HOME']
-            ls_apply_cmd += ' --helm-home={0}'.format(helm_home)
-        ls_apply_cmd += ' ' + ' '.join(landscaper_filepaths)
+            ls_apply_cmd.append('--helm-home={0}'.format(helm_home))
+        ls_apply_cmd += landscaper_filepaths
 
         if simulate:
-            ls_apply_cmd += ' --dry-run'
-        logging.info('Executing: ' + ls_apply_cmd)
-        # update env to preserve VAULT_ env vars
-        os.environ.update(envvars)
-        create_failed = subprocess.call(ls_apply_cmd, shell=True)
+            ls_apply_cmd.append('--dry-run')
+        logging.info('Executing: ' + ' '.join(ls_apply_cmd))
+        # pass secrets to this landscaper process only (preserving VAULT_ env
+        # vars), so namespaces can be applied concurrently
+        create_failed = command_runner.run(ls_apply_cmd, env=envvars,
+                                           label=k8s_namespace).failed
         if create_failed:
-            sys.exit("ERROR: non-zero retval for {}".format(ls_apply_cmd))
+            sys.exit("ERROR: non-zero retval for {}".format(' '.join(ls_apply_cmd)))
+
 
+    def secrets_versions(self, namespace):
+        """KV version 2 versions of the Vault secrets of a namespace's charts
 
-    def vault_secrets_for_chart(self, chart_namespace, chart_name):
+        Only metadata is read, not the secrets themselves.
+
+        Args:
+            namespace: The namespace
+
+        Returns:
+            A dict mapping each chart's secrets path to its current version
+            (None if missing). Empty with KV version 1
+        """
+        vault_client = secrets_backend()
+        if vault_client.kv_version != 2:
+            return {}
+        git_branch = self.git_branch
+        secrets_paths = [chart_secrets_path(git_branch, chart.namespace, chart.name)
+                         for chart in self.charts
+                         if chart.namespace == namespace and chart.secrets]
+        return {p: vault_client.current_version(p) for p in secrets_paths}
+
+
+    def vault_secrets_for_chart(self, chart_namespace, chart_name, git_branch=None):
         """Read Vault secrets for a deployment (chart name + namespace).
 
+        Secrets already read by preflight() aren't read again.
+
         Args:
             chart_namespace: The namespace where the chart will be installed.
             chart_name: The name of the chart being installed.
+            git_branch: The cluster's landscaper branch. Looked up if None.
 
         Returns:
             A dict of Vault secrets, pulled from a deployment-specific key
 
         Raises:
-            None.
+            ValueError: if the secrets are missing from Vault
         """
-        chart_vault_secret = "/secret/landscape/charts/{0}/{1}/{2}".format(
-                                                    self.git_branch,
-                                                    chart_namespace,
-                                                    chart_name
-                                                   )
+        if (chart_namespace, chart_name) in self._chart_secrets:
+            return self._chart_secrets[(chart_namespace, chart_name)]
+        chart_vault_secret = chart_secrets_path(git_branch or self.git_branch,
+                                                chart_namespace,
+                                                chart_name)
         logging.info("Reading path {0}".format(chart_vault_secret))
-        vault_secrets = VaultClient().dump_vault_from_prefix(chart_vault_secret, strip_root_key=True)
+        vault_secrets = secrets_backend().dump_vault_from_prefix(chart_vault_secret, strip_root_key=True)
         return vault_secrets
 
 
@@ -354,3 +780,17 @@ class LandscaperChartsCollection(ChartsCollection):
             None.
         """
         return keyname.replace('-', '_').upper()
+
+
+def _load_landscaper_yaml(landscaper_yaml):
+    """Parses and validates a Landscaper YAML file
+
+    Returns:
+        A tuple of (parsed YAML, list of problems)
+    """
+    try:
+        with open(landscaper_yaml) as f:
+            chart_info = yaml.safe_load(f)
+    except (IOError, yaml.YAMLError) as e:
+        return None, ["unreadable: {0}".format(e)]
+    return chart_info, landscaper_yaml_errors(chart_info)
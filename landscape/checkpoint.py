@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+
+class ConvergeCheckpoint(object):
+    """Records which converge steps completed, so a failed run can resume
+
+    The checkpoint is a JSON file mapping step keys (e.g.,
+    namespace:minikube/kube-system) to the step's state and fingerprint.
+    It is rewritten atomically after every step, so it survives the run
+    being killed.
+
+    Attributes:
+        path: The checkpoint file
+    """
+
+    def __init__(self, path, resume=False):
+        """Opens a checkpoint
+
+        Args:
+            path: The checkpoint file
+            resume: Keep steps recorded by an earlier run. Otherwise the
+                checkpoint starts empty
+
+        Returns:
+            None.
+        """
+        self.path = path
+        self._steps = {}
+        self._lock = threading.Lock()
+        if resume and os.path.exists(path):
+            with open(path) as checkpoint_file:
+                self._steps = json.load(checkpoint_file).get('steps', {})
+            logging.info("Resuming from checkpoint {0}".format(path))
+
+
+    def is_done(self, key, fingerprint):
+        """True if a step completed with the same fingerprint
+
+        Args:
+            key: The step's key
+            fingerprint: The step's current fingerprint (str or None)
+
+        Returns:
+            bool
+        """
+        with self._lock:
+            step = self._steps.get(key)
+        return bool(step) and step['state'] == 'done' and \
+            step['fingerprint'] == fingerprint
+
+
+    def record(self, key, state, fingerprint):
+        """Records the outcome of a step and saves the checkpoint
+
+        Args:
+            key: The step's key
+            state: done or failed
+            fingerprint: The step's fingerprint (str or None)
+
+        Returns:
+            None.
+        """
+        with self._lock:
+            self._steps[key] = {
+                'state': state,
+                'fingerprint': fingerprint,
+                'finished': time.time(),
+            }
+            self._save()
+
+
+    def _save(self):
+        checkpoint_dir = os.path.dirname(self.path)
+        if checkpoint_dir and not os.path.exists(checkpoint_dir):
+            os.makedirs(checkpoint_dir)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump({'steps': self._steps}, checkpoint_file, indent=2,
+                      sort_keys=True)
+        os.rename(tmp_path, self.path)
+
+
+def checkpoint_path(artifacts_dir, *names):
+    """Path of the checkpoint file for a command and its selection
+
+    e.g., .landscape/checkpoint-charts-minikube.json
+    """
+    return os.path.join(artifacts_dir,
+                        'checkpoint-' + '-'.join([str(n) for n in names]) + '.json')
+
+
+def attributes_fingerprint(obj):
+    """Fingerprints the public attributes of a Cloud or Cluster
+
+    Returns:
+        A hex sha256 digest (str)
+    """
+    attributes = {k: v for k, v in vars(obj).items() if not k.startswith('_')}
+    return hashlib.sha256(json.dumps(attributes, sort_keys=True,
+                                     default=str).encode('utf-8')).hexdigest()
+
+
+def files_fingerprint(file_paths):
+    """Fingerprints the paths and contents of a set of files
+
+    Returns:
+        A hex sha256 digest (str)
+    """
+    digest = hashlib.sha256()
+    for file_path in sorted(file_paths):
+        digest.update(file_path.encode('utf-8') + b'\0')
+        with open(file_path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def charts_fingerprint(charts, secrets_versions=None):
+    """Fingerprints the Landscaper YAML of a set of LandscaperCharts
+
+    Charts read from git are fingerprinted by blob hash, others by contents.
+
+    Args:
+        charts: LandscaperCharts
+        secrets_versions: dict mapping the charts' Vault secret paths to
+            their KV version 2 versions, if known
+
+    Returns:
+        A hex sha256 digest (str)
+    """
+    digest = hashlib.sha256()
+    if secrets_versions:
+        digest.update(json.dumps(secrets_versions, sort_keys=True).encode('utf-8'))
+    for chart in sorted(charts, key=lambda c: c.filepath):
+        if chart.blob:
+            digest.update(chart.filepath.encode('utf-8') + b'\0' +
+                          chart.blob.encode('ascii'))
+        else:
+            digest.update(files_fingerprint([chart.filepath]).encode('ascii'))
+    return digest.hexdigest()
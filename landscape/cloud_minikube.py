@@ -1,11 +1,13 @@
-import subprocess
 import sys
 import logging
 import shutil
 import os
+import time
 from os.path import expanduser
 
 from .cloud import Cloud
+from .timeline import traced
+from .commandrunner import command_runner
 
 
 class MinikubeCloud(Cloud):
@@ -18,6 +20,7 @@ class MinikubeCloud(Cloud):
         Inherited from superclass.
     """
 
+    @traced('cloud', lambda self, *args, **kwargs: {'cloud': self.name})
     def converge(self, dry_run):
         """Converges state of a minikube VM
 
@@ -33,9 +36,9 @@ class MinikubeCloud(Cloud):
         Raises:
             None.
         """
-        status_cmd = 'minikube status --format=\'{{.MinikubeStatus}}\''
-        proc = subprocess.Popen(status_cmd, stdout=subprocess.PIPE, shell=True)
-        cloud_status = proc.stdout.read().rstrip().decode()
+        status_cmd = ['minikube', 'status', '--format={{.MinikubeStatus}}']
+        cloud_status = command_runner.run(status_cmd, timeout=60,
+                                          echo=False).output
         logging.debug('Minikube Cloud status is ' + cloud_status)
         if cloud_status == 'Running':
             if not dry_run:
@@ -79,27 +82,24 @@ class MinikubeCloud(Cloud):
         shutil.copy(docker_local_auth_file, minikube_file_copy_location)
 
         # start minikube
-        start_cmd_tmpl = 'minikube start ' + \
-                '--kubernetes-version=v{0} ' + \
-                "--vm-driver={1} " + \
-                "--dns-domain={2} " + \
-                '--extra-config=apiserver.Authorization.Mode=RBAC ' + \
+        start_cmd = ['minikube', 'start',
+                '--kubernetes-version=v{0}'.format('1.8.0'),
+                '--vm-driver={0}'.format('xhyve'),
+                '--dns-domain={0}'.format('cluster.local'),
+                '--extra-config=apiserver.Authorization.Mode=RBAC',
                 '--extra-config=controller-manager.ClusterSigningCertFile=' + \
-                '/var/lib/localkube/certs/ca.crt ' + \
+                '/var/lib/localkube/certs/ca.crt',
                 '--extra-config=controller-manager.ClusterSigningKeyFile=' + \
-                '/var/lib/localkube/certs/ca.key ' + \
-                '--cpus=8 ' + \
-                '--disk-size=40g ' + \
-                '--memory=8192 ' + \
-                '--docker-env HTTPS_PROXY=$http_proxy ' + \
-                '--docker-env HTTP_PROXY=$https_proxy ' + \
-                '--keep-context ' + \
-                '-v=2'
-        start_cmd = start_cmd_tmpl.format('1.8.0',
-                                            'xhyve',
-                                            'cluster.local')
-        logging.info("Starting minikube with command: {0}".format(start_cmd))
-        minikube_start_failed = subprocess.call(start_cmd, shell=True)
+                '/var/lib/localkube/certs/ca.key',
+                '--cpus=8',
+                '--disk-size=40g',
+                '--memory=8192',
+                '--docker-env', 'HTTPS_PROXY=' + os.environ.get('http_proxy', ''),
+                '--docker-env', 'HTTP_PROXY=' + os.environ.get('https_proxy', ''),
+                '--keep-context',
+                '-v=2']
+        logging.info("Starting minikube with command: {0}".format(' '.join(start_cmd)))
+        minikube_start_failed = command_runner.run(start_cmd).failed
         if minikube_start_failed:
             sys.exit('ERROR: minikube cloud initialization failure')
         # TODO: fix start-up issues after setting the clock
@@ -109,8 +109,11 @@ class MinikubeCloud(Cloud):
     def set_minikube_clock(self):
         """Workaround for https://github.com/kubernetes/minikube/issues/1378
         """
-        cmd = 'minikube ssh -- docker run -i --rm --privileged --pid=host debian nsenter -t 1 -m -u -n -i date -u $(date -u +%m%d%H%M%Y)'
-        cmd_failed = subprocess.call(cmd, shell=True)
+        utc_now = time.strftime('%m%d%H%M%Y', time.gmtime())
+        cmd = ['minikube', 'ssh', '--', 'docker', 'run', '-i', '--rm',
+               '--privileged', '--pid=host', 'debian', 'nsenter', '-t', '1',
+               '-m', '-u', '-n', '-i', 'date', '-u', utc_now]
+        cmd_failed = command_runner.run(cmd).failed
         if cmd_failed:
             sys.exit('ERROR: could not set clock of minikube')
         else:
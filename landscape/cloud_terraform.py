@@ -1,9 +1,10 @@
-import subprocess
 import sys
 import os
 import logging
 
 from .cloud import Cloud
+from .timeline import traced
+from .commandrunner import command_runner
 
 class TerraformCloud(Cloud):
     """A Terraform-provisioned resource-set
@@ -42,7 +43,7 @@ class TerraformCloud(Cloud):
 
 
     def envvars(self):
-        """Updates current environment variables for Google and Terraform.
+        """Environment variables for Google and Terraform commands.
 
         Sets GOOGLE_APPLICATION_CREDENTIALS for interacting with GCP
         Sets TF_LOG for log verbosity
@@ -61,10 +62,14 @@ class TerraformCloud(Cloud):
         tf_log = 'INFO'
         if current_log_level == 'DEBUG':
             tf_log = 'TRACE'
-        return os.environ.update({
+        # copy, rather than update os.environ, which is shared by converges
+        # running on other threads
+        terraform_env = dict(os.environ)
+        terraform_env.update({
             'GOOGLE_APPLICATION_CREDENTIALS': self.__gcp_auth_jsonfile,
             'TF_LOG': tf_log
         })
+        return terraform_env
 
 
     def service_account_email(self):
@@ -92,6 +97,7 @@ class TerraformCloud(Cloud):
         f.close()
 
 
+    @traced('cloud', lambda self, *args, **kwargs: {'cloud': self.name})
     def converge(self, dry_run):
         """Converges a Terraform cloud environment.
 
@@ -109,41 +115,65 @@ class TerraformCloud(Cloud):
         """
         self.write_gcloud_keyfile_json()
         self.init_terraform()
+        terraform_vars = self.terraform_vars()
+        terraform_state = "-state={0}".format(self.terraform_statefile)
+
+        # dry-run validates and plans. Otherwise, also apply
+        terraform_cmds = [
+            ['terraform', 'validate'] + terraform_vars,
+            ['terraform', 'plan'] + terraform_vars + [terraform_state],
+        ]
+        if not dry_run:
+            terraform_cmds.append(['terraform', 'apply'] + terraform_vars + \
+                                    [terraform_state])
+        terraform_env = self.envvars()
+        for terraform_cmd in terraform_cmds:
+            logging.info('Running terraform command: ' + ' '.join(terraform_cmd) + ' in dir: ' + self.terraform_dir)
+            failed_terraform = command_runner.run(terraform_cmd,
+                                                  cwd=self.terraform_dir,
+                                                  env=terraform_env).failed
+            if failed_terraform:
+                sys.exit('ERROR: terraform command failed')
+
+
+    def terraform_vars(self):
+        """Variables for terraform validate, plan and apply (list of args)"""
         # TODO: push logic to terraform repo Makefile
-        # Generate terraform command: populate variables
-        tf_vars_args = '-var="gce_project_id={0}" ' + \
-                        '-var="gke_cluster1_name={1}" ' + \
-                        '-var="gke_cluster1_version={2}"'
-        terraform_vars = tf_vars_args.format(self.name,
-                            'master',
-                            '1.8.1-gke.0')
-
-        # Generate terraform command: dry-run
-        terraform_plan_cmd_tmpl = 'terraform validate ' + terraform_vars + \
-            ' && ' + \
-            'terraform plan ' + terraform_vars + \
-            " -state={0}".format(self.terraform_statefile)
-
-        terraform_apply_cmd_tmpl = terraform_plan_cmd_tmpl + ' && ' + 'terraform apply ' + terraform_vars + \
-                                " -state={0}".format(self.terraform_statefile)
-
-        terraform_cmd = ''
-        converge_state = ''
-        if dry_run:
-            terraform_cmd = terraform_plan_cmd_tmpl.format(self.name,
-                                                            'master',
-                                                            '1.8.1-gke.0')
-        else:
-            terraform_cmd = terraform_apply_cmd_tmpl.format(self.name,
-                                                            'master',
-                                                            '1.8.1-gke.0')
-        logging.info('Running terraform command: ' + terraform_cmd + ' in dir: ' + self.terraform_dir)
-        failed_terraform = subprocess.call(terraform_cmd,
-                                            cwd=self.terraform_dir,
-                                            env=self.envvars(),
-                                            shell=True)
-        if failed_terraform:
-            sys.exit('ERROR: terraform command failed')
+        return [
+            '-var=gce_project_id={0}'.format(self.name),
+            '-var=gke_cluster1_name={0}'.format('master'),
+            '-var=gke_cluster1_version={0}'.format('1.8.1-gke.0'),
+        ]
+
+
+    @traced('cloud', lambda self, *args, **kwargs: {'cloud': self.name})
+    def plan_has_changes(self):
+        """Checks whether terraform would change the cloud
+
+        Runs terraform plan -detailed-exitcode, without applying.
+
+        Args:
+            None.
+
+        Returns:
+            True if terraform plans changes, False if the cloud is up-to-date.
+
+        Raises:
+            ChildProcessError: if terraform fails.
+        """
+        self.write_gcloud_keyfile_json()
+        self.init_terraform()
+        plan_cmd = ['terraform', 'plan', '-detailed-exitcode', '-input=false'] + \
+            self.terraform_vars() + ["-state={0}".format(self.terraform_statefile)]
+        plan = command_runner.run(plan_cmd, cwd=self.terraform_dir,
+                                  env=self.envvars(), echo=False,
+                                  label=self.name)
+        # -detailed-exitcode: 0 means no changes, 2 means changes, 1 an error
+        if plan.returncode == 0:
+            return False
+        elif plan.returncode == 2:
+            return True
+        raise ChildProcessError("terraform plan failed for {0}".format(self.name))
 
 
     def init_terraform(self):
@@ -160,23 +190,20 @@ class TerraformCloud(Cloud):
         """
         self.link_terraform_state_to_project()
 
-        tf_init_cmd_tmpl = 'terraform init ' + \
-                        '-backend-config "bucket=tfstate-{0}" ' + \
-                        '-backend-config "path=tfstate-{0}" ' + \
-                        '-backend-config "project={0}"'
-
-        tf_init_cmd = tf_init_cmd_tmpl.format(self.name)
+        tf_init_cmd = ['terraform', 'init',
+                       '-backend-config', "bucket=tfstate-{0}".format(self.name),
+                       '-backend-config', "path=tfstate-{0}".format(self.name),
+                       '-backend-config', "project={0}".format(self.name)]
 
         if not self._DRYRUN:
-            logging.info('Initializing terraform with command: {0} in dir: {1}'.format(tf_init_cmd, self.terraform_dir))
-            failed_to_init_terraform = subprocess.call(tf_init_cmd,
+            logging.info('Initializing terraform with command: {0} in dir: {1}'.format(' '.join(tf_init_cmd), self.terraform_dir))
+            failed_to_init_terraform = command_runner.run(tf_init_cmd,
                                                     cwd=self.terraform_dir,
-                                                    env=self.envvars(),
-                                                    shell=True)
+                                                    env=self.envvars()).failed
             if failed_to_init_terraform:
                 sys.exit('ERROR: terraform init failed')
         else:
-            logging.info('DRYRUN: would be Initializing terraform with command: {0} in dir: {1}'.format(tf_init_cmd, self.terraform_dir))
+            logging.info('DRYRUN: would be Initializing terraform with command: {0} in dir: {1}'.format(' '.join(tf_init_cmd), self.terraform_dir))
 
 
     def link_terraform_state_to_project(self):
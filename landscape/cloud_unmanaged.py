@@ -1,19 +1,20 @@
-import subprocess
 import sys
 import logging
 
 from .cloud import Cloud
+from .timeline import traced
 
 class UnmanagedCloud(Cloud):
     """
     Represents a Cloud provisioned outside of this tool
     """
 
-    def converge(self):
+    @traced('cloud', lambda self, *args, **kwargs: {'cloud': self.name})
+    def converge(self, dry_run):
         """Override this method in your subclass.
 
         Args:
-            None.
+            dry_run: flag for simulating convergence
 
         Returns:
             None.
@@ -21,7 +22,7 @@ class UnmanagedCloud(Cloud):
         Raises:
             NotImplementedError if called directly.
         """
-        if self._DRYRUN:
+        if dry_run or self._DRYRUN:
             logging.info('DRYRUN: UnmanagedClouds do not converge')
         else:
             logging.info('UnmanagedClouds do not converge')
@@ -1,6 +1,8 @@
 import logging
 
-from .vault import VaultClient
+from .vaulttree import vault_tree
+from .backend import secrets_backend
+from .selector import (AttributeIndex, parse_selector)
 from .cloud import Cloud
 from .cloud_minikube import MinikubeCloud
 from .cloud_terraform import TerraformCloud
@@ -16,6 +18,7 @@ class CloudCollection(object):
 
     Attributes:
         clouds: (optionally) filtered list of clouds, read from Vault
+        selector: Selector clouds' Vault attributes must match
     """
 
     vault_prefix = '/secret/landscape/clouds'
@@ -24,8 +27,7 @@ class CloudCollection(object):
     @classmethod
     def LoadCloudByName(cls, cloud_name):
         cloud_vault_path = CloudCollection.vault_prefix + '/' + cloud_name
-        cloud_parameters = VaultClient().dump_vault_from_prefix(
-                            cloud_vault_path, strip_root_key=True)
+        cloud_parameters = vault_tree.read(cloud_vault_path)
         if cloud_parameters['provisioner'] == 'minikube':
             cloud_from_vault = MinikubeCloud(cloud_name, **cloud_parameters)
             return(cloud_from_vault)
@@ -50,16 +52,23 @@ class CloudCollection(object):
             git_branch_selector(str): If set, CloudCollection is
                 composed of only clouds subscribed to this branch. Set in
                 Vault-defined settings for the cloud
+            selector(str): If set, CloudCollection is composed of only
+                clouds matching this selector (e.g., provisioner=terraform)
 
         Returns:
             None.
 
         Raises:
-            None.
+            ValueError: if the selector can't be parsed
         """
 
         self.git_branch_selector = kwargs['git_branch']
+        self.selector = parse_selector(kwargs.get('selector'))
+        if self.git_branch_selector:
+            self.selector.require('provisioner_branch', self.git_branch_selector)
         self._clouds = []
+        self._clouds_by_name = {}
+        self._attribute_index = None
 
 
     def __str__(self):
@@ -75,8 +84,8 @@ class CloudCollection(object):
             None.
         """
         cloud_names = []
-        for cloud in self.clouds:
-            cloud_names.append(cloud.name)
+        for cloud_node in self.selected_nodes():
+            cloud_names.append(cloud_node.name)
         return '\n'.join(cloud_names)
 
 
@@ -94,10 +103,10 @@ class CloudCollection(object):
         Raises:
             None.
         """
-        logging.debug("cloud_name is".format(cloud_name))
-        logging.debug("clouds are".format(self.clouds))
-        cloud = next((item for item in self.clouds if item.name == cloud_name))
-        return cloud
+        logging.debug("cloud_name is {0}".format(cloud_name))
+        if not self._clouds_by_name:
+            self._clouds_by_name = {cloud.name: cloud for cloud in self.clouds}
+        return self._clouds_by_name[cloud_name]
 
 
     @property
@@ -105,20 +114,41 @@ class CloudCollection(object):
         """Loads clouds from Vault and filters them
         """
         if not self._clouds:
-            clouds_in_vault = VaultClient().dump_vault_from_prefix(
-                CloudCollection.vault_prefix, strip_root_key=True)
-            for cloud_name, cloud_attribs in clouds_in_vault.items():
-                if self.valid_cloud_attribs_for_selection(cloud_attribs):
-                    loaded_cloud = CloudCollection.LoadCloudByName(cloud_name)
-                    self._clouds.append(loaded_cloud)
+            cloud_nodes = self.selected_nodes()
+            vault_tree.prefetch(cloud_nodes)
+            for cloud_node in cloud_nodes:
+                loaded_cloud = CloudCollection.LoadCloudByName(cloud_node.name)
+                self._clouds.append(loaded_cloud)
         return self._clouds
 
 
+    def selected_nodes(self):
+        """Lists clouds in Vault, and filters them
+
+        Without a selector, clouds are only listed, not read
+
+        Returns:
+            A list of VaultNodes, one per selected cloud
+        """
+        cloud_nodes = vault_tree.children(CloudCollection.vault_prefix)
+        if self.selector:
+            selected_names = self.selector.select(self.attribute_index())
+            cloud_nodes = [n for n in cloud_nodes if n.name in selected_names]
+        return cloud_nodes
+
+
+    def attribute_index(self):
+        """AttributeIndex of every cloud's Vault attributes, built once"""
+        if self._attribute_index is None:
+            cloud_nodes = vault_tree.children(CloudCollection.vault_prefix)
+            vault_tree.prefetch(cloud_nodes)
+            self._attribute_index = AttributeIndex([(n.name, n.data)
+                                                    for n in cloud_nodes])
+        return self._attribute_index
+
+
     def valid_cloud_attribs_for_selection(self, attribs):
-        if self.git_branch_selector:
-            if attribs['provisioner_branch'] != self.git_branch_selector:
-                return False
-        return True
+        return self.selector.matches(attribs)
 
 
     def __load_clouds_from_vault(self):
@@ -141,7 +171,7 @@ class CloudCollection(object):
             None.
         """
         # Dump Vault
-        cloud_defs = VaultClient().dump_vault_from_prefix(
+        cloud_defs = secrets_backend().dump_vault_from_prefix(
             CloudCollection.vault_prefix, strip_root_key=True)
         # add name into object
         clouds = []
@@ -1,10 +1,11 @@
 import logging
-import subprocess
 import os
 from .kubernetes import kubectl_use_context
 from .helm import wait_for_tiller_ready
 from .vault import VaultClient
 from .cloudcollection import CloudCollection
+from .timeline import traced
+from .commandrunner import command_runner
 
 class Cluster(object):
     """A single generic Kubernetes cluster. Meant to be subclassed.
@@ -49,6 +50,7 @@ class Cluster(object):
         cloud_id = self.cloud_id
         return CloudCollection.LoadCloudByName(cloud_id)
 
+    @traced('cluster', lambda self, *args, **kwargs: {'cluster': self.name})
     def converge(self):
         """Stages of a Kubernetes Cluster converge.
         """
@@ -79,20 +81,18 @@ class Cluster(object):
         Raises:
             None.
         """
-        tiller_pod_status_cmd = 'kubectl get pod --context=' + self.name + \
-                                ' --namespace=kube-system ' + \
-                                '-l app=helm -l name=tiller ' + \
-                                '-o jsonpath=\'{.items[0].status.phase}\''
+        tiller_pod_status_cmd = ['kubectl', 'get', 'pod',
+                                 '--context=' + self.name,
+                                 '--namespace=kube-system',
+                                 '-l', 'app=helm', '-l', 'name=tiller',
+                                 '-o', 'jsonpath={.items[0].status.phase}']
 
         if not self._DRYRUN:
             logging.info('Checking tiller pod status with command: ' + \
-                            tiller_pod_status_cmd)
-            DEVNULL = open(os.devnull, 'w')
-            proc = subprocess.Popen(tiller_pod_status_cmd,
-                                    stdout=subprocess.PIPE,
-                                    stderr=DEVNULL, shell=True)
-
-            tiller_pod_status = proc.stdout.read().rstrip().decode()
+                            ' '.join(tiller_pod_status_cmd))
+            tiller_pod_status = command_runner.run(tiller_pod_status_cmd,
+                                                   timeout=60,
+                                                   echo=False).output
             # if Tiller isn't initialized, wait for it to come up
             if not tiller_pod_status == "Running":
                 logging.info('Did not detect tiller pod')
@@ -103,7 +103,7 @@ class Cluster(object):
             wait_for_tiller_ready(tiller_pod_status_cmd)
         else:
             logging.info('DRYRUN: would be Checking tiller pod status with command: ' + \
-                            tiller_pod_status_cmd)
+                            ' '.join(tiller_pod_status_cmd))
 
 
     def init_tiller(self):
@@ -126,15 +126,15 @@ class Cluster(object):
         self.setup_tiller_clusterrole_and_serviceaccount()
 
         # Initialize Helm by installing Tiller
-        helm_provision_cmd = "helm init --service-account=tiller " + \
-                             "--kube-context={0}".format(self.name)
+        helm_provision_cmd = ['helm', 'init', '--service-account=tiller',
+                              "--kube-context={0}".format(self.name)]
         if not self._DRYRUN:
             logging.info('Initializing Tiller: ' + \
-                            helm_provision_cmd)
-            subprocess.call(helm_provision_cmd, shell=True)
+                            ' '.join(helm_provision_cmd))
+            command_runner.run(helm_provision_cmd)
         else:
             logging.info('DRYRUN: would be Initializing Tiller: ' + \
-                    helm_provision_cmd)
+                    ' '.join(helm_provision_cmd))
 
         # Minikube:
         if self.name == "minikube":
@@ -163,27 +163,27 @@ class Cluster(object):
 
     def create_serviceaccount(self, sa_name, namespace):
         # Create ServiceAccount
-        sa_create_cmd = 'kubectl create serviceaccount ' + sa_name + \
-                        ' --context=' + self.name + \
-                        ' --namespace=' + namespace
+        sa_create_cmd = ['kubectl', 'create', 'serviceaccount', sa_name,
+                         '--context=' + self.name,
+                         '--namespace=' + namespace]
         if not self._DRYRUN:
-            logging.info('Creating serviceaccount: ' + sa_create_cmd)
-            subprocess.call(sa_create_cmd, shell=True)
+            logging.info('Creating serviceaccount: ' + ' '.join(sa_create_cmd))
+            command_runner.run(sa_create_cmd)
         else:
             logging.info('DRYRUN: would be Creating serviceaccount: ' + \
-                    sa_create_cmd)
+                    ' '.join(sa_create_cmd))
 
 
     def create_clusterrolebinding(self, sa_name, namespace, clusterrole):
         # Create ClusterRoleBinding with cluster-admin role
-        crb_create_cmd = 'kubectl create clusterrolebinding ' + \
-                            'landscape-' + sa_name + \
-                            ' --context=' + self.name + \
-                            ' --clusterrole=' + clusterrole + \
-                            ' --serviceaccount=' + namespace + ':' + sa_name
+        crb_create_cmd = ['kubectl', 'create', 'clusterrolebinding',
+                          'landscape-' + sa_name,
+                          '--context=' + self.name,
+                          '--clusterrole=' + clusterrole,
+                          '--serviceaccount=' + namespace + ':' + sa_name]
         if not self._DRYRUN:
-            logging.info('Creating ClusterRoleBinding: ' + crb_create_cmd)
-            subprocess.call(crb_create_cmd, shell=True)
+            logging.info('Creating ClusterRoleBinding: ' + ' '.join(crb_create_cmd))
+            command_runner.run(crb_create_cmd)
         else:
             logging.info('DRYRUN: would be Creating ClusterRoleBinding: ' + \
-                crb_create_cmd)
+                ' '.join(crb_create_cmd))
@@ -1,4 +1,3 @@
-import subprocess
 import logging
 import pexpect
 import os
@@ -6,6 +5,8 @@ import sys
 import time
 
 from .cluster import Cluster
+from .timeline import traced
+from .commandrunner import command_runner
 
 
 class MinikubeCluster(Cluster):
@@ -19,6 +20,7 @@ class MinikubeCluster(Cluster):
         None.
     """
 
+    @traced('cluster', lambda self, *args, **kwargs: {'cluster': self.name})
     def converge(self, dry_run):
         """Converges minikube state and sets addons
 
@@ -41,34 +43,34 @@ class MinikubeCluster(Cluster):
 
         # addons to disable
         for disable_addon in disable_addons:
-            addon_cmd = "minikube addons disable {0}".format(disable_addon)
+            addon_cmd = ['minikube', 'addons', 'disable', disable_addon]
             if not dry_run:
                 logging.warn(
-                    "Disabling addon with command: {0}".format(addon_cmd))
-                check_cmd_failed = subprocess.call(addon_cmd, shell=True)
+                    "Disabling addon with command: {0}".format(' '.join(addon_cmd)))
+                check_cmd_failed = command_runner.run(addon_cmd).failed
                 if check_cmd_failed:
                     logging.warn(
                         'Failed to ' + \
-                        "disable addon with command: {0}".format(addon_cmd))
+                        "disable addon with command: {0}".format(' '.join(addon_cmd)))
             else:
                 logging.info(
                     'DRYRUN: would be ' + \
-                    "Disabling addon with command: {0}".format(addon_cmd))
+                    "Disabling addon with command: {0}".format(' '.join(addon_cmd)))
         # addons to enable
         for enable_addon in enable_addons:
-            addon_cmd = "minikube addons enable {0}".format(enable_addon)
+            addon_cmd = ['minikube', 'addons', 'enable', enable_addon]
             if not dry_run:
                 logging.warn(
-                    "Enabling addon with command: {0}".format(addon_cmd))
-                check_cmd_failed = subprocess.call(addon_cmd, shell=True)
+                    "Enabling addon with command: {0}".format(' '.join(addon_cmd)))
+                check_cmd_failed = command_runner.run(addon_cmd).failed
                 if check_cmd_failed:
                     logging.warn(
                         'Failed to ' + \
-                        "enable addon with command: {0}".format(addon_cmd))
+                        "enable addon with command: {0}".format(' '.join(addon_cmd)))
             else:
                 logging.info(
                     'DRYRUN: would be ' + \
-                    "Enabling addon with command: {0}".format(addon_cmd))
+                    "Enabling addon with command: {0}".format(' '.join(addon_cmd)))
         # self._configure_docker_credentials()
         self.setup_kube_system_clusterrole_and_serviceaccount()
         Cluster.converge(self)
@@ -120,7 +122,7 @@ class MinikubeCluster(Cluster):
 
         # Generate list of commands to run, to set kubeconfig settings
         shcmds = []
-        shcmds.append("kubectl config set-context minikube")
+        shcmds.append(['kubectl', 'config', 'set-context', 'minikube'])
         # for user_attr, user_val in kubectl_user_attrs.items():
         #     shcmds.append("echo kubectl config set users.{0}.{1} {2}".format(user_name, user_attr, user_val))
 
@@ -132,9 +134,9 @@ class MinikubeCluster(Cluster):
 
         # Set kubeconfig via shell commands
         for kubectl_cfg_cmd in shcmds:
-            cfg_failed = subprocess.call(kubectl_cfg_cmd, shell=True)
+            cfg_failed = command_runner.run(kubectl_cfg_cmd).failed
             if cfg_failed:
-                sys.exit("ERROR: non-zero retval for {}".format(kubectl_cfg_cmd))
+                sys.exit("ERROR: non-zero retval for {}".format(' '.join(kubectl_cfg_cmd)))
 
 
     def _configure_docker_credentials(self):
@@ -156,13 +158,13 @@ class MinikubeCluster(Cluster):
         sleep_after_localkube_restart_secs = 20
 
         docker_auth_file = '/var/lib/kubelet/config.json'
-        auth_file_exists_cmd = 'minikube ssh ls ' + docker_auth_file
+        auth_file_exists_cmd = ['minikube', 'ssh', 'ls', docker_auth_file]
         if not self._DRYRUN:
             logging.info("Checking if docker auth is configured: {0}".format(
-                auth_file_exists_cmd))
-            proc = subprocess.Popen(
-                auth_file_exists_cmd, stdout=subprocess.PIPE, shell=True)
-            auth_file_name_match = proc.stdout.read().rstrip().decode()
+                ' '.join(auth_file_exists_cmd)))
+            auth_file_name_match = command_runner.run(auth_file_exists_cmd,
+                                                      timeout=60,
+                                                      echo=False).output
             if auth_file_name_match != docker_auth_file:
                 logging.info('Docker auth not configured on minikube VM. ' +
                              'Copying host docker auth file to minikube')
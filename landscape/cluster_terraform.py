@@ -1,4 +1,3 @@
-import subprocess
 import json
 import os
 import sys
@@ -6,6 +5,8 @@ import logging
 
 from .cluster import Cluster
 from .cloudcollection import CloudCollection
+from .timeline import traced
+from .commandrunner import command_runner
 
 class TerraformCluster(Cluster):
     """A Terraform-provisioned GKE Cluster
@@ -53,6 +54,7 @@ class TerraformCluster(Cluster):
         Cluster.__init__(self, name, **kwargs)
         self._gcloud_auth_jsonfile = os.getcwd() + '/cluster-serviceaccount-' + self.name + '.json'
 
+    @traced('cluster', lambda self, *args, **kwargs: {'cluster': self.name})
     def converge(self, dry_run):
         """Activates authentication for bringing up a Terraform cluster
 
@@ -67,13 +69,13 @@ class TerraformCluster(Cluster):
         """
         self.write_gcloud_keyfile_json()
         envvars = self._update_environment_vars_with_gcp_auth()
-        gce_auth_cmd = "gcloud auth activate-service-account " + \
-                        self.service_account_email() + \
-                        " --key-file=" + self._gcloud_auth_jsonfile
-        logging.info("Running command {0}".format(gce_auth_cmd))
-        gce_auth_failed = subprocess.call(gce_auth_cmd, env=envvars, shell=True)
+        gce_auth_cmd = ['gcloud', 'auth', 'activate-service-account',
+                        self.service_account_email(),
+                        '--key-file=' + self._gcloud_auth_jsonfile]
+        logging.info("Running command {0}".format(' '.join(gce_auth_cmd)))
+        gce_auth_failed = command_runner.run(gce_auth_cmd, env=envvars).failed
         if gce_auth_failed:
-            sys.exit("ERROR: non-zero retval for {}".format(gce_auth_cmd))
+            sys.exit("ERROR: non-zero retval for {}".format(' '.join(gce_auth_cmd)))
         self._configure_kubectl_credentials()
         if not dry_run:
             Cluster.converge(self)
@@ -99,9 +101,11 @@ class TerraformCluster(Cluster):
             None.
         """
 
-        return os.environ.update({
+        gcp_env = dict(os.environ)
+        gcp_env.update({
             'GOOGLE_APPLICATION_CREDENTIALS': self._gcloud_auth_jsonfile,
         })
+        return gcp_env
 
 
     def service_account_email(self):
@@ -165,12 +169,15 @@ class TerraformCluster(Cluster):
             None.
         """
 
-        get_creds_cmd = "gcloud container clusters get-credentials --project={0} --zone={1} {2}".format(self.cloud_id, self._cluster_zone, self._cluster_id)
+        get_creds_cmd = ['gcloud', 'container', 'clusters', 'get-credentials',
+                         "--project={0}".format(self.cloud_id),
+                         "--zone={0}".format(self._cluster_zone),
+                         self._cluster_id]
         envvars = self._update_environment_vars_with_gcp_auth()
-        logging.info("Running command {0}".format(get_creds_cmd))
-        get_creds_failed = subprocess.call(get_creds_cmd, env=envvars, shell=True)
+        logging.info("Running command {0}".format(' '.join(get_creds_cmd)))
+        get_creds_failed = command_runner.run(get_creds_cmd, env=envvars).failed
         if get_creds_failed:
-            sys.exit("ERROR: non-zero retval for {}".format(get_creds_cmd))
+            sys.exit("ERROR: non-zero retval for {}".format(' '.join(get_creds_cmd)))
 
         # set client kubernetes context
         # configure_kubectl_cmd = "kubectl config use-context {0}".format(self.name)
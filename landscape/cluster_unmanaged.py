@@ -1,7 +1,8 @@
-import subprocess
 import sys
 
 from .cluster import Cluster
+from .timeline import traced
+from .commandrunner import command_runner
 
 class UnmanagedCluster(Cluster):
     """An unmanaged Cluster.
@@ -48,14 +49,15 @@ class UnmanagedCluster(Cluster):
             'apiserver_ca': kwargs['kubernetes_apiserver_cacert'],
         }
 
-    def converge(self):
+    @traced('cluster', lambda self, *args, **kwargs: {'cluster': self.name})
+    def converge(self, dry_run):
         """Converge an unmanaged Kubernetes cluster.
 
         Configures credentials in $KUBECONFIG (typically ~/.kube/config) to connect
         to an unmanaged cluster.
 
         Args:
-            None.
+            dry_run: flag for simulating convergence
 
         Returns:
             None.
@@ -63,7 +65,7 @@ class UnmanagedCluster(Cluster):
         Raises:
             None.
         """
-        self.configure_kubectl_credentials()
+        self._configure_kubectl_credentials()
         Cluster.converge(self)
 
 
@@ -83,7 +85,7 @@ class UnmanagedCluster(Cluster):
         Raises:
             None.
         """
-        cluster_name = self.cluster_name
+        cluster_name = self.name
         user_name = cluster_name
         context_name = cluster_name
         credentials = self.k8s_credentials
@@ -105,19 +107,20 @@ class UnmanagedCluster(Cluster):
         # Generate list of commands to run, to set kubeconfig settings
         shcmds = []
         for user_attr, user_val in kubectl_user_attrs.items():
-            shcmds.append("kubectl config set users.{0}.{1} {2}".format(user_name, user_attr, user_val))
+            shcmds.append(['kubectl', 'config', 'set', "users.{0}.{1}".format(user_name, user_attr), user_val])
 
         for cluster_attr, cluster_val in kubectl_cluster_attrs.items():
-            shcmds.append("kubectl config set clusters.{0}.{1} {2}".format(cluster_name, cluster_attr, cluster_val))
+            shcmds.append(['kubectl', 'config', 'set', "clusters.{0}.{1}".format(cluster_name, cluster_attr), cluster_val])
 
         for context_attr, context_val in kubectl_context_attrs.items():
-            shcmds.append("kubectl config set contexts.{0}.{1} {2}".format(context_name, context_attr, context_val))
+            shcmds.append(['kubectl', 'config', 'set', "contexts.{0}.{1}".format(context_name, context_attr), context_val])
 
         # Set kubeconfig via shell commands
         for kubectl_cfg_cmd in shcmds:
-            cfg_failed = subprocess.call(kubectl_cfg_cmd, shell=True)
+            cfg_failed = command_runner.run(kubectl_cfg_cmd, echo=False,
+                                            sensitive=True).failed
             if cfg_failed:
-                sys.exit("ERROR: non-zero retval for {}".format(kubectl_cfg_cmd))
+                sys.exit("ERROR: non-zero retval for {}".format(' '.join(kubectl_cfg_cmd[0:4])))
 
         # configure_kubectl_cmd = "kubectl config use-context {0}".format(self.name)
         # logging.info("running command {0}".format(configure_kubectl_cmd))
@@ -1,6 +1,7 @@
 import logging
 
-from .vault import VaultClient
+from .vaulttree import vault_tree
+from .selector import (AttributeIndex, parse_selector)
 from .cloud import Cloud
 from .cluster_minikube import MinikubeCluster
 from .cluster_terraform import TerraformCluster
@@ -17,6 +18,7 @@ class ClusterCollection(object):
 
     Attributes:
         clusters: (optionally) filtered list of clusters, read from Vault
+        selector: Selector clusters' Vault attributes must match
     """
 
     vault_prefix = '/secret/landscape/clusters'
@@ -24,8 +26,7 @@ class ClusterCollection(object):
     @classmethod
     def LoadClusterByName(cls, cluster_name):
         cluster_vault_path = ClusterCollection.vault_prefix + '/' + cluster_name
-        cluster_parameters = VaultClient().dump_vault_from_prefix(
-                                cluster_vault_path, strip_root_key=True)
+        cluster_parameters = vault_tree.read(cluster_vault_path)
 
         retval = None
         cloud_id_for_cluster = cluster_parameters['cloud_id']
@@ -59,17 +60,27 @@ class ClusterCollection(object):
             git_branch_selector(str): If set, ClusterCollection is
                 composed of only clusters subscribed to this branch. Set in
                 Vault-defined settings for the cluster
+            selector(str): If set, ClusterCollection is composed of only
+                clusters matching this selector (e.g.,
+                namespace_subscriptions=jenkins,landscaper_branch!=master)
 
         Returns:
             None.
 
         Raises:
-            None.
+            ValueError: if the selector can't be parsed
         """
         self.cloud_selector = kwargs['cloud']
         self.git_branch_selector = kwargs['git_branch']
+        self.selector = parse_selector(kwargs.get('selector'))
+        if self.git_branch_selector:
+            self.selector.require('landscaper_branch', self.git_branch_selector)
+        if self.cloud_selector:
+            self.selector.require('cloud_id', self.cloud_selector)
 
         self._clusters = []
+        self._clusters_by_name = {}
+        self._attribute_index = None
 
 
     @property
@@ -77,37 +88,47 @@ class ClusterCollection(object):
         """Loads clusters from Vault and filters them
         """
         if not self._clusters:
-            clusters_in_vault = VaultClient().dump_vault_from_prefix(
-                        ClusterCollection.vault_prefix, strip_root_key=True)
-            for cluster_name, cluster_attribs in clusters_in_vault.items():
-                # If git_branch_selector is None, generate collection of
-                # all clusters. Otherwise, generate collection including only
-                # clusters subscribing to this branch.
-                if self.valid_cluster_attribs_for_selection(cluster_attribs):
-                    loaded_cluster = ClusterCollection.LoadClusterByName(cluster_name)
-                    self._clusters.append(loaded_cluster)
+            cluster_nodes = self.selected_nodes()
+            vault_tree.prefetch(cluster_nodes)
+            # each cluster loads its cloud
+            cloud_ids = set([n['cloud_id'] for n in cluster_nodes])
+            vault_tree.prefetch([vault_tree.node(CloudCollection.vault_prefix + '/' + c)
+                                 for c in cloud_ids])
+            for cluster_node in cluster_nodes:
+                loaded_cluster = ClusterCollection.LoadClusterByName(cluster_node.name)
+                self._clusters.append(loaded_cluster)
         return self._clusters
 
 
-    def valid_cluster_attribs_for_selection(self, attribs):
-        if self.valid_cluster_branch_for_selection(attribs) and \
-            self.valid_cloud_id_for_selection(attribs):
-            return True
-        else:
-            return False
+    def selected_nodes(self):
+        """Lists clusters in Vault, and filters them
 
-    def valid_cluster_branch_for_selection(self, attribs):
-        if self.git_branch_selector:
-            if attribs['landscaper_branch'] != self.git_branch_selector:
-                return False
-        return True
+        If git_branch_selector is None, select all clusters. Otherwise, select
+        only clusters subscribing to this branch (likewise cloud_selector and
+        selector). Without selectors, clusters are only listed, not read.
 
+        Returns:
+            A list of VaultNodes, one per selected cluster
+        """
+        cluster_nodes = vault_tree.children(ClusterCollection.vault_prefix)
+        if self.selector:
+            selected_names = self.selector.select(self.attribute_index())
+            cluster_nodes = [n for n in cluster_nodes if n.name in selected_names]
+        return cluster_nodes
 
-    def valid_cloud_id_for_selection(self, attribs):
-        if self.cloud_selector:
-            if attribs['cloud_id'] != self.cloud_selector:
-                return False
-        return True
+
+    def attribute_index(self):
+        """AttributeIndex of every cluster's Vault attributes, built once"""
+        if self._attribute_index is None:
+            cluster_nodes = vault_tree.children(ClusterCollection.vault_prefix)
+            vault_tree.prefetch(cluster_nodes)
+            self._attribute_index = AttributeIndex([(n.name, n.data)
+                                                    for n in cluster_nodes])
+        return self._attribute_index
+
+
+    def valid_cluster_attribs_for_selection(self, attribs):
+        return self.selector.matches(attribs)
 
 
 # cloud_selection, charts_branch_selection
@@ -125,8 +146,8 @@ class ClusterCollection(object):
             None.
         """
         cluster_names = []
-        for cluster in self.clusters:
-            cluster_names.append(cluster.name)
+        for cluster_node in self.selected_nodes():
+            cluster_names.append(cluster_node.name)
         return '\n'.join(cluster_names)
 
 
@@ -142,10 +163,10 @@ class ClusterCollection(object):
         Raises:
             None.
         """
-        logging.debug("cluster_name is".format(cluster_name))
-        logging.debug("clusters are".format(self.clusters))
-        cluster = next((item for item in self.clusters if item.name == cluster_name))
-        return cluster
+        logging.debug("cluster_name is {0}".format(cluster_name))
+        if not self._clusters_by_name:
+            self._clusters_by_name = {c.name: c for c in self.clusters}
+        return self._clusters_by_name[cluster_name]
 
 
     def list(self):
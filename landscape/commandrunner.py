@@ -0,0 +1,499 @@
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from .timeline import timeline
+from .throttle import kubernetes_throttle
+
+
+# commands which call the Kubernetes API server, and share its throttle
+KUBERNETES_COMMANDS = ['kubectl', 'helm', 'landscaper']
+
+# subcommands which only read from the API server, so are safe to retry
+KUBERNETES_READ_ONLY_SUBCOMMANDS = {
+    'kubectl': ['get', 'describe', 'version', 'api-versions', 'api-resources',
+                'cluster-info', 'logs', 'top', 'explain'],
+    'helm': ['list', 'ls', 'status', 'get', 'history', 'version', 'search',
+             'inspect', 'show'],
+}
+
+# stderr of commands the API server rejected because it was overloaded
+KUBERNETES_THROTTLED = re.compile(r'\(TooManyRequests\)|429 Too Many Requests|'
+                                  r'the server is currently unable to handle the request|'
+                                  r'\(ServiceUnavailable\)|'
+                                  r'etcdserver: (request timed out|too many requests)|'
+                                  r'net/http: TLS handshake timeout')
+
+
+class CommandResult(object):
+    """The outcome of an external command
+
+    Attributes:
+        argv: The command and its arguments (list)
+        returncode: Exit code. Negative if killed by a signal
+        stdout: Captured standard output (str)
+        stderr: Captured standard error (str)
+        started: Epoch time the command started
+        duration: Wall time, in seconds
+        timed_out: True if the command was killed for exceeding its timeout
+        cancelled: True if the command was killed by CommandRunner.cancel_all
+        label: What the command was run for (e.g., a namespace), or None
+        rusage: dict of resources used by the command and the children it
+            waited for: cpu_user and cpu_system seconds, max_rss_bytes,
+            blocks_in and blocks_out. Empty if unavailable
+    """
+
+    def __init__(self, argv, returncode, stdout, stderr, started, duration,
+                 timed_out=False, cancelled=False, label=None, rusage=None):
+        self.argv = argv
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.started = started
+        self.duration = duration
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+        self.label = label
+        self.rusage = rusage or {}
+
+
+    def __str__(self):
+        return ' '.join(self.argv)
+
+
+    @property
+    def failed(self):
+        """True if the command exited non-zero, timed out or was cancelled"""
+        return self.returncode != 0 or self.timed_out or self.cancelled
+
+
+    @property
+    def output(self):
+        """Standard output with trailing whitespace removed (str)"""
+        return self.stdout.rstrip()
+
+
+    def to_dict(self):
+        """A JSON-serializable representation of the command's metrics
+
+        Command arguments are left out, since they may contain secrets.
+        """
+        command_metrics = {
+            'command': ' '.join(self.argv[0:2]),
+            'label': self.label,
+            'returncode': self.returncode,
+            'started': self.started,
+            'duration': self.duration,
+            'timed_out': self.timed_out,
+            'cancelled': self.cancelled,
+        }
+        command_metrics.update(self.rusage)
+        return command_metrics
+
+
+class CommandRunner(object):
+    """Runs external commands (kubectl, helm, terraform, landscaper, ...)
+
+    Safe to use from multiple threads. Every command is run from an argv list
+    (never through a shell), its output is streamed line-by-line, and its
+    wall time and exit code are recorded.
+
+    Attributes:
+        default_timeout: Seconds after which commands are killed, when run()
+            isn't given a timeout. None waits forever.
+    """
+
+    def __init__(self, default_timeout=None):
+        self.default_timeout = default_timeout
+        self._results = []
+        self._processes = set()
+        self._started = {}
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+
+    def run(self, argv, env=None, cwd=None, timeout=None, echo=True,
+            label=None, sensitive=False, interactive=False):
+        """Runs a command to completion
+
+        Args:
+            argv: The command and its arguments (list)
+            env: dict of environment variables for this command only. They
+                are merged over (and never modify) os.environ
+            cwd: Directory to run the command in
+            timeout: Seconds after which the command is killed. Defaults to
+                default_timeout
+            echo: Stream the command's output to our stdout/stderr as it is
+                produced. Otherwise it is only captured (and debug-logged)
+            label: Prefix for echoed lines, to tell apart commands running
+                concurrently (e.g., a namespace name)
+            sensitive: The command's arguments contain secrets. Only the
+                command name is logged and traced
+            interactive: The command prompts on the terminal (e.g., for a
+                password). Its output goes straight to the terminal and isn't
+                captured
+
+        Returns:
+            A CommandResult. Failures are reported, not raised.
+        """
+        argv = [str(arg) for arg in argv]
+        # kubectl, helm and landscaper share the Kubernetes API server's
+        # throttle. Only read-only commands are retried if the API server
+        # pushes back, since others (e.g., landscaper apply) may have
+        # partially applied
+        if os.path.basename(argv[0]) in KUBERNETES_COMMANDS and not interactive:
+            is_throttled_result = None
+            if _read_only(argv):
+                is_throttled_result = _kubernetes_throttled
+            return kubernetes_throttle.call(
+                lambda free_slot: self._run(argv, env, cwd, timeout, echo,
+                                            label, sensitive, interactive,
+                                            on_started=free_slot),
+                is_throttled_result=is_throttled_result,
+                description=' '.join(argv[0:2]), hold_slot=False)
+        return self._run(argv, env, cwd, timeout, echo, label, sensitive,
+                         interactive)
+
+
+    def _run(self, argv, env, cwd, timeout, echo, label, sensitive,
+             interactive, on_started=None):
+        """Runs a command once (see run())
+
+        Args:
+            on_started: Called once the command's process has started
+        """
+        if timeout is None:
+            timeout = self.default_timeout
+        command_env = None
+        if env:
+            command_env = dict(os.environ)
+            command_env.update(env)
+        loggable_cmd = ' '.join(argv)
+        if sensitive:
+            loggable_cmd = ' '.join(argv[0:2]) + ' ...'
+        logging.debug("Running command: {0}".format(loggable_cmd))
+
+        started = time.time()
+        output_pipe = subprocess.PIPE
+        if interactive:
+            output_pipe = None
+        # checked and registered under the lock, so cancel_all() either
+        # stops the command starting or sees its process to kill
+        with self._lock:
+            if self._cancelled:
+                result = CommandResult(argv, -1, '', '', started, 0,
+                                       cancelled=True)
+                self._results.append(result)
+                return result
+            try:
+                proc = subprocess.Popen(argv,
+                                        stdout=output_pipe,
+                                        stderr=output_pipe,
+                                        env=command_env,
+                                        cwd=cwd,
+                                        universal_newlines=True)
+            except OSError as e:
+                logging.error("Could not run {0}: {1}".format(argv[0], e))
+                result = CommandResult(argv, 127, '', str(e), started,
+                                       time.time() - started)
+                self._results.append(result)
+                return result
+            self._processes.add(proc)
+        if on_started:
+            on_started()
+
+        timed_out = []
+        def kill_on_timeout():
+            timed_out.append(True)
+            logging.error("Killing {0} after {1}s timeout".format(
+                ' '.join(argv[0:2]), timeout))
+            self._kill(proc)
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, kill_on_timeout)
+            timer.daemon = True
+            timer.start()
+
+        prefix = ''
+        if label:
+            prefix = "[{0}] ".format(label)
+        stdout_lines = []
+        stderr_lines = []
+        if not interactive:
+            stderr_reader = threading.Thread(target=self._read_lines,
+                                             args=(proc.stderr, stderr_lines,
+                                                   echo and sys.stderr, prefix))
+            stderr_reader.daemon = True
+            stderr_reader.start()
+            self._read_lines(proc.stdout, stdout_lines, echo and sys.stdout,
+                             prefix)
+            stderr_reader.join()
+        returncode, rusage = self._wait(proc)
+        if timer:
+            timer.cancel()
+
+        with self._lock:
+            self._processes.discard(proc)
+            cancelled = self._cancelled and returncode != 0
+        finished = time.time()
+        result = CommandResult(argv, returncode,
+                               ''.join(stdout_lines), ''.join(stderr_lines),
+                               started, finished - started,
+                               timed_out=bool(timed_out), cancelled=cancelled,
+                               label=label, rusage=rusage)
+        span_args = {'cmd': loggable_cmd, 'returncode': returncode}
+        span_args.update(rusage)
+        timeline.add_event(' '.join(argv[0:2]), 'subprocess', started,
+                           finished, span_args)
+        if result.failed:
+            logging.debug("{0} exited with {1}".format(argv[0], returncode))
+        return self._record(result)
+
+
+    def start(self, argv, cwd=None, label=None):
+        """Starts a long-running command, which the caller drives through
+        its stdin and stdout pipes (e.g., git cat-file --batch)
+
+        cancel_all() kills it like any other command. Call finish() once
+        done with it.
+
+        Args:
+            argv: The command and its arguments (list)
+            cwd: Directory to run the command in
+            label: What the command is run for, or None
+
+        Returns:
+            A subprocess.Popen with binary stdin and stdout pipes, or None
+            if it couldn't start, or commands were cancelled
+        """
+        argv = [str(arg) for arg in argv]
+        logging.debug("Starting command: {0}".format(' '.join(argv)))
+        started = time.time()
+        with self._lock:
+            if self._cancelled:
+                return None
+            try:
+                proc = subprocess.Popen(argv,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        cwd=cwd)
+            except OSError as e:
+                logging.error("Could not run {0}: {1}".format(argv[0], e))
+                self._results.append(CommandResult(argv, 127, '', str(e),
+                                                   started, 0, label=label))
+                return None
+            self._processes.add(proc)
+            self._started[proc] = (started, label)
+        return proc
+
+
+    def finish(self, proc):
+        """Closes the stdin of a command started with start(), and waits
+        for it to exit
+
+        Returns:
+            A CommandResult. Its output isn't captured
+        """
+        proc.stdin.close()
+        returncode, rusage = self._wait(proc)
+        proc.stdout.close()
+        with self._lock:
+            self._processes.discard(proc)
+            started, label = self._started.pop(proc)
+            cancelled = self._cancelled and returncode != 0
+        finished = time.time()
+        result = CommandResult(list(proc.args), returncode, '', '', started,
+                               finished - started, cancelled=cancelled,
+                               label=label, rusage=rusage)
+        span_args = {'cmd': ' '.join(proc.args), 'returncode': returncode}
+        span_args.update(rusage)
+        timeline.add_event(' '.join(proc.args[0:2]), 'subprocess', started,
+                           finished, span_args)
+        return self._record(result)
+
+
+    def cancel_all(self):
+        """Kills every running command. Later calls to run() don't start
+        their command and return a cancelled CommandResult.
+
+        Returns:
+            None.
+        """
+        with self._lock:
+            self._cancelled = True
+            running = list(self._processes)
+        for proc in running:
+            self._kill(proc)
+
+
+    @property
+    def cancelled(self):
+        """True once cancel_all() has been called"""
+        with self._lock:
+            return self._cancelled
+
+
+    @property
+    def results(self):
+        """Every command run so far (list of CommandResult)"""
+        with self._lock:
+            return list(self._results)
+
+
+    def summary(self):
+        """Summarizes commands run, grouped by executable
+
+        Returns:
+            A multi-line str with command counts, failures and wall time.
+        """
+        results = self.results
+        if not results:
+            return 'Commands: none run'
+        by_executable = {}
+        for result in results:
+            executable = os.path.basename(result.argv[0])
+            by_executable.setdefault(executable, []).append(result)
+        lines = ["Commands: {0} run, {1} failed, {2:.1f}s total, " \
+                 "{3:.1f}s CPU".format(
+            len(results),
+            len([r for r in results if r.failed]),
+            sum([r.duration for r in results]),
+            sum([_cpu_seconds(r) for r in results]))]
+        for executable in sorted(by_executable):
+            executable_results = by_executable[executable]
+            slowest = max(executable_results, key=lambda r: r.duration)
+            largest = max(executable_results,
+                          key=lambda r: r.rusage.get('max_rss_bytes', 0))
+            lines.append("  {0}: {1} run, {2} failed, {3:.1f}s total, " \
+                         "slowest {4:.1f}s ({5}), {6:.1f}s CPU, " \
+                         "peak RSS {7:.0f}MiB ({8}), " \
+                         "blocks in/out {9}/{10}".format(
+                             executable,
+                             len(executable_results),
+                             len([r for r in executable_results if r.failed]),
+                             sum([r.duration for r in executable_results]),
+                             slowest.duration,
+                             _describe(slowest),
+                             sum([_cpu_seconds(r) for r in executable_results]),
+                             largest.rusage.get('max_rss_bytes', 0) / 1048576.0,
+                             _describe(largest),
+                             sum([r.rusage.get('blocks_in', 0) for r in executable_results]),
+                             sum([r.rusage.get('blocks_out', 0) for r in executable_results])))
+        return '\n'.join(lines)
+
+
+    def write_json(self, json_path):
+        """Writes metrics and resource usage of every command as JSON
+
+        Args:
+            json_path: File to write
+
+        Returns:
+            None.
+        """
+        with open(json_path, 'w') as json_file:
+            json.dump([r.to_dict() for r in self.results], json_file,
+                      indent=2, sort_keys=True)
+        logging.info("Wrote command metrics to {0}".format(json_path))
+
+
+    def _record(self, result):
+        with self._lock:
+            self._results.append(result)
+        return result
+
+
+    def _read_lines(self, stream, lines, echo_stream, prefix):
+        for line in iter(stream.readline, ''):
+            lines.append(line)
+            if echo_stream:
+                echo_stream.write(prefix + line)
+                echo_stream.flush()
+            else:
+                logging.debug(prefix + line.rstrip())
+        stream.close()
+
+
+    def _wait(self, proc):
+        """Reaps a command, collecting its resource usage with wait4(2)
+
+        Returns:
+            A tuple of (returncode, rusage dict)
+        """
+        if not hasattr(os, 'wait4'):
+            return proc.wait(), {}
+        while True:
+            try:
+                _, status, rusage = os.wait4(proc.pid, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                # already reaped elsewhere; resource usage is lost
+                return proc.wait(), {}
+        if os.WIFSIGNALED(status):
+            returncode = -os.WTERMSIG(status)
+        else:
+            returncode = os.WEXITSTATUS(status)
+        # let Popen know the process was reaped
+        proc.returncode = returncode
+        return returncode, {
+            'cpu_user': rusage.ru_utime,
+            'cpu_system': rusage.ru_stime,
+            'max_rss_bytes': rusage.ru_maxrss * MAXRSS_UNIT_BYTES,
+            'blocks_in': rusage.ru_inblock,
+            'blocks_out': rusage.ru_oublock,
+        }
+
+
+    def _kill(self, proc):
+        try:
+            proc.kill()
+        except OSError:
+            # already exited
+            pass
+
+
+def _read_only(argv):
+    """True if a kubectl or helm command only reads from the API server"""
+    subcommands = [arg for arg in argv[1:] if not arg.startswith('-')]
+    read_only_subcommands = KUBERNETES_READ_ONLY_SUBCOMMANDS.get(
+        os.path.basename(argv[0]), [])
+    return bool(subcommands) and subcommands[0] in read_only_subcommands
+
+
+def _kubernetes_throttled(result):
+    """True if a command failed because the API server was overloaded"""
+    return result.failed and not result.cancelled and not result.timed_out and \
+        bool(KUBERNETES_THROTTLED.search(result.stderr))
+
+
+def _cpu_seconds(result):
+    return result.rusage.get('cpu_user', 0) + result.rusage.get('cpu_system', 0)
+
+
+def _describe(result):
+    description = ' '.join(result.argv[0:2])
+    if result.label:
+        description += " [{0}]".format(result.label)
+    return description
+
+
+def shell_argv(script):
+    """argv running a shell script, for the few commands which are scripts
+
+    (e.g., commands read from LastPass notes or Helm chart NOTES)
+    """
+    return ['sh', '-c', script]
+
+
+# ru_maxrss is reported in bytes on macOS, kilobytes elsewhere
+MAXRSS_UNIT_BYTES = 1 if platform.system() == 'Darwin' else 1024
+
+command_runner = CommandRunner()
@@ -0,0 +1,418 @@
+import concurrent.futures
+import logging
+import threading
+import time
+
+from .chartscollection_landscaper import LandscaperChartsCollection
+from .localmachine import Localmachine
+from .commandrunner import command_runner
+from .checkpoint import (attributes_fingerprint, charts_fingerprint)
+
+
+class ConvergeNode(object):
+    """A single step of a converge, run once all of its requirements are met
+
+    Attributes:
+        key: Unique name of the step (e.g., cluster:minikube)
+        kind: Type of resource converged (cloud, cluster, namespace,
+            localmachine). Concurrency is limited per kind.
+        action: Callable performing the converge step
+        requires: keys of nodes which must converge before this one
+        fingerprint: Optional callable returning a str identifying what the
+            step converges to. A checkpointed step is only skipped when its
+            fingerprint is unchanged
+        state: One of pending, running, done, failed, skipped
+        from_checkpoint: True if the step was done by an earlier run
+        duration: Seconds the step took to run, including retries, or None
+            if it didn't run
+    """
+
+    def __init__(self, key, kind, action, requires=None, fingerprint=None):
+        self.key = key
+        self.kind = kind
+        self.action = action
+        self.requires = list(requires or [])
+        self.fingerprint = fingerprint
+        self.state = 'pending'
+        self.error = None
+        self.from_checkpoint = False
+        self.duration = None
+
+
+    def __str__(self):
+        return self.key
+
+
+class ConvergeGraph(object):
+    """A dependency graph of converge steps, run on a thread pool
+
+    Independent steps run concurrently, up to max_workers at a time and
+    never more than the per-kind limit in concurrency. For example, charts on
+    cluster A may deploy while cloud B is still being planned.
+
+    Clouds are limited to one at a time by default, because terraform clouds
+    share the .terraform/terraform.tfstate link in the terraform repo.
+    Clusters are too, because converging a cluster rewrites the kubeconfig.
+
+    Attributes:
+        max_workers: Maximum number of steps running at once
+        concurrency: dict of per-kind limits on running steps
+        keep_going: Keep scheduling independent steps after a failure
+        checkpoint: Optional ConvergeCheckpoint. Steps it records as done are
+            skipped, and every finished step is recorded in it
+        retries: Number of times a failed step is retried
+        retry_backoff: Seconds before the first retry, doubled for each
+            later retry
+    """
+
+    DEFAULT_CONCURRENCY = {
+        'cloud': 1,
+        'cluster': 1,
+        'namespace': 4,
+        'localmachine': 1,
+    }
+
+    def __init__(self, max_workers=4, concurrency=None, keep_going=False,
+                 checkpoint=None, retries=0, retry_backoff=10):
+        self.max_workers = max_workers
+        self.concurrency = dict(ConvergeGraph.DEFAULT_CONCURRENCY)
+        self.concurrency.update(concurrency or {})
+        self.keep_going = keep_going
+        self.checkpoint = checkpoint
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._nodes = {}
+        self._order = []
+        self._interrupted = threading.Event()
+
+
+    def __str__(self):
+        """Pretty-prints the steps in the graph and their requirements
+
+        Returns:
+            A new-line separated str of steps
+        """
+        output_lines = []
+        for key in self._order:
+            node = self._nodes[key]
+            state = node.state
+            if node.from_checkpoint:
+                state += ', from checkpoint'
+            line = "{0} ({1})".format(node.key, state)
+            if node.requires:
+                line += " after {0}".format(', '.join(node.requires))
+            output_lines.append(line)
+        return '\n'.join(output_lines)
+
+
+    def __getitem__(self, key):
+        return self._nodes[key]
+
+
+    def __contains__(self, key):
+        return key in self._nodes
+
+
+    @property
+    def nodes(self):
+        """Nodes in the order they were added (list)"""
+        return [self._nodes[key] for key in self._order]
+
+
+    def add(self, key, kind, action, requires=None, fingerprint=None):
+        """Adds a step to the graph. Adding an existing key is a no-op.
+
+        Clusters in the same cloud share a single cloud step this way.
+
+        Args:
+            key: Unique name of the step
+            kind: Type of resource converged by the step
+            action: Callable performing the step
+            requires: keys of steps which must converge first
+            fingerprint: Optional callable fingerprinting the step
+
+        Returns:
+            The ConvergeNode for key
+        """
+        if key not in self._nodes:
+            self._nodes[key] = ConvergeNode(key, kind, action, requires,
+                                            fingerprint)
+            self._order.append(key)
+        return self._nodes[key]
+
+
+    def validate(self):
+        """Checks that every requirement exists and that there are no cycles
+
+        Raises:
+            ValueError: if the graph can't be converged
+        """
+        for node in self.nodes:
+            for required_key in node.requires:
+                if required_key not in self._nodes:
+                    raise ValueError("{0} requires unknown step {1}".format(
+                        node.key, required_key))
+        visiting = set()
+        visited = set()
+        def visit(key):
+            if key in visited:
+                return
+            if key in visiting:
+                raise ValueError("Dependency cycle at {0}".format(key))
+            visiting.add(key)
+            for required_key in self._nodes[key].requires:
+                visit(required_key)
+            visiting.remove(key)
+            visited.add(key)
+        for key in self._order:
+            visit(key)
+
+
+    def run(self):
+        """Converges every step, respecting requirements and concurrency limits
+
+        A failed step (an exception or sys.exit) is retried up to retries
+        times. If it still fails, every step requiring it is skipped.
+
+        On Ctrl-C, running commands are cancelled and no step is retried or
+        started. KeyboardInterrupt is re-raised once running steps return.
+
+        Returns:
+            A list of failed ConvergeNodes. Empty on success.
+        """
+        self.validate()
+        fingerprints = {}
+        if self.checkpoint:
+            for node in self.nodes:
+                fingerprints[node.key] = node.fingerprint() if node.fingerprint else None
+                if self.checkpoint.is_done(node.key, fingerprints[node.key]):
+                    logging.info("Skipping {0}, converged by an earlier run".format(
+                        node.key))
+                    node.state = 'done'
+                    node.from_checkpoint = True
+        running = {}
+        stop_scheduling = False
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers) as executor:
+            try:
+                while True:
+                    self._skip_nodes_with_failed_requirements()
+                    if not stop_scheduling:
+                        for node in self._ready_nodes(running):
+                            logging.info("Converging {0}".format(node.key))
+                            node.state = 'running'
+                            running[executor.submit(self._converge_node, node,
+                                                    fingerprints.get(node.key))] = node
+                    if not running:
+                        break
+                    # wake up regularly: Ctrl-C is only noticed by this
+                    # thread once it's running
+                    finished, _ = concurrent.futures.wait(
+                        running.keys(), timeout=1,
+                        return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in finished:
+                        node = running.pop(future)
+                        error = future.exception()
+                        if error is None:
+                            node.state = 'done'
+                            logging.info("Converged {0}".format(node.key))
+                        else:
+                            node.state = 'failed'
+                            node.error = error
+                            logging.error("Failed to converge {0}: {1}".format(
+                                node.key, error))
+                            if not self.keep_going:
+                                stop_scheduling = True
+            except KeyboardInterrupt:
+                # the executor waits for running steps on the way out. Kill
+                # their commands first, so they fail instead of finishing
+                logging.warn("Interrupted. Cancelling running steps")
+                self._interrupted.set()
+                command_runner.cancel_all()
+                raise
+
+        for node in self.nodes:
+            if node.state == 'pending':
+                node.state = 'skipped'
+        skipped = [n.key for n in self.nodes if n.state == 'skipped']
+        if skipped:
+            logging.warn("Skipped: {0}".format(', '.join(skipped)))
+        return [n for n in self.nodes if n.state == 'failed']
+
+
+    def _converge_node(self, node, fingerprint):
+        """Runs a step's action, retrying failures and recording the outcome
+        in the checkpoint. Runs on a worker thread.
+        """
+        attempt = 0
+        started = time.time()
+        while True:
+            try:
+                node.action()
+                break
+            except (Exception, SystemExit) as e:
+                node.duration = time.time() - started
+                if attempt < self.retries and not self._cancelled():
+                    backoff = self.retry_backoff * 2 ** attempt
+                    attempt += 1
+                    logging.warn("{0} failed ({1}). Retry {2} of {3} in {4}s".format(
+                        node.key, e, attempt, self.retries, backoff))
+                    # Ctrl-C ends the wait early, and cancels the retry
+                    self._interrupted.wait(backoff)
+                    if not self._cancelled():
+                        continue
+                if self.checkpoint:
+                    self.checkpoint.record(node.key, 'failed', fingerprint)
+                raise
+        node.duration = time.time() - started
+        if self.checkpoint:
+            self.checkpoint.record(node.key, 'done', fingerprint)
+
+
+    def _cancelled(self):
+        """True once the run was interrupted, or its commands cancelled"""
+        return self._interrupted.is_set() or command_runner.cancelled
+
+
+    def _ready_nodes(self, running):
+        """Pending nodes with all requirements done, within concurrency limits
+        """
+        running_per_kind = {}
+        for node in running.values():
+            running_per_kind[node.kind] = running_per_kind.get(node.kind, 0) + 1
+        free_workers = self.max_workers - len(running)
+
+        ready = []
+        for node in self.nodes:
+            if free_workers <= 0:
+                break
+            if node.state != 'pending':
+                continue
+            if not all([self._nodes[r].state == 'done' for r in node.requires]):
+                continue
+            kind_limit = self.concurrency.get(node.kind, self.max_workers)
+            if running_per_kind.get(node.kind, 0) >= kind_limit:
+                continue
+            running_per_kind[node.kind] = running_per_kind.get(node.kind, 0) + 1
+            free_workers -= 1
+            ready.append(node)
+        return ready
+
+
+    def _skip_nodes_with_failed_requirements(self):
+        changed = True
+        while changed:
+            changed = False
+            for node in self.nodes:
+                if node.state != 'pending':
+                    continue
+                if any([self._nodes[r].state in ('failed', 'skipped') for r in node.requires]):
+                    node.state = 'skipped'
+                    changed = True
+
+
+def parse_concurrency(concurrency_spec):
+    """Parses per-kind concurrency limits
+
+    Args:
+        concurrency_spec: A str like cloud=1,namespace=8
+
+    Returns:
+        A dict mapping kind to limit, e.g. {'cloud': 1, 'namespace': 8}
+
+    Raises:
+        ValueError: if the spec isn't understood
+    """
+    limits = {}
+    if not concurrency_spec:
+        return limits
+    for kind_limit in concurrency_spec.split(','):
+        kind, _, limit = kind_limit.partition('=')
+        if kind not in ConvergeGraph.DEFAULT_CONCURRENCY or not limit.isdigit():
+            raise ValueError("Bad concurrency limit: {0}".format(kind_limit))
+        limits[kind] = int(limit)
+    return limits
+
+
+def add_cluster_to_graph(graph, cluster, dry_run, converge_cloud=False,
+                         converge_cluster=False, charts=None,
+                         converge_localmachine=False):
+    """Adds the converge steps of a single cluster to a graph
+
+    Each cloud step feeds its clusters, each cluster feeds its namespaces,
+    and PRIORTY_NAMESPACES are applied (in order) before the rest.
+
+    Args:
+        graph: the ConvergeGraph to add steps to
+        cluster: the Cluster to converge
+        dry_run: flag for simulating convergence
+        converge_cloud: Also converge the cluster's cloud
+        converge_cluster: Also converge the cluster
+        charts: a LandscaperChartsCollection to converge, or None
+        converge_localmachine: Also set up the local machine for the cluster
+
+    Returns:
+        None.
+    """
+    requirements = []
+    if converge_cloud:
+        cloud = cluster.cloud
+        cloud_step = 'cloud:' + cloud.name
+        graph.add(cloud_step, 'cloud', lambda: cloud.converge(dry_run),
+                  fingerprint=lambda: attributes_fingerprint(cloud))
+        requirements = [cloud_step]
+
+    if converge_cluster:
+        cluster_step = 'cluster:' + cluster.name
+        graph.add(cluster_step, 'cluster', lambda: cluster.converge(dry_run),
+                  requires=requirements,
+                  fingerprint=lambda: attributes_fingerprint(cluster))
+        requirements = [cluster_step]
+
+    if charts:
+        namespace_steps = []
+        priority_requirements = requirements
+        namespace_fingerprint = _namespace_fingerprinter(charts)
+        for namespace in charts.namespaces():
+            namespace_step = "namespace:{0}/{1}".format(cluster.name, namespace)
+            graph.add(namespace_step, 'namespace',
+                      _namespace_converge_action(charts, namespace, dry_run),
+                      requires=priority_requirements,
+                      fingerprint=_bind(namespace_fingerprint, namespace))
+            namespace_steps.append(namespace_step)
+            # namespaces() lists PRIORTY_NAMESPACES first. Chain them, so
+            # they apply in order, before every other namespace
+            if namespace in LandscaperChartsCollection.PRIORTY_NAMESPACES:
+                priority_requirements = [namespace_step]
+        requirements = namespace_steps or requirements
+
+    if converge_localmachine:
+        graph.add('localmachine:' + cluster.name, 'localmachine',
+                  lambda: Localmachine(cluster=cluster).converge(),
+                  requires=requirements)
+
+
+def _namespace_converge_action(charts, namespace, dry_run):
+    return lambda: charts.converge_namespace(namespace, dry_run)
+
+
+def _bind(fn, *args):
+    return lambda: fn(*args)
+
+
+def _namespace_fingerprinter(charts):
+    """Returns a function fingerprinting the chart YAML files of a namespace.
+
+    With KV version 2, the versions of the charts' Vault secrets are part of
+    the fingerprint, so a namespace whose secrets moved is converged again.
+
+    Charts are only loaded once, the first time a fingerprint is needed.
+    """
+    charts_by_namespace = {}
+    def namespace_fingerprint(namespace):
+        if not charts_by_namespace:
+            for chart in charts.charts:
+                charts_by_namespace.setdefault(chart.namespace, []).append(chart)
+        return charts_fingerprint(charts_by_namespace.get(namespace, []),
+                                  charts.secrets_versions(namespace))
+    return namespace_fingerprint
@@ -0,0 +1,248 @@
+import binascii
+import threading
+
+import yaml
+
+from .commandrunner import command_runner
+from .chart_landscaper import landscaper_yaml_errors
+
+
+class GitObjectStore(object):
+    """Reads files from any revision of a git repository, without a checkout
+
+    Objects are read through a single long-running `git cat-file --batch`
+    process. Trees are listed and YAML files parsed at most once per object
+    hash, so subtrees shared by branches (or unchanged between revisions)
+    are never read twice.
+
+    Attributes:
+        repo_dir: A directory inside the git repository
+    """
+
+    def __init__(self, repo_dir):
+        self.repo_dir = repo_dir
+        self._cat_file = None
+        self._cat_file_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._tree_entries = {}
+        self._yaml_blobs = {}
+        self._parsed_yaml = {}
+
+
+    def resolve_tree(self, revisions):
+        """Finds the tree of the first revision which exists
+
+        Args:
+            revisions: revisions to try, e.g. ['master', 'origin/master']
+
+        Returns:
+            The tree's hash (str)
+
+        Raises:
+            ValueError: if none of the revisions exist
+        """
+        for revision in revisions:
+            rev_parse = command_runner.run(['git', 'rev-parse', '--verify',
+                                            '--quiet', revision + '^{tree}'],
+                                           cwd=self.repo_dir, echo=False)
+            if not rev_parse.failed:
+                return rev_parse.output
+        raise ValueError("None of {0} found in git repo {1}".format(
+            ', '.join(revisions), self.repo_dir))
+
+
+    def prefix(self):
+        """Path of repo_dir relative to the top of the repository
+
+        e.g., landscaper/ or an empty str
+        """
+        show_prefix = command_runner.run(['git', 'rev-parse', '--show-prefix'],
+                                         cwd=self.repo_dir, echo=False)
+        if show_prefix.failed:
+            raise ValueError("{0} is not in a git repo".format(self.repo_dir))
+        return show_prefix.output
+
+
+    def subtree(self, tree_hash, path):
+        """Hash of the tree at path (e.g., landscaper/all), or None"""
+        for component in [c for c in path.split('/') if c]:
+            subtrees = {name: sha for mode, name, sha in self.tree_entries(tree_hash)
+                        if mode == '40000'}
+            if component not in subtrees:
+                return None
+            tree_hash = subtrees[component]
+        return tree_hash
+
+
+    def blob_at(self, tree_hash, path):
+        """Hash of the file at path (e.g., all/jenkins.yaml) under a tree, or None"""
+        directory, _, filename = path.rpartition('/')
+        directory_tree = self.subtree(tree_hash, directory)
+        if not directory_tree:
+            return None
+        for mode, name, sha in self.tree_entries(directory_tree):
+            if name == filename and mode != '40000':
+                return sha
+        return None
+
+
+    def tree_entries(self, tree_hash):
+        """Entries of a tree object, as a list of (mode, name, hash) tuples"""
+        with self._cache_lock:
+            if tree_hash in self._tree_entries:
+                return self._tree_entries[tree_hash]
+        object_type, tree_data = self.read_object(tree_hash)
+        if object_type != 'tree':
+            raise ValueError("{0} is a {1}, not a tree".format(tree_hash,
+                                                               object_type))
+        entries = parse_tree(tree_data)
+        with self._cache_lock:
+            self._tree_entries[tree_hash] = entries
+        return entries
+
+
+    def yaml_blobs(self, tree_hash):
+        """Every *.yaml file under a tree, recursively
+
+        Returns:
+            A list of (path relative to the tree, blob hash) tuples
+        """
+        with self._cache_lock:
+            if tree_hash in self._yaml_blobs:
+                return self._yaml_blobs[tree_hash]
+        blobs = []
+        for mode, name, sha in self.tree_entries(tree_hash):
+            if mode == '40000':
+                blobs += [(name + '/' + path, blob_sha)
+                          for path, blob_sha in self.yaml_blobs(sha)]
+            elif name.endswith('.yaml'):
+                blobs.append((name, sha))
+        with self._cache_lock:
+            self._yaml_blobs[tree_hash] = blobs
+        return blobs
+
+
+    def landscaper_yaml(self, blob_hash):
+        """Parses and validates a Landscaper YAML blob
+
+        Returns:
+            A tuple of (parsed YAML, list of problems)
+        """
+        with self._cache_lock:
+            if blob_hash in self._parsed_yaml:
+                return self._parsed_yaml[blob_hash]
+        try:
+            chart_info = yaml.safe_load(self.read_blob(blob_hash))
+            parsed = (chart_info, landscaper_yaml_errors(chart_info))
+        except yaml.YAMLError as e:
+            parsed = (None, ["unreadable: {0}".format(e)])
+        with self._cache_lock:
+            self._parsed_yaml[blob_hash] = parsed
+        return parsed
+
+
+    def read_blob(self, blob_hash):
+        """Contents of a file (bytes)"""
+        object_type, data = self.read_object(blob_hash)
+        if object_type != 'blob':
+            raise ValueError("{0} is a {1}, not a blob".format(blob_hash,
+                                                               object_type))
+        return data
+
+
+    def read_object(self, object_hash):
+        """Reads an object through git cat-file --batch
+
+        The process is started by command_runner, so it's killed by
+        cancel_all(), and each read by command_runner.default_timeout.
+
+        Returns:
+            A tuple of (object type, contents as bytes)
+
+        Raises:
+            ValueError: if the object doesn't exist
+            ChildProcessError: if git cat-file failed, or was killed
+        """
+        with self._cat_file_lock:
+            if self._cat_file is None:
+                self._cat_file = command_runner.start(['git', 'cat-file', '--batch'],
+                                                      cwd=self.repo_dir)
+                if self._cat_file is None:
+                    raise ChildProcessError("Could not start git cat-file in "
+                                            "{0}".format(self.repo_dir))
+            timer = None
+            if command_runner.default_timeout:
+                timer = threading.Timer(command_runner.default_timeout,
+                                        self._cat_file.kill)
+                timer.daemon = True
+                timer.start()
+            try:
+                self._cat_file.stdin.write(object_hash.encode('ascii') + b'\n')
+                self._cat_file.stdin.flush()
+                header = self._cat_file.stdout.readline().decode('ascii').split()
+                if len(header) == 3:
+                    _, object_type, size = header
+                    data = self._cat_file.stdout.read(int(size))
+                    # each object is followed by a newline
+                    self._cat_file.stdout.read(1)
+            except BrokenPipeError:
+                header = []
+            finally:
+                if timer:
+                    timer.cancel()
+            if not header:
+                # killed, e.g. by a timeout or Ctrl-C
+                command_runner.finish(self._cat_file)
+                self._cat_file = None
+                raise ChildProcessError("git cat-file exited reading {0}".format(
+                    object_hash))
+            if len(header) != 3:
+                raise ValueError("git object {0} not found".format(object_hash))
+        return object_type, data
+
+
+    def close(self):
+        """Stops the git cat-file process"""
+        with self._cat_file_lock:
+            if self._cat_file:
+                command_runner.finish(self._cat_file)
+                self._cat_file = None
+
+
+def parse_tree(tree_data):
+    """Parses the contents of a git tree object
+
+    Each entry is "<mode> <name>\\0<20-byte hash>"
+
+    Returns:
+        A list of (mode, name, hex hash) tuples
+    """
+    entries = []
+    position = 0
+    while position < len(tree_data):
+        name_end = tree_data.index(b'\0', position)
+        mode, name = tree_data[position:name_end].decode('utf-8').split(' ', 1)
+        sha = binascii.hexlify(tree_data[name_end + 1:name_end + 21]).decode('ascii')
+        entries.append((mode, name, sha))
+        position = name_end + 21
+    return entries
+
+
+_git_object_stores = {}
+_git_object_stores_lock = threading.Lock()
+
+def git_object_store(repo_dir):
+    """The GitObjectStore for a repository, shared by the whole run"""
+    with _git_object_stores_lock:
+        if repo_dir not in _git_object_stores:
+            _git_object_stores[repo_dir] = GitObjectStore(repo_dir)
+        return _git_object_stores[repo_dir]
+
+
+def close_git_object_stores():
+    """Stops the git cat-file processes of every GitObjectStore"""
+    with _git_object_stores_lock:
+        git_object_stores = list(_git_object_stores.values())
+        _git_object_stores.clear()
+    for git_store in git_object_stores:
+        git_store.close()
@@ -1,9 +1,10 @@
-import subprocess
-import os
 import sys
 import time
 import logging
 
+from .timeline import traced
+from .commandrunner import command_runner
+
 
 def helm_add_chart_repos(repos):
     """
@@ -31,17 +32,22 @@ def helm_add_chart_repo(repo_alias, url):
 
     Returns: None
     """
-    repo_add_cmd = "helm repo add {0} {1}".format(repo_alias, url)
-    subprocess.call(repo_add_cmd, shell=True)
+    repo_add_cmd = ['helm', 'repo', 'add', repo_alias, url]
+    command_runner.run(repo_add_cmd)
 
 
+@traced('helm')
 def wait_for_tiller_ready(monitor_command):
     """
     Sleep until Tiller is ready
+
+    Arguments:
+     - monitor_command (list): argv printing the tiller pod's status
+
+    Returns: None
     """
-    devnull = open(os.devnull, 'w')
-    proc = subprocess.Popen(monitor_command, stdout=subprocess.PIPE, stderr=devnull, shell=True)
-    tiller_pod_status = proc.stdout.read().rstrip().decode()
+    tiller_pod_status = command_runner.run(monitor_command, timeout=60,
+                                           echo=False).output
     wait_for_tiller_seconds = 2
 
     if tiller_pod_status == "Running":
@@ -49,8 +55,9 @@ def wait_for_tiller_ready(monitor_command):
     else:
         logging.info('Waiting for tiller pod to be ready')
         while tiller_pod_status != "Running":
-            proc = subprocess.Popen(monitor_command, stdout=subprocess.PIPE, stderr=devnull, shell=True)
-            tiller_pod_status = proc.stdout.read().rstrip().decode()
+            tiller_pod_status = command_runner.run(monitor_command,
+                                                   timeout=60,
+                                                   echo=False).output
             sys.stdout.write('.')
             sys.stdout.flush()
             time.sleep(1) 
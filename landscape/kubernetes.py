@@ -1,6 +1,6 @@
-import subprocess
 import sys
-import hvac
+
+from .commandrunner import command_runner
 
 def kubernetes_get_context():
     """
@@ -10,17 +10,16 @@ def kubernetes_get_context():
 
     Returns: Current Kubernetes context name (str)
     """
-    get_context_cmd = "kubectl config current-context"
-    print(' - running ' + get_context_cmd)
-    proc = subprocess.Popen(get_context_cmd, stdout=subprocess.PIPE, shell=True)
-    k8s_context = proc.stdout.read().rstrip().decode()
+    get_context_cmd = ['kubectl', 'config', 'current-context']
+    print(' - running ' + ' '.join(get_context_cmd))
+    k8s_context = command_runner.run(get_context_cmd, echo=False).output
     return k8s_context
 
 
 def kubectl_use_context(context):
-    set_context_cmd = "kubectl config use-context {0}".format(context)
-    print(' - running ' + set_context_cmd)
-    set_context_failed = subprocess.call(set_context_cmd, shell=True)
+    set_context_cmd = ['kubectl', 'config', 'use-context', context]
+    print(' - running ' + ' '.join(set_context_cmd))
+    set_context_failed = command_runner.run(set_context_cmd).failed
     if set_context_failed:
     	sys.exit('Error setting context. Exiting')
 
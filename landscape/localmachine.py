@@ -1,11 +1,11 @@
 import platform
-import subprocess
 import logging
 import yaml
 import re
 import sh
 
 from .kubernetes import kubectl_use_context
+from .commandrunner import (command_runner, shell_argv)
 
 class Localmachine(object):
     """
@@ -33,8 +33,8 @@ class Localmachine(object):
 
 
     def helm_init_client(self):
-        helm_init_client_cmd = 'helm init --client-only'
-        proc = subprocess.call(helm_init_client_cmd, shell=True)
+        helm_init_client_cmd = ['helm', 'init', '--client-only']
+        command_runner.run(helm_init_client_cmd)
 
 
     def helm_add_repos(self):
@@ -54,12 +54,10 @@ class Localmachine(object):
         Installs an OpenVPN profile into the running machine.
         Pulled from the NOTES.txt out of the OpenVPN chart
         """
-        get_vpn_profile_cmd = "helm status openvpn-openvpn"
-        logging.info("Running command: {0}".format(get_vpn_profile_cmd))
-        proc = subprocess.Popen(get_vpn_profile_cmd,
-                                                stdout=subprocess.PIPE,
-                                                shell=True)
-        chart_notes = proc.stdout.read().rstrip().decode()
+        get_vpn_profile_cmd = ['helm', 'status', 'openvpn-openvpn']
+        logging.info("Running command: {0}".format(' '.join(get_vpn_profile_cmd)))
+        chart_notes = command_runner.run(get_vpn_profile_cmd, timeout=60,
+                                         echo=False).output
         yaml_instructions = chart_notes.split('client_commands:')[-1]
         executables_map = yaml.load(yaml_instructions)
         install_profile_cmd = executables_map['generate_openvpn_profile']
@@ -71,5 +69,5 @@ class Localmachine(object):
 
         install_profile_cmd = "\n".join(raw_command_lines)
         logging.info("Running command {0}".format(install_profile_cmd))
-        proc = subprocess.call(install_profile_cmd,
-                                                shell=True)
+        # the chart's NOTES contain a shell script
+        command_runner.run(shell_argv(install_profile_cmd))
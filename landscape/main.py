@@ -10,8 +10,12 @@ Usage: landscape [options]
          converge [--converge-cloud])
        landscape [options]
         charts --cluster=<cluster_name> [--namespaces=<namespaces>] [--landscaper-dir=<landscaper_yaml_path>]
-          (list [--namespaces=<namespaces>] [--git-branch=<git_branch>]
-         | converge [--namespaces=<namespaces>] [--converge-cluster] [--converge-cloud] [--converge-localmachine])
+          (list [--namespaces=<namespaces>] [--git-branch=<git_branch>] [--diff]
+         | converge [--namespaces=<namespaces>] [--converge-cluster] [--converge-cloud] [--converge-localmachine] [--skip-unchanged]
+                    [--changed-since=<ref>])
+       landscape [options]
+        charts converge --secret-changed=<path> [--namespaces=<namespaces>]
+         [--landscaper-dir=<landscaper_yaml_path>] [--skip-unchanged]
        landscape [options]
         secrets overwrite-vault-with-lastpass 
          --secrets-username=<lpass_user> 
@@ -19,6 +23,13 @@ Usage: landscape [options]
          [--dangerous-overwrite-vault] 
          [--shared-secrets-folder=<pass_folder>] 
          [--secrets-password=<lpass_password>]
+       landscape [options]
+        status [--cluster=<cluster_name>] [--cloud=<cloud_name>] [--format=<format>]
+       landscape [options]
+        kubeconfig (export | import) [--kubeconfig=<path>]
+       landscape [options]
+        vault (export | import) --file=<path> [--prefix=<vault_path>]
+         [--gpg-recipient=<key_id>] [--dangerous-overwrite-vault]
        landscape [options]
         landscaper update-yaml 
          --chart-directory=<lpass_user> 
@@ -35,17 +46,86 @@ Options:
     --landscaper-dir=<path>      Path to Landscaper YAML dir [default: .].                 
     --terraform-dir=<path>       Path to Terraform templates [default: ./terraform-templates].
     --all-branches               Operate on all branches
+    --selector=<selector>        Only operate on clouds or clusters whose Vault
+                                 attributes match, e.g.
+                                 landscaper_branch=master,cloud_id!=minikube
+                                 (key=value, key!=value, key, !key).
+    --backend=<url>              Where clouds, clusters and chart secrets are
+                                 stored: vault (at VAULT_ADDR), or a local
+                                 sqlite:///<path> replica, seeded with vault
+                                 export and vault import [default: vault].
     --dry-run                    Simulate, but don't converge.
     --log-level=<log_level>      Log messages at least this level [default: INFO].
     --dangerous-overwrite-vault  Allow VAULT_ADDR != http://127.0.0.1:8200 [default: false].
     --shared-secrets-folder=<pass_folder>     [default: Shared-k8s/k8s-landscaper].
+    --vault-trace                Print a summary of Vault requests on exit.
+    --vault-trace-file=<path>    Write every Vault request as JSONL to <path>.
+    --trace-file=<path>          Write a timeline of converge phases and
+                                 commands to <path> (chrome://tracing format).
+    --max-workers=<n>            Converge up to <n> steps (or sync up to <n>
+                                 Vault paths) at once [default: 4].
+    --concurrency=<limits>       Per-kind converge limits, e.g. namespace=8
+                                 (kinds: cloud, cluster, namespace, localmachine).
+    --keep-going                 Keep converging independent steps after a failure.
+    --resume                     Skip steps which an earlier converge completed
+                                 (unchanged), according to its checkpoint.
+    --retries=<n>                Retry failed converge steps <n> times [default: 0].
+    --retry-backoff=<seconds>    Wait <seconds> before the first retry, doubling
+                                 for each later retry [default: 10].
+    --artifacts-dir=<path>       Directory for converge checkpoints and profiles
+                                 [default: .landscape].
+    --vault-rate=<n>             Start at most <n> Vault requests per second. Vault
+                                 requests are also retried, and concurrency
+                                 reduced, when Vault is overloaded [default: 200].
+    --kubernetes-rate=<n>        Start at most <n> kubectl, helm or landscaper
+                                 commands per second, likewise [default: 10].
+    --command-timeout=<seconds>  Kill external commands (kubectl, helm, terraform,
+                                 landscaper, ...) running longer than <seconds>.
+    --command-summary            Print a summary of external commands (wall time,
+                                 CPU, peak memory, block I/O) on exit.
+    --command-summary-file=<path>  Write per-command metrics as JSON to <path>.
+    --metrics-textfile=<path>    Write Prometheus metrics of the run (converge
+                                 step and phase durations, Vault requests,
+                                 commands, incremental skips) to <path>, for
+                                 node_exporter's textfile collector.
+    --metrics-pushgateway=<url>  Push the same metrics to a Prometheus Pushgateway.
+    --profile=<path>             Profile the run, writing <path>.pstats (cProfile,
+                                 every thread) and <path>.collapsed (stack
+                                 samples, for flamegraphs). Relative to
+                                 --artifacts-dir.
+    --profile-memory=<n>         With --profile, also write the <n> source lines
+                                 holding the most memory to <path>.memory.txt.
+    --git-objects                Read Landscaper YAML from each cluster's
+                                 landscaper branch in git (in the repo containing
+                                 --landscaper-dir), without checking it out.
+    --driver=<driver>            Deploy charts with landscaper (one landscaper
+                                 apply per namespace) or helm (one helm upgrade
+                                 per release) [default: landscaper].
+    --diff                       List only releases whose deployed chart, version
+                                 or values differ from the Landscaper YAML.
+    --skip-unchanged             Only apply namespaces (landscaper driver) or
+                                 releases (helm driver) which differ from what's
+                                 deployed.
+    --changed-since=<ref>        Only converge namespaces whose Landscaper YAML
+                                 changed since git revision <ref>.
+    --secret-changed=<path>      Converge every cluster and namespace whose charts
+                                 read the Vault secret path <path>.
+    --no-preflight               Skip checking every chart and its secrets before
+                                 converging charts.
+    --format=<format>            status output: matrix or json [default: matrix].
+    --kubeconfig=<path>          kubeconfig file to export Vault contexts to, or
+                                 import them from [default: ~/.kube/config].
+    --file=<path>                JSONL file to export Vault secrets to, or import
+                                 them from. .gz is compressed, .gpg encrypted.
+    --prefix=<vault_path>        Vault path to export [default: /secret/landscape].
+    --gpg-recipient=<key_id>     gpg key to encrypt a .gpg export for.
 """
 
 import docopt
 import os
-import subprocess
 import logging
 import platform
+import sys
 
 from .cloudcollection import CloudCollection
 from .clustercollection import ClusterCollection
@@ -53,11 +133,28 @@ from .cloud import Cloud
 from .cluster import Cluster
 
 from .chartscollection_landscaper import LandscaperChartsCollection
+from .chartscollection_helm import HelmChartsCollection
 from .secrets import UniversalSecrets
 from .localmachine import Localmachine
 from .kubernetes import (kubernetes_get_context, kubectl_use_context)
 from .vault import (read_kubeconfig, write_kubeconfig)
 from .prerequisites import install_prerequisites
+from .vaulttrace import vault_request_tracer
+from .vaulttree import vault_tree
+from .backend import (configure_backend, is_vault_backend)
+from .vaultexport import (export_vault, import_vault)
+from .throttle import (vault_throttle, kubernetes_throttle)
+from .timeline import timeline
+from .profiler import RunProfiler
+from .metrics import run_metrics
+from .convergegraph import (ConvergeGraph, add_cluster_to_graph,
+                            parse_concurrency)
+from .commandrunner import command_runner
+from .checkpoint import (ConvergeCheckpoint, checkpoint_path,
+                         attributes_fingerprint)
+from .secretindex import build_secret_index
+from .gittree import close_git_object_stores
+from .status import (FleetStatus, format_status_matrix, format_status_json)
 
 
 def main():
@@ -68,7 +165,106 @@ def main():
     if not isinstance(numeric_level, int):
         raise ValueError('Invalid log level: %s' % loglevel)
     logging.basicConfig(level=numeric_level)
+    if args['--command-timeout']:
+        command_runner.default_timeout = float(args['--command-timeout'])
+    vault_tree.max_workers = int(args['--max-workers'])
+    for option, throttle in (('--vault-rate', vault_throttle),
+                             ('--kubernetes-rate', kubernetes_throttle)):
+        try:
+            rate = float(args[option])
+        except ValueError:
+            rate = 0
+        if not rate > 0:
+            sys.exit("ERROR: {0} must be a positive number".format(option))
+        throttle.rate = rate
+    try:
+        configure_backend(args['--backend'])
+    except ValueError as e:
+        sys.exit("ERROR: --backend: {0}".format(e))
+
+    profiler = None
+    if args['--profile']:
+        profiler = RunProfiler(os.path.join(args['--artifacts-dir'], args['--profile']),
+                               memory_top=int(args['--profile-memory'] or 0))
+        profiler.start()
+
+    succeeded = False
+    try:
+        with timeline.span('landscape', 'main', argv=' '.join(sys.argv[1:])):
+            run_command(args)
+        succeeded = True
+    except KeyboardInterrupt:
+        # stop commands still running on converge worker threads
+        command_runner.cancel_all()
+        raise
+    finally:
+        close_git_object_stores()
+        if profiler:
+            profiler.stop()
+        write_run_reports(args, succeeded)
+
+
+def write_run_reports(args, succeeded):
+    """Reports on a landscape run. Called even if the command failed.
+
+    Reports go to stderr, keeping stdout parseable (e.g., by Jenkinsfile)
+
+    Args:
+        args: docopt arguments
+        succeeded: True if the command completed without error
+
+    Returns:
+        None.
+    """
+    if args['--vault-trace']:
+        print(vault_request_tracer.summary(), file=sys.stderr)
+        print(throttle_summary(vault_throttle), file=sys.stderr)
+    if args['--vault-trace-file']:
+        vault_request_tracer.write_jsonl(args['--vault-trace-file'])
+    if args['--trace-file']:
+        timeline.write_chrome_trace(args['--trace-file'])
+    if args['--command-summary']:
+        print(command_runner.summary(), file=sys.stderr)
+        print(throttle_summary(kubernetes_throttle), file=sys.stderr)
+    if args['--command-summary-file']:
+        command_runner.write_json(args['--command-summary-file'])
+    if args['--metrics-textfile']:
+        run_metrics.write_textfile(args['--metrics-textfile'],
+                                   command_name(args), succeeded)
+    if args['--metrics-pushgateway']:
+        run_metrics.push(args['--metrics-pushgateway'], command_name(args),
+                         succeeded)
+
+
+def command_name(args):
+    """The landscape command run, e.g. charts converge (str)"""
+    words = [c for c in ['cloud', 'cluster', 'charts', 'status', 'secrets',
+                         'kubeconfig', 'vault', 'landscaper', 'setup']
+             if args.get(c)]
+    words += [c for c in ['list', 'converge', 'export', 'import',
+                          'overwrite-vault-with-lastpass', 'update-yaml',
+                          'install-prerequisites'] if args.get(c)]
+    return ' '.join(words)
 
+
+def throttle_summary(throttle):
+    """One-line summary of an AdaptiveThrottle's stats"""
+    stats = throttle.stats()
+    return "{0} throttle: {1} requests, {2} throttled, {3} retries, " \
+        "{4:.1f}s waiting. Concurrency limit {5}".format(
+            throttle.name, stats['requests'], stats['throttled'],
+            stats['retries'], stats['waited'], stats['limit'])
+
+
+def run_command(args):
+    """Runs the landscape command selected on the command-line
+
+    Args:
+        args: docopt arguments
+
+    Returns:
+        None.
+    """
     # parse arguments
     dry_run = args['--dry-run']
     cloud_selection = args['--cloud']
@@ -107,11 +303,16 @@ def main():
     clouds = None
     clusters = None
     charts = None
-    if not args['secrets']:
+    if not args['secrets'] and not args['kubeconfig'] and not args['vault']:
         # landscape secrets overwrite --from-lastpass ...
-        clouds = CloudCollection(git_branch=git_branch_selection)
-        clusters = ClusterCollection(cloud=cloud_selection,
-                                        git_branch=git_branch_selection)
+        try:
+            clouds = CloudCollection(git_branch=git_branch_selection,
+                                     selector=args['--selector'])
+            clusters = ClusterCollection(cloud=cloud_selection,
+                                         git_branch=git_branch_selection,
+                                         selector=args['--selector'])
+        except ValueError as e:
+            sys.exit("ERROR: --selector: {0}".format(e))
     logging.debug("clouds: {0}".format(clouds))
     logging.debug("clusters: {0}".format(clusters))
 
@@ -125,7 +326,15 @@ def main():
                 print(clouds)
         # landscape cloud converge
         elif args['converge']:
-            clouds[cloud_selection].converge(dry_run)
+            graph = new_converge_graph(args, 'cloud', cloud_selection or 'all')
+            clouds_to_converge = clouds.list()
+            if cloud_selection:
+                clouds_to_converge = [clouds[cloud_selection]]
+            for cloud in clouds_to_converge:
+                graph.add('cloud:' + cloud.name, 'cloud',
+                          converge_action(cloud, dry_run),
+                          fingerprint=fingerprint_action(cloud))
+            run_converge_graph(graph)
 
 
     # landscape cluster ...
@@ -135,33 +344,52 @@ def main():
             print(clusters)
         # landscape cluster converge
         elif args['converge']:
-            if also_converge_cloud:
-                selected_cluster.cloud.converge(dry_run)
-            clusters[cluster_selection].converge(dry_run)
+            graph = new_converge_graph(args, 'cluster', cluster_selection or 'all')
+            clusters_to_converge = clusters.list()
+            if cluster_selection:
+                clusters_to_converge = [selected_cluster]
+            for cluster in clusters_to_converge:
+                add_cluster_to_graph(graph, cluster, dry_run,
+                                     converge_cloud=also_converge_cloud,
+                                     converge_cluster=True)
+            run_converge_graph(graph)
 
 
+    # landscape charts converge --secret-changed=...
+    elif args['charts'] and args['--secret-changed']:
+        converge_secret_consumers(args, clusters.list(), args['--secret-changed'])
+
     # landscape charts ...
     elif args['charts']:
         # TODO: figure out cluster_provisioner inside LandscaperChartsCollection
         # to pass one less parameter to LandscaperChartsCollection
-        charts = LandscaperChartsCollection(path_to_landscaper_repo=landscaper_dir,
-                                            context_name=cluster_selection,
-                                            namespace_selection=namespaces_selection)
+        charts = new_charts_collection(args['--driver'],
+                                       path_to_landscaper_repo=landscaper_dir,
+                                       context_name=cluster_selection,
+                                       namespace_selection=namespaces_selection,
+                                       skip_unchanged=args['--skip-unchanged'],
+                                       git_objects=args['--git-objects'],
+                                       max_workers=int(args['--max-workers']))
         logging.debug("charts: {0}".format(charts))
         # landscape charts list ...
         if args['list']:
-            print(charts)
+            if args['--diff']:
+                print(charts.diff(max_workers=int(args['--max-workers'])))
+            else:
+                print(charts)
         # landscape charts converge ...
         elif args['converge']:
-            if also_converge_cloud:
-                selected_cluster.cloud.converge(dry_run)
-            if also_converge_cluster:
-                clusters[cluster_selection].converge(dry_run)
-            charts.converge(dry_run)
-            # set up local machine for cluster
-            if also_converge_localmachine:
-                localmachine = Localmachine(cluster=clusters[cluster_selection])
-                localmachine.converge()
+            if args['--changed-since']:
+                charts.restrict_to_changes_since(args['--changed-since'])
+            if not args['--no-preflight']:
+                run_preflight(charts, int(args['--max-workers']))
+            graph = new_converge_graph(args, 'charts', cluster_selection)
+            add_cluster_to_graph(graph, selected_cluster, dry_run,
+                                 converge_cloud=also_converge_cloud,
+                                 converge_cluster=also_converge_cluster,
+                                 charts=charts,
+                                 converge_localmachine=also_converge_localmachine)
+            run_converge_graph(graph)
 
     # landscape secrets overwrite overwrite-vault-with-lastpass ...
     elif args['secrets'] and args['overwrite-vault-with-lastpass']:
@@ -175,8 +403,67 @@ def main():
                                           password=central_secrets_password)
         shared_secrets.overwrite_vault(shared_secrets_folder=central_secrets_folder,
                                        shared_secrets_item=central_secrets_item,
-                                       use_remote_vault=remote_vault_ok)
+                                       use_remote_vault=remote_vault_ok,
+                                       max_workers=int(args['--max-workers']))
+
 
+    # landscape status ...
+    elif args['status']:
+        clusters_to_check = clusters.list()
+        if cluster_selection:
+            clusters_to_check = [selected_cluster]
+        max_workers = int(args['--max-workers'])
+        def new_charts(cluster_name):
+            return new_charts_collection(args['--driver'],
+                                         path_to_landscaper_repo=landscaper_dir,
+                                         context_name=cluster_name,
+                                         namespace_selection=[],
+                                         git_objects=args['--git-objects'],
+                                         max_workers=max_workers)
+        status_rows = FleetStatus(clusters_to_check, new_charts,
+                                  max_workers=max_workers).report()
+        if args['--format'] == 'json':
+            print(format_status_json(status_rows))
+        else:
+            print(format_status_matrix(status_rows))
+        failed_clusters = [r['cluster'] for r in status_rows if r['errors']]
+        if failed_clusters:
+            sys.exit("ERROR: could not check {0}".format(', '.join(failed_clusters)))
+
+    # landscape kubeconfig ...
+    elif args['kubeconfig']:
+        # landscape kubeconfig export
+        if args['export']:
+            write_kubeconfig(args['--kubeconfig'],
+                             max_workers=int(args['--max-workers']))
+        # landscape kubeconfig import
+        elif args['import']:
+            read_kubeconfig(args['--kubeconfig'],
+                            max_workers=int(args['--max-workers']))
+
+    # landscape vault ...
+    elif args['vault']:
+        # landscape vault export
+        if args['export']:
+            export_vault(args['--prefix'], args['--file'],
+                         max_workers=int(args['--max-workers']),
+                         gpg_recipient=args['--gpg-recipient'])
+        # landscape vault import
+        elif args['import']:
+            vault_addr = os.environ.get('VAULT_ADDR')
+            if (is_vault_backend() and not remote_vault_ok and
+                    vault_addr != 'http://127.0.0.1:8200'):
+                sys.exit("ERROR: Pass --dangerous-overwrite-vault to import into "
+                         "non-http://127.0.0.1:8200 vault servers. Current "
+                         "VAULT_ADDR: {0}".format(vault_addr))
+            written, unchanged, failed_paths = import_vault(args['--file'],
+                                                max_workers=int(args['--max-workers']),
+                                                dry_run=dry_run)
+            print("Vault secrets: {0} {1}, {2} unchanged".format(written,
+                'to write' if dry_run else 'written', unchanged))
+            if failed_paths:
+                sys.exit("ERROR: failed to write Vault paths: {0}".format(
+                    ', '.join(failed_paths)))
 
     # landscape setup install-prerequisites ...
     elif args['setup']:
@@ -184,5 +471,145 @@ def main():
             install_prerequisites(platform.system())
 
 
+def new_charts_collection(driver, max_workers, **kwargs):
+    """Creates the charts collection for a deploy driver
+
+    Args:
+        driver: landscaper or helm
+        max_workers: Maximum number of helm releases deployed at once, per
+            namespace
+        kwargs: Arguments for the collection
+
+    Returns:
+        A LandscaperChartsCollection (or subclass)
+    """
+    if driver == 'landscaper':
+        return LandscaperChartsCollection(**kwargs)
+    elif driver == 'helm':
+        return HelmChartsCollection(max_workers=max_workers, **kwargs)
+    sys.exit("ERROR: unknown --driver {0}. Use landscaper or helm".format(driver))
+
+
+def converge_secret_consumers(args, clusters, secret_path):
+    """Converges the namespaces, in every cluster, which read a Vault secret
+
+    Args:
+        args: docopt arguments
+        clusters: Clusters which may consume the secret
+        secret_path: The changed Vault path (see SecretIndex.consumers)
+
+    Returns:
+        None.
+    """
+    max_workers = int(args['--max-workers'])
+    charts_by_cluster = {}
+    for cluster in clusters:
+        charts_by_cluster[cluster.name] = new_charts_collection(args['--driver'],
+                                            path_to_landscaper_repo=args['--landscaper-dir'],
+                                            context_name=cluster.name,
+                                            namespace_selection=args['--namespaces'] or [],
+                                            skip_unchanged=args['--skip-unchanged'],
+                                            git_objects=args['--git-objects'],
+                                            max_workers=max_workers)
+    consumers = build_secret_index(charts_by_cluster,
+                                   max_workers=max_workers).consumers(secret_path)
+    if not consumers:
+        logging.info("No charts read {0}. Nothing to converge".format(secret_path))
+        return
+    namespaces_by_cluster = {}
+    for cluster_name, namespace in consumers:
+        namespaces_by_cluster.setdefault(cluster_name, set()).add(namespace)
+        logging.info("{0} is read by {1}/{2}".format(secret_path, cluster_name,
+                                                     namespace))
+
+    graph = new_converge_graph(args, 'charts', 'secret' + secret_path.replace('/', '_'))
+    for cluster in clusters:
+        if cluster.name in namespaces_by_cluster:
+            charts = charts_by_cluster[cluster.name]
+            charts.changed_namespaces = namespaces_by_cluster[cluster.name]
+            run_metrics.increment('landscape_incremental_namespaces',
+                                  len(charts.changed_namespaces),
+                                  mode='secret_changed', outcome='applied',
+                                  cluster=cluster.name)
+            if not args['--no-preflight']:
+                run_preflight(charts, max_workers)
+            add_cluster_to_graph(graph, cluster, args['--dry-run'], charts=charts)
+    run_converge_graph(graph)
+
+
+def new_converge_graph(args, *checkpoint_names):
+    """Creates a ConvergeGraph with limits from the command-line
+
+    Steps are checkpointed (except in --dry-run), so that --resume can skip
+    steps completed by an earlier run.
+
+    Args:
+        args: docopt arguments
+        checkpoint_names: Names identifying the checkpoint file, e.g. the
+            command and the selected cluster
+
+    Returns:
+        An empty ConvergeGraph
+    """
+    checkpoint = None
+    if not args['--dry-run']:
+        checkpoint = ConvergeCheckpoint(checkpoint_path(args['--artifacts-dir'],
+                                                        *checkpoint_names),
+                                        resume=args['--resume'])
+    return ConvergeGraph(max_workers=int(args['--max-workers']),
+                         concurrency=parse_concurrency(args['--concurrency']),
+                         keep_going=args['--keep-going'],
+                         checkpoint=checkpoint,
+                         retries=int(args['--retries']),
+                         retry_backoff=float(args['--retry-backoff']))
+
+
+def converge_action(cloud_or_cluster, dry_run):
+    return lambda: cloud_or_cluster.converge(dry_run)
+
+
+def fingerprint_action(cloud_or_cluster):
+    return lambda: attributes_fingerprint(cloud_or_cluster)
+
+
+def run_preflight(charts, max_workers):
+    """Checks charts and their secrets, exiting non-zero before any apply
+
+    Args:
+        charts: The LandscaperChartsCollection about to be converged
+        max_workers: Maximum number of files or Vault secrets read at once
+
+    Returns:
+        None.
+    """
+    with timeline.span('preflight', 'charts', cluster=charts.cluster_id):
+        problems = charts.preflight(max_workers=max_workers)
+    if problems:
+        for problem in problems:
+            logging.error(problem)
+        sys.exit("ERROR: preflight found {0} problems. Nothing was applied".format(
+            len(problems)))
+    logging.info("Preflight passed for {0}".format(charts.cluster_id))
+
+
+def run_converge_graph(graph):
+    """Converges every step in a graph, exiting non-zero on failure
+
+    Args:
+        graph: The ConvergeGraph to run
+
+    Returns:
+        None.
+    """
+    logging.debug("converge steps:\n{0}".format(graph))
+    failed_steps = graph.run()
+    run_metrics.add_graph(graph)
+    logging.info("Converge summary:\n{0}\n{1}".format(graph,
+                                                     command_runner.summary()))
+    if failed_steps:
+        sys.exit("ERROR: failed to converge {0}".format(
+            ', '.join([str(step) for step in failed_steps])))
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,267 @@
+import collections
+import logging
+import os
+import socket
+import threading
+import time
+import urllib.request
+
+from .timeline import timeline
+from .vaulttrace import vault_request_tracer
+from .commandrunner import command_runner
+
+# seconds. Converge steps and commands range from milliseconds to an hour
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                    30, 60, 120, 300, 600, 1800, 3600]
+VAULT_LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                         0.5, 1, 2.5, 5, 10]
+
+
+class RunMetrics(object):
+    """Prometheus metrics for a landscape run
+
+    Counts of incremental converge decisions (e.g., namespaces skipped by
+    --skip-unchanged) are recorded during the run. Everything else is read
+    at the end from the converge graphs, timeline, Vault request tracer and
+    command runner, and rendered in the Prometheus text exposition format,
+    for node_exporter's textfile collector or a Pushgateway.
+
+    Counts are of this run only, so they're gauges rather than counters,
+    which Prometheus expects never to reset.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._counts = collections.Counter()
+        self._graphs = []
+        self._lock = threading.Lock()
+
+
+    def increment(self, name, value=1, **labels):
+        """Adds to a count
+
+        Args:
+            name: Metric name, e.g. landscape_incremental_namespaces
+            value: Amount to add
+            labels: Label names and values
+
+        Returns:
+            None.
+        """
+        with self._lock:
+            self._counts[(name, tuple(sorted(labels.items())))] += value
+
+
+    def add_graph(self, graph):
+        """Includes a ConvergeGraph's steps in the metrics, once it has run"""
+        with self._lock:
+            self._graphs.append(graph)
+
+
+    def exposition(self, command, succeeded):
+        """Renders every metric in the Prometheus text exposition format
+
+        Args:
+            command: The landscape command, e.g. charts converge
+            succeeded: True if the command completed without error
+
+        Returns:
+            str
+        """
+        finished = time.time()
+        families = []
+        run_labels = {'command': command}
+        families.append(_gauge('landscape_run_duration_seconds',
+                               'Wall time of the landscape run.',
+                               [(run_labels, finished - self.started)]))
+        families.append(_gauge('landscape_run_success',
+                               '1 if the landscape run succeeded, 0 if not.',
+                               [(run_labels, 1 if succeeded else 0)]))
+        families.append(_gauge('landscape_run_finish_timestamp_seconds',
+                               'Time the landscape run finished.',
+                               [(run_labels, finished)]))
+
+        step_durations = collections.defaultdict(list)
+        step_counts = collections.Counter()
+        with self._lock:
+            graphs = list(self._graphs)
+            counts = dict(self._counts)
+        for graph in graphs:
+            for node in graph.nodes:
+                step_labels = _step_labels(node.key)
+                state = 'unchanged' if node.from_checkpoint else node.state
+                step_counts[_key(dict(step_labels, state=state))] += 1
+                if node.duration is not None:
+                    step_durations[_key(step_labels)].append(node.duration)
+        families.append(_gauge('landscape_converge_steps',
+            'Converge steps by kind, cluster and final state (done, failed, '
+            'skipped, or unchanged since a checkpointed run).',
+            [(dict(k), v) for k, v in step_counts.items()]))
+        families.append(_histogram('landscape_converge_step_duration_seconds',
+            'Duration of converge steps (clouds, clusters, namespaces), '
+            'including retries.', step_durations, DURATION_BUCKETS))
+
+        phase_durations = collections.defaultdict(list)
+        for event in timeline.events:
+            if event['cat'] in ('main', 'subprocess'):
+                continue
+            phase_durations[_key({'category': event['cat'],
+                                  'phase': event['name']})].append(event['dur'] / 1000000.0)
+        families.append(_histogram('landscape_phase_duration_seconds',
+            'Duration of traced converge phases.', phase_durations,
+            DURATION_BUCKETS))
+
+        vault_counts = collections.Counter()
+        vault_latencies = collections.defaultdict(list)
+        for request in vault_request_tracer.requests():
+            vault_counts[_key({'operation': request['operation'],
+                               'error': request['error'] or ''})] += 1
+            vault_latencies[_key({'operation': request['operation']})].append(
+                request['latency'])
+        families.append(_gauge('landscape_vault_requests',
+            'Vault requests by operation and error (empty if none).',
+            [(dict(k), v) for k, v in vault_counts.items()]))
+        families.append(_histogram('landscape_vault_request_duration_seconds',
+            'Latency of Vault requests, including throttling retries.',
+            vault_latencies, VAULT_LATENCY_BUCKETS))
+
+        command_counts = collections.Counter()
+        command_durations = collections.defaultdict(list)
+        for result in command_runner.results:
+            command_name = os.path.basename(result.argv[0])
+            command_counts[_key({'command': command_name,
+                                 'failed': str(result.failed).lower()})] += 1
+            command_durations[_key({'command': command_name})].append(result.duration)
+        families.append(_gauge('landscape_commands',
+            'External commands (kubectl, helm, terraform, ...) run.',
+            [(dict(k), v) for k, v in command_counts.items()]))
+        families.append(_histogram('landscape_command_duration_seconds',
+            'Wall time of external commands.', command_durations,
+            DURATION_BUCKETS))
+
+        for name, help_text in INCREMENTAL_COUNTS:
+            families.append(_gauge(name, help_text,
+                [(dict(labels), value) for (count_name, labels), value
+                 in counts.items() if count_name == name]))
+        return ''.join(families)
+
+
+    def write_textfile(self, textfile_path, command, succeeded):
+        """Writes the metrics for node_exporter's textfile collector
+
+        The file is replaced atomically, so the collector never reads a
+        partial file.
+
+        Returns:
+            None.
+        """
+        textfile_dir = os.path.dirname(textfile_path)
+        if textfile_dir and not os.path.exists(textfile_dir):
+            os.makedirs(textfile_dir)
+        tmp_path = "{0}.{1}.tmp".format(textfile_path, os.getpid())
+        with open(tmp_path, 'w') as textfile:
+            textfile.write(self.exposition(command, succeeded))
+        os.rename(tmp_path, textfile_path)
+        logging.info("Wrote metrics to {0}".format(textfile_path))
+
+
+    def push(self, pushgateway_url, command, succeeded, timeout=10):
+        """Pushes the metrics to a Prometheus Pushgateway
+
+        Metrics are grouped by job (landscape) and instance (this host), and
+        replace that group's previous metrics. A failed push is logged, and
+        doesn't fail the run.
+
+        Returns:
+            True if the push succeeded
+        """
+        push_url = "{0}/metrics/job/landscape/instance/{1}".format(
+            pushgateway_url.rstrip('/'), socket.gethostname())
+        request = urllib.request.Request(
+            push_url, data=self.exposition(command, succeeded).encode('utf-8'),
+            method='PUT', headers={'Content-Type': 'text/plain; version=0.0.4'})
+        try:
+            urllib.request.urlopen(request, timeout=timeout).close()
+        except (OSError, ValueError) as e:
+            logging.error("Failed to push metrics to {0}: {1}".format(push_url, e))
+            return False
+        logging.info("Pushed metrics to {0}".format(push_url))
+        return True
+
+
+# counts incremented during the run, with their help text
+INCREMENTAL_COUNTS = [
+    ('landscape_incremental_namespaces',
+     'Namespaces applied or skipped by incremental modes (mode: '
+     'skip_unchanged, changed_since, secret_changed).'),
+    ('landscape_incremental_releases',
+     'Releases applied or skipped by the helm driver with --skip-unchanged.'),
+]
+
+
+def _step_labels(step_key):
+    """Labels of a converge step, from its key (e.g., namespace:minikube/jenkins)"""
+    kind, _, target = step_key.partition(':')
+    if kind == 'namespace':
+        cluster, _, namespace = target.partition('/')
+        return {'kind': kind, 'cluster': cluster, 'namespace': namespace}
+    if kind == 'cloud':
+        return {'kind': kind, 'cloud': target}
+    return {'kind': kind, 'cluster': target}
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _gauge(name, help_text, samples):
+    return _family(name, help_text, 'gauge', [(name, l, v) for l, v in sorted(
+        samples, key=lambda sample: _key(sample[0]))])
+
+
+def _histogram(name, help_text, observations, buckets):
+    """A histogram family, with one histogram per label set
+
+    Args:
+        observations: dict mapping label keys (see _key) to lists of values
+    """
+    samples = []
+    for label_key in sorted(observations):
+        labels = dict(label_key)
+        values = observations[label_key]
+        for bucket in buckets:
+            samples.append((name + '_bucket', dict(labels, le=_format_value(bucket)),
+                            len([v for v in values if v <= bucket])))
+        samples.append((name + '_bucket', dict(labels, le='+Inf'), len(values)))
+        samples.append((name + '_sum', labels, sum(values)))
+        samples.append((name + '_count', labels, len(values)))
+    return _family(name, help_text, 'histogram', samples)
+
+
+def _family(name, help_text, metric_type, samples):
+    lines = ["# HELP {0} {1}".format(name, help_text),
+             "# TYPE {0} {1}".format(name, metric_type)]
+    for sample_name, labels, value in samples:
+        lines.append("{0}{1} {2}".format(sample_name, _format_labels(labels),
+                                         _format_value(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(['{0}="{1}"'.format(k, _escape(v))
+                           for k, v in sorted(labels.items())]) + '}'
+
+
+def _escape(label_value):
+    return str(label_value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+run_metrics = RunMetrics()
@@ -1,8 +1,9 @@
-import subprocess as sp
 import platform
 import os.path
 import logging
 
+from .commandrunner import (command_runner, shell_argv)
+
 def install_prerequisites(os_platform):
     """
     Installs prerequisites for the landscape CLI tool
@@ -28,7 +29,7 @@ def install_gsed(os_platform):
     dst = '/usr/local/bin/gsed'
     if not os.path.isfile(dst):
         logging.info("installing gnu-sed")
-        sp.call(install_cmds[os_platform], shell=True)
+        command_runner.run(shell_argv(install_cmds[os_platform]))
     else:
         logging.info("gnu-sed already installed in {0}".format(dst))
 
@@ -43,7 +44,7 @@ def install_minikube(os_platform):
     dst = '/usr/local/bin/minikube'
     if not os.path.isfile(dst):
         logging.info("installing minikube")
-        sp.call(install_cmds[os_platform], shell=True)
+        command_runner.run(shell_argv(install_cmds[os_platform]))
     else:
         logging.info("minikube already installed in {0}".format(dst))
 
@@ -56,7 +57,7 @@ def install_lastpass(os_platform):
     dst = '/usr/local/bin/lpass'
     if not os.path.isfile(dst):
         logging.info("installing lastpass")
-        sp.call(install_cmds[os_platform], shell=True)
+        command_runner.run(shell_argv(install_cmds[os_platform]))
     else:
         logging.info("lastpass already installed in {0}".format(dst))
 
@@ -71,7 +72,7 @@ def install_vault(os_platform):
     dst = '/usr/local/bin/vault'
     if not os.path.isfile(dst):
         logging.info("installing vault")
-        sp.call(install_cmds[os_platform], shell=True)
+        command_runner.run(shell_argv(install_cmds[os_platform]))
     else:
         logging.info("vault already installed in {0}".format(dst))
 
@@ -86,7 +87,7 @@ def install_kubectl(os_platform):
     dst = '/usr/local/bin/kubectl'
     if not os.path.isfile(dst):
         logging.info("installing kubectl")
-        sp.call(install_cmds[os_platform], shell=True)
+        command_runner.run(shell_argv(install_cmds[os_platform]))
     else:
         logging.info("kubectl already installed in {0}".format(dst))
 
@@ -103,7 +104,7 @@ def install_helm(os_platform):
     dst = '/usr/local/bin/helm'
     if not os.path.isfile(dst):
         logging.info("installing helm")
-        sp.call(install_cmds[os_platform], shell=True)
+        command_runner.run(shell_argv(install_cmds[os_platform]))
     else:
         logging.info("helm already installed in {0}".format(dst))
 
@@ -119,7 +120,7 @@ def install_landscaper(os_platform):
     dst = '/usr/local/bin/landscaper'
     if not os.path.isfile(dst):
         logging.info("installing landscaper")
-        sp.call(install_cmds[os_platform], shell=True)
+        command_runner.run(shell_argv(install_cmds[os_platform]))
     else:
         logging.info("landscaper already installed in {0}".format(dst))
 
@@ -134,7 +135,7 @@ def install_terraform(os_platform):
     dst = '/usr/local/bin/terraform'
     if not os.path.isfile(dst):
         logging.info("installing terraform")
-        sp.call(install_cmds[os_platform], shell=True)
+        command_runner.run(shell_argv(install_cmds[os_platform]))
     else:
         logging.info("terraform already installed in {0}".format(dst))
 
@@ -145,8 +146,7 @@ def install_helm_plugins():
         'https://github.com/technosophos/helm-gpg': '0.1.0',
     }
     for plugin_url, version in plugins.items():
-        install_cmd = "helm plugin install {0} --version={1}".format(
-                                                    plugin_url,
-                                                    version)
-        logging.info("installing helm plugin with command: {0}".format(install_cmd))
-        sp.call(install_cmd, shell=True)
+        install_cmd = ['helm', 'plugin', 'install', plugin_url,
+                       "--version={0}".format(version)]
+        logging.info("installing helm plugin with command: {0}".format(' '.join(install_cmd)))
+        command_runner.run(install_cmd)
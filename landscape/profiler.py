@@ -0,0 +1,192 @@
+import collections
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+
+class RunProfiler(object):
+    """Profiles a whole landscape run, including converge worker threads
+
+    Writes:
+      <path_prefix>.pstats: cProfile statistics of every thread, merged
+        (python -m pstats <file>, snakeviz, ...). From Python 3.12, only one
+        cProfile profile can be active at a time, so only the main thread
+        is profiled. Worker threads are still in the stack samples
+      <path_prefix>.collapsed: wall-clock stack samples of every thread, in
+        collapsed-stack format (flamegraph.pl, speedscope, ...). Unlike
+        cProfile, these include time spent waiting (e.g., on Vault or
+        kubectl)
+      <path_prefix>.memory.txt: with memory_top, the source lines which
+        allocated the most memory still in use at the end of the run
+
+    Attributes:
+        path_prefix: Path of the files written, without extension
+        sample_interval: Seconds between stack samples
+        memory_top: Number of source lines in the memory report, or None
+            to skip tracing memory
+    """
+
+    def __init__(self, path_prefix, sample_interval=0.01, memory_top=None):
+        self.path_prefix = path_prefix
+        self.sample_interval = sample_interval
+        self.memory_top = memory_top
+        self._profiles = []
+        self._samples = collections.Counter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = None
+        self._main_profile = None
+        self._started = None
+        self._finished = None
+
+
+    def start(self):
+        """Starts profiling this thread and threads started from now on"""
+        self._started = time.time()
+        if self.memory_top:
+            tracemalloc.start()
+        self._sampler = threading.Thread(target=self._sample_stacks,
+                                         name='profiler')
+        self._sampler.daemon = True
+        self._sampler.start()
+        if PER_THREAD_PROFILES:
+            threading.setprofile(self._profile_new_thread)
+        self._main_profile = self._profile_new_thread()
+
+
+    def stop(self):
+        """Stops profiling, and writes the profile
+
+        Returns:
+            A list of the paths written
+        """
+        self._finished = time.time()
+        memory = None
+        if self.memory_top:
+            memory = tracemalloc.get_traced_memory(), tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        if PER_THREAD_PROFILES:
+            threading.setprofile(None)
+        self._stopped.set()
+        self._sampler.join()
+        # cProfile can only stop profiling the current thread. Other threads'
+        # profiles are read as they are
+        if self._main_profile:
+            self._main_profile.disable()
+        with self._lock:
+            profiles = list(self._profiles)
+
+        profile_dir = os.path.dirname(self.path_prefix)
+        if profile_dir and not os.path.exists(profile_dir):
+            os.makedirs(profile_dir)
+        written = [self._write_pstats(profiles), self._write_collapsed()]
+        if memory:
+            written.append(self._write_memory_report(*memory))
+        written = [path for path in written if path]
+        logging.info("Profile written to {0}".format(', '.join(written)))
+        return written
+
+
+    def _profile_new_thread(self, *_):
+        """Starts a cProfile profile for the current thread
+
+        Installed with threading.setprofile, so it's called once in each new
+        thread, before its target runs
+
+        Returns:
+            The cProfile.Profile, or None if another profiler is active
+        """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            logging.warn("Not profiling thread {0}: {1}".format(
+                threading.current_thread().name, e))
+            return None
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+
+    def _sample_stacks(self):
+        sampler_id = threading.get_ident()
+        while not self._stopped.wait(self.sample_interval):
+            thread_names = dict([(t.ident, t.name) for t in threading.enumerate()])
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, 'thread'))
+                stack.reverse()
+                with self._lock:
+                    self._samples[';'.join(stack)] += 1
+
+
+    def _write_pstats(self, profiles):
+        """Writes the merged profiles, or nothing (returning None) if no
+        profile has stats
+        """
+        pstats_path = self.path_prefix + '.pstats'
+        stats = None
+        for profile in profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                # a thread which never made a call has no stats
+                continue
+        if stats is None:
+            logging.warn("No profile statistics collected")
+            return None
+        stats.dump_stats(pstats_path)
+        return pstats_path
+
+
+    def _write_collapsed(self):
+        collapsed_path = self.path_prefix + '.collapsed'
+        with self._lock:
+            samples = sorted(self._samples.items())
+        with open(collapsed_path, 'w') as collapsed:
+            for stack, count in samples:
+                collapsed.write("{0} {1}\n".format(stack, count))
+        return collapsed_path
+
+
+    def _write_memory_report(self, traced_memory, snapshot):
+        memory_path = self.path_prefix + '.memory.txt'
+        current, peak = traced_memory
+        # leave out the profiler's own samples and profiles
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+        ])
+        with open(memory_path, 'w') as memory_report:
+            memory_report.write("Traced memory: {0:.1f} MiB in use, {1:.1f} MiB peak, "
+                                "over {2:.1f}s\n\n".format(
+                                    current / 1048576.0, peak / 1048576.0,
+                                    self._finished - self._started))
+            for statistic in snapshot.statistics('lineno')[:self.memory_top]:
+                memory_report.write("{0}\n".format(statistic))
+        return memory_path
+
+
+# cProfile uses sys.monitoring from Python 3.12, which allows a single
+# profiler at a time: enabling a second one raises ValueError
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', os.path.basename(code.co_filename))
+    return "{0}:{1}".format(module, getattr(code, 'co_qualname', code.co_name))
@@ -0,0 +1,165 @@
+import concurrent.futures
+import hashlib
+import json
+import logging
+import threading
+
+import yaml
+
+from .commandrunner import command_runner
+
+
+class ReleaseInventory(object):
+    """The Helm releases deployed to a cluster, read with helm 2
+
+    Releases are listed once, and each release's values are fetched at most
+    once, so an inventory should be shared for the whole run.
+
+    Attributes:
+        kube_context: Kubernetes context of the cluster
+    """
+
+    def __init__(self, kube_context):
+        self.kube_context = kube_context
+        self._releases = None
+        self._values = {}
+        self._lock = threading.Lock()
+
+
+    def releases(self):
+        """Deployed releases, listed with helm list
+
+        Returns:
+            A dict mapping release names to dicts with chart (e.g.,
+            jenkins-0.1.0), namespace and status keys
+        """
+        with self._lock:
+            if self._releases is None:
+                self._releases = self._list_releases()
+            return self._releases
+
+
+    def values(self, release_name):
+        """User-supplied values of a deployed release, from helm get values
+
+        Returns:
+            A dict of values
+        """
+        with self._lock:
+            if release_name in self._values:
+                return self._values[release_name]
+        release_values = self._get_values(release_name)
+        with self._lock:
+            self._values[release_name] = release_values
+        return release_values
+
+
+    def diff(self, desired_releases, max_workers=4, namespaces=None,
+             ignore_values=None):
+        """Compares desired releases against deployed ones
+
+        Values are only fetched (concurrently) for releases whose chart and
+        version are already up-to-date.
+
+        Args:
+            desired_releases: dict mapping release names to dicts with chart
+                (e.g., jenkins-0.1.0), namespace and values keys
+            max_workers: Maximum concurrent helm get values commands
+            namespaces: Also report deployed releases in these namespaces
+                which aren't desired
+            ignore_values: Top-level keys of deployed values to ignore, e.g.
+                values added by the deploy driver
+
+        Returns:
+            A dict mapping the names of releases which differ to a reason (str)
+        """
+        deployed = self.releases()
+        changed = {}
+        compare_values = []
+        for release_name, desired in desired_releases.items():
+            deployed_release = deployed.get(release_name)
+            if not deployed_release:
+                changed[release_name] = 'not deployed'
+            elif deployed_release['status'].upper() != 'DEPLOYED':
+                changed[release_name] = "status {0}".format(deployed_release['status'])
+            elif deployed_release['chart'] != desired['chart']:
+                changed[release_name] = "chart {0} -> {1}".format(
+                    deployed_release['chart'], desired['chart'])
+            else:
+                compare_values.append(release_name)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for release_name, deployed_values in zip(compare_values,
+                    executor.map(self.values, compare_values)):
+                desired_values = desired_releases[release_name]['values']
+                deployed_values = {k: v for k, v in deployed_values.items()
+                                   if k not in (ignore_values or [])}
+                if values_hash(deployed_values) != values_hash(desired_values):
+                    changed[release_name] = 'values changed'
+
+        for release_name, deployed_release in deployed.items():
+            if deployed_release['namespace'] in (namespaces or []) and \
+                    release_name not in desired_releases:
+                changed[release_name] = 'deployed, but not in landscaper yaml'
+        return changed
+
+
+    def _list_releases(self):
+        list_cmd = ['helm', 'list', '--output=json', '--max=10000',
+                    '--kube-context=' + self.kube_context]
+        helm_list = command_runner.run(list_cmd, timeout=120, echo=False)
+        if helm_list.failed:
+            raise ChildProcessError("helm list failed for {0}: {1}".format(
+                self.kube_context, helm_list.stderr.strip()))
+        releases = {}
+        if not helm_list.output:
+            return releases
+        listed = json.loads(helm_list.output)
+        # helm 3 lists releases of the current namespace only, as a list
+        if not isinstance(listed, dict):
+            raise ChildProcessError("Unexpected helm list output for {0}. "
+                                    "Only helm 2 is supported".format(
+                                        self.kube_context))
+        for release in listed.get('Releases') or []:
+            release = {k.lower(): v for k, v in release.items()}
+            releases[release['name']] = {
+                'chart': release['chart'],
+                'namespace': release['namespace'],
+                'status': release['status'],
+            }
+        logging.debug("{0} releases deployed to {1}".format(len(releases),
+                                                          self.kube_context))
+        return releases
+
+
+    def _get_values(self, release_name):
+        values_cmd = ['helm', 'get', 'values', release_name,
+                      '--kube-context=' + self.kube_context]
+        release_namespace = self.releases()[release_name]['namespace']
+        helm_get = command_runner.run(values_cmd, timeout=120, echo=False,
+                                      label=release_namespace)
+        if helm_get.failed:
+            raise ChildProcessError("helm get values failed for {0}".format(
+                release_name))
+        return yaml.safe_load(helm_get.output) or {}
+
+
+def chart_version_name(release):
+    """helm list's chart column for a Landscaper release definition
+
+    e.g., {'chart': 'stable/jenkins:0.1.0', 'version': '2.3.0'} becomes
+    jenkins-0.1.0. helm lists the chart's version, from release.chart, not
+    the release's own version
+    """
+    chart_ref, _, chart_version = release['chart'].partition(':')
+    return "{0}-{1}".format(chart_ref.split('/')[-1], chart_version)
+
+
+def values_hash(values):
+    """A hash of release values, independent of key order
+
+    Returns:
+        A hex sha256 digest (str)
+    """
+    return hashlib.sha256(json.dumps(values or {}, sort_keys=True,
+                                     default=str).encode('utf-8')).hexdigest()
@@ -0,0 +1,97 @@
+import concurrent.futures
+import threading
+
+
+CHART_SECRETS_ROOT = '/secret/landscape/charts'
+
+
+class SecretIndex(object):
+    """Which clusters and namespaces consume each chart secret in Vault
+
+    Charts read their secrets from
+    /secret/landscape/charts/<branch>/<namespace>/<chart>, where branch is
+    the landscaper branch of the cluster they're deployed to. Only charts
+    which declare secrets read them.
+    """
+
+    def __init__(self):
+        self._consumers = {}
+        self._lock = threading.Lock()
+
+
+    def add(self, cluster_name, git_branch, charts):
+        """Indexes the charts deployed to a cluster
+
+        Args:
+            cluster_name: The cluster's name
+            git_branch: The cluster's landscaper branch
+            charts: LandscaperCharts deployed to the cluster
+
+        Returns:
+            None.
+        """
+        with self._lock:
+            for chart in charts:
+                if chart.secrets:
+                    secrets_path = chart_secrets_path(git_branch, chart.namespace,
+                                                      chart.name)
+                    self._consumers.setdefault(secrets_path, set()).add(
+                        (cluster_name, chart.namespace))
+
+
+    def consumers(self, secret_path):
+        """Clusters and namespaces which read a secret path
+
+        Args:
+            secret_path: A chart's secrets path, a key under it (e.g.,
+                /secret/landscape/charts/master/jenkins/jenkins/password)
+                or a prefix of chart paths (e.g., a whole branch)
+
+        Returns:
+            A sorted list of (cluster name, namespace) tuples
+        """
+        secret_path = '/' + secret_path.strip('/')
+        consumers = set()
+        with self._lock:
+            for chart_path, chart_consumers in self._consumers.items():
+                if chart_path == secret_path or \
+                        chart_path.startswith(secret_path + '/') or \
+                        secret_path.startswith(chart_path + '/'):
+                    consumers.update(chart_consumers)
+        return sorted(consumers)
+
+
+    def paths(self):
+        """Every indexed chart secrets path, sorted"""
+        with self._lock:
+            return sorted(self._consumers)
+
+
+def chart_secrets_path(git_branch, namespace, chart_name):
+    """Vault path of a chart's secrets
+
+    e.g., /secret/landscape/charts/master/jenkins/jenkins
+    """
+    return "{0}/{1}/{2}/{3}".format(CHART_SECRETS_ROOT, git_branch, namespace,
+                                    chart_name)
+
+
+def build_secret_index(charts_by_cluster, max_workers=4):
+    """Indexes the charts of many clusters, concurrently
+
+    Args:
+        charts_by_cluster: dict mapping cluster names to their
+            LandscaperChartsCollection
+        max_workers: Maximum number of clusters read at once
+
+    Returns:
+        A SecretIndex
+    """
+    secret_index = SecretIndex()
+    def index_cluster(cluster_name):
+        charts = charts_by_cluster[cluster_name]
+        secret_index.add(cluster_name, charts.git_branch, charts.charts)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list() re-raises the first failure
+        list(executor.map(index_cluster, sorted(charts_by_cluster)))
+    return secret_index
@@ -1,8 +1,10 @@
-import subprocess
 import sys
 import os
 import logging
 
+from .commandrunner import command_runner
+from .vault import (VaultClient, read_vault_paths, write_vault_paths)
+
 class UniversalSecrets(object):
     def __init__(self, dry_run=False, **kwargs):
         self.__provider = kwargs['provider']
@@ -18,27 +20,252 @@ class UniversalSecrets(object):
         retval = self.__secrets[secret_name]
         return retval
 
-    def overwrite_vault(self, shared_secrets_folder, shared_secrets_item, use_remote_vault):
+    def overwrite_vault(self, shared_secrets_folder, shared_secrets_item, use_remote_vault,
+                        max_workers=4):
+        """Syncs secrets from a LastPass note into Vault
+
+        The note is a script of `vault write <path> key=value ...` commands.
+        Only paths whose data differs from what's in Vault are written.
+        In dry-run mode, the differences are reported but not written.
+
+        Args:
+            shared_secrets_folder: LastPass folder containing the note
+            shared_secrets_item: LastPass note name
+            use_remote_vault: Allow VAULT_ADDR != http://127.0.0.1:8200
+            max_workers: Maximum concurrent Vault requests
+
+        Returns:
+            None.
+
+        Raises:
+            EnvironmentError: if writing to a remote Vault wasn't allowed
+            ChildProcessError: if the LastPass note couldn't be read
+            ValueError: if the note contains unsupported commands
+        """
         vault_addr = os.environ['VAULT_ADDR']
         if not os.environ['VAULT_ADDR'] == "http://127.0.0.1:8200" and not use_remote_vault:
             raise EnvironmentError("Error: Pass --dangerous-overwrite-vault to use non-http://127.0.0.1:8200 vault servers. Current VAULT_ADDR: {0}".format(vault_addr))
         if self.__password:
             raise NotImplementedError('passing LastPass password on CLI not supported yet')
-        not_logged_in = subprocess.call('lpass status', shell=True)
+        not_logged_in = command_runner.run(['lpass', 'status']).failed
         if not_logged_in:
-            subprocess.call("lpass login {0}".format(self.__username), shell=True)
-        pull_secrets_cmd = 'lpass show {0}/{1} --notes'.format(shared_secrets_folder, shared_secrets_item)
-        if not self._DRYRUN:
-            logging.info("Running {0}".format(pull_secrets_cmd))
-            proc = subprocess.Popen(pull_secrets_cmd, stdout=subprocess.PIPE, shell=True)
-            secrets_write_commands_from_lastpass = proc.stdout.read().rstrip().decode()
-
-            # wait for command return code
-            proc.communicate()[0]
-            if proc.returncode != 0:
-                raise ChildProcessError('Could not read LastPass secrets')
-            write_secrets_to_vault_failed = subprocess.call(secrets_write_commands_from_lastpass, shell=True)
-            if write_secrets_to_vault_failed:
-                sys.exit("ERROR: non-zero retval for {}".format(write_secrets_to_vault_failed))
+            command_runner.run(['lpass', 'login', self.__username],
+                               interactive=True)
+        pull_secrets_cmd = ['lpass', 'show',
+                            '{0}/{1}'.format(shared_secrets_folder, shared_secrets_item),
+                            '--notes']
+        logging.info("Running {0}".format(' '.join(pull_secrets_cmd)))
+        pull_secrets = command_runner.run(pull_secrets_cmd, echo=False,
+                                          sensitive=True)
+        if pull_secrets.failed:
+            raise ChildProcessError('Could not read LastPass secrets')
+        desired_secrets = parse_vault_write_commands(pull_secrets.output)
+
+        vault_client = VaultClient()
+        current_secrets = read_vault_paths(vault_client,
+                                           desired_secrets.keys(),
+                                           max_workers)
+        changes = diff_vault_secrets(current_secrets, desired_secrets)
+        print(format_vault_secrets_diff(changes))
+
+        paths_to_write = [c['path'] for c in changes if c['change'] != 'unchanged']
+        if self._DRYRUN:
+            logging.info("DRYRUN: would be writing {0} Vault paths".format(
+                len(paths_to_write)))
+            return
+        failed_paths = write_vault_paths(vault_client,
+                                         [(p, desired_secrets[p]) for p in paths_to_write],
+                                         max_workers)
+        if failed_paths:
+            sys.exit("ERROR: failed to write Vault paths: {}".format(
+                ', '.join(failed_paths)))
+
+
+def parse_vault_write_commands(script):
+    """Parses a script of `vault write` commands into Vault secrets
+
+    Supports single and double quotes (including values spanning lines,
+    like PEM certificates), backslash escapes and line continuations, and
+    comments. A path written more than once keeps the last write, as
+    running the script would.
+
+    Args:
+        script: The script, e.g.
+            vault write /secret/landscape/charts/master/jenkins/jenkins \
+                admin-password='s3cret'
+
+    Returns:
+        A dict mapping Vault paths to the dict of data written there.
+
+    Raises:
+        ValueError: for commands other than `vault write`, values read
+            from files or stdin (key=@file, key=-), or flags given their
+            value as a separate word (-format json, rather than -format=json)
+    """
+    secrets = {}
+    for command in _shell_commands(script):
+        if command[0:2] != ['vault', 'write']:
+            raise ValueError("Unsupported command in secrets: {0}".format(
+                ' '.join(command[0:2])))
+        arguments = _vault_write_arguments(command[2:])
+        if not arguments:
+            raise ValueError('vault write without a path in secrets')
+        vault_path = arguments[0]
+        data = {}
+        for key_value in arguments[1:]:
+            key, separator, value = key_value.partition('=')
+            if not separator:
+                raise ValueError("Bad key=value for {0}: {1}".format(
+                    vault_path, key))
+            if value.startswith('@') or value == '-':
+                raise ValueError("Unsupported file/stdin value for {0} key {1}".format(
+                    vault_path, key))
+            data[key] = value
+        secrets[vault_path] = data
+    return secrets
+
+
+def _vault_write_arguments(words):
+    """The path and key=value arguments of a `vault write`, without its flags
+
+    Like the vault CLI, flags come before the path, and -- ends them.
+    Flags must be boolean or -flag=value: the value of -flag value can't be
+    told apart from the path.
+    """
+    for position, word in enumerate(words):
+        if word == '--':
+            return words[position + 1:]
+        if not word.startswith('-') or word == '-':
+            return words[position:]
+        if '=' not in word and word.lstrip('-') not in VAULT_BOOLEAN_FLAGS:
+            raise ValueError("Unsupported flag {0} in secrets. Use {0}=<value>".format(
+                word))
+    return []
+
+
+# vault CLI flags which take no value
+VAULT_BOOLEAN_FLAGS = ['force', 'f', 'no-color', 'tls-skip-verify',
+                       'non-interactive', 'policy-override']
+
+
+def _shell_commands(script):
+    """Splits a shell script into commands (lists of words)
+
+    Understands quoting, escapes, line continuations, `;` and comments. Does
+    not expand variables.
+    """
+    commands = []
+    words = []
+    word = None
+    quote = None
+    chars = iter(script)
+    for char in chars:
+        if quote == "'":
+            if char == "'":
+                quote = None
+            else:
+                word += char
+        elif quote == '"':
+            if char == '"':
+                quote = None
+            elif char == '\\':
+                escaped = next(chars, '')
+                if escaped in ('"', '\\', '$', '`'):
+                    word += escaped
+                elif escaped != '\n':
+                    word += '\\' + escaped
+            else:
+                word += char
+        elif char in ("'", '"'):
+            quote = char
+            word = word or ''
+        elif char == '\\':
+            escaped = next(chars, '')
+            if escaped != '\n':
+                word = (word or '') + escaped
+        elif char == '#' and word is None:
+            # comment until end of line
+            for char in chars:
+                if char == '\n':
+                    break
+            if words:
+                commands.append(words)
+            words = []
+        elif char in (' ', '\t', '\r', '\n', ';'):
+            if word is not None:
+                words.append(word)
+                word = None
+            if char in ('\n', ';') and words:
+                commands.append(words)
+                words = []
         else:
-                logging.info("DRYRUN: would be Running {0}".format(pull_secrets_cmd))
+            word = (word or '') + char
+    if quote:
+        raise ValueError('Unterminated quote in secrets')
+    if word is not None:
+        words.append(word)
+    if words:
+        commands.append(words)
+    return commands
+
+
+def diff_vault_secrets(current_secrets, desired_secrets):
+    """Compares secrets in Vault against desired secrets
+
+    Args:
+        current_secrets: dict mapping paths to data in Vault (or None)
+        desired_secrets: dict mapping paths to desired data
+
+    Returns:
+        A list of dicts, sorted by path, with keys:
+          path: the Vault path
+          change: added, changed or unchanged
+          added_keys, removed_keys, changed_keys: sorted lists of key names
+    """
+    changes = []
+    for vault_path in sorted(desired_secrets):
+        desired = desired_secrets[vault_path]
+        current = current_secrets.get(vault_path)
+        change = {
+            'path': vault_path,
+            'added_keys': sorted(set(desired) - set(current or {})),
+            'removed_keys': sorted(set(current or {}) - set(desired)),
+            'changed_keys': sorted([k for k in desired
+                                    if current and k in current and current[k] != desired[k]]),
+        }
+        if current is None:
+            change['change'] = 'added'
+        elif current != desired:
+            change['change'] = 'changed'
+        else:
+            change['change'] = 'unchanged'
+        changes.append(change)
+    return changes
+
+
+def format_vault_secrets_diff(changes):
+    """Summarizes a secrets diff, without revealing secret values
+
+    Args:
+        changes: the output of diff_vault_secrets
+
+    Returns:
+        A multi-line str
+    """
+    counts = {'added': 0, 'changed': 0, 'unchanged': 0}
+    lines = []
+    for change in changes:
+        counts[change['change']] += 1
+        if change['change'] == 'added':
+            lines.append("+ {0} (keys: {1})".format(
+                change['path'], ', '.join(change['added_keys'])))
+        elif change['change'] == 'changed':
+            details = []
+            for detail in ['changed', 'added', 'removed']:
+                if change[detail + '_keys']:
+                    details.append("{0}: {1}".format(
+                        detail, ', '.join(change[detail + '_keys'])))
+            lines.append("~ {0} ({1})".format(change['path'], '; '.join(details)))
+    lines.append("Vault secrets: {0} added, {1} changed, {2} unchanged".format(
+        counts['added'], counts['changed'], counts['unchanged']))
+    return '\n'.join(lines)
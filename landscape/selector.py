@@ -0,0 +1,168 @@
+import re
+
+
+class Selector(object):
+    """A label-selector style query over Vault attributes
+
+    e.g., landscaper_branch=master,cloud_id!=minikube,!deprecated
+
+    Terms (all must match):
+      key=value, key==value: the attribute equals value, or for list
+        attributes (e.g., namespace_subscriptions), contains it
+      key!=value: the attribute doesn't equal (or contain) value
+      key: the attribute is set
+      !key: the attribute isn't set
+
+    Attributes:
+        terms: list of (key, operator, value) tuples. operator is one of
+            =, !=, exists and !exists
+    """
+
+    TERM = re.compile(r'^\s*(!)?\s*([\w.-]+)\s*(?:(==|=|!=)\s*(.*?))?\s*$')
+
+    def __init__(self, terms=None):
+        self.terms = list(terms or [])
+
+
+    def __str__(self):
+        return ','.join([_format_term(*term) for term in self.terms])
+
+
+    def __bool__(self):
+        return bool(self.terms)
+
+    __nonzero__ = __bool__
+
+
+    def require(self, key, value):
+        """Adds a key=value term. Returns self"""
+        self.terms.append((key, '=', str(value)))
+        return self
+
+
+    def matches(self, attributes):
+        """True if a dict of attributes matches every term"""
+        for key, operator, value in self.terms:
+            values = attribute_values(attributes.get(key))
+            if operator == '=' and value not in values:
+                return False
+            elif operator == '!=' and value in values:
+                return False
+            elif operator == 'exists' and not values:
+                return False
+            elif operator == '!exists' and values:
+                return False
+        return True
+
+
+    def select(self, attribute_index):
+        """Names of the items in an AttributeIndex which match every term
+
+        Returns:
+            A set of names
+        """
+        selected = set(attribute_index.names)
+        for key, operator, value in self.terms:
+            if operator == '=':
+                selected &= attribute_index.lookup(key, value)
+            elif operator == '!=':
+                selected -= attribute_index.lookup(key, value)
+            elif operator == 'exists':
+                selected &= attribute_index.having(key)
+            elif operator == '!exists':
+                selected -= attribute_index.having(key)
+        return selected
+
+
+class AttributeIndex(object):
+    """An inverted index from attribute values to item names
+
+    Built once, so each selector term is a set lookup rather than a scan.
+
+    Attributes:
+        names: Every indexed name (set)
+    """
+
+    def __init__(self, items):
+        """Indexes items
+
+        Args:
+            items: iterable of (name, attributes dict) tuples
+
+        Returns:
+            None.
+        """
+        self.names = set()
+        self._index = {}
+        for name, attributes in items:
+            self.names.add(name)
+            for key, attribute in attributes.items():
+                values_index = self._index.setdefault(key, {})
+                for value in attribute_values(attribute):
+                    values_index.setdefault(value, set()).add(name)
+
+
+    def lookup(self, key, value):
+        """Names whose attribute key equals (or contains) value (set)"""
+        return self._index.get(key, {}).get(value, set())
+
+
+    def having(self, key):
+        """Names with attribute key set (set)"""
+        names = set()
+        for value_names in self._index.get(key, {}).values():
+            names |= value_names
+        return names
+
+
+def parse_selector(selector_text):
+    """Parses a selector expression
+
+    Args:
+        selector_text: e.g., landscaper_branch=master,cloud_id!=minikube,
+            or None
+
+    Returns:
+        A Selector (empty if selector_text is None or empty)
+
+    Raises:
+        ValueError: if a term can't be parsed
+    """
+    selector = Selector()
+    for term_text in (selector_text or '').split(','):
+        if not term_text.strip():
+            continue
+        term = Selector.TERM.match(term_text)
+        if not term or (term.group(1) and term.group(3)):
+            raise ValueError("Invalid selector term: {0}".format(term_text))
+        negated, key, operator, value = term.groups()
+        if negated:
+            selector.terms.append((key, '!exists', None))
+        elif operator is None:
+            selector.terms.append((key, 'exists', None))
+        else:
+            selector.terms.append((key, '!=' if operator == '!=' else '=', value))
+    return selector
+
+
+def attribute_values(attribute):
+    """Values an attribute matches, as a list of str
+
+    Lists (e.g., namespace_subscriptions) match each element. Unset (None
+    or empty) attributes match nothing. Nested dicts aren't indexed.
+    """
+    if attribute is None or attribute == '' or isinstance(attribute, dict):
+        return []
+    if isinstance(attribute, (list, tuple, set)):
+        return [str(v) for v in attribute if not isinstance(v, (dict, list))]
+    if isinstance(attribute, bool):
+        return [str(attribute).lower()]
+    return [str(attribute)]
+
+
+def _format_term(key, operator, value):
+    if operator == 'exists':
+        return key
+    elif operator == '!exists':
+        return '!' + key
+    return "{0}{1}{2}".format(key, operator, value)
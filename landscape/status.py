@@ -0,0 +1,135 @@
+import concurrent.futures
+import json
+import logging
+import threading
+
+from .cloud_terraform import TerraformCloud
+
+
+class FleetStatus(object):
+    """Drift of every selected cluster from its landscaper branch and cloud
+
+    Clusters are checked concurrently. For each cluster, the releases in its
+    Landscaper YAML are compared with the releases deployed to it, and its
+    cloud is planned with terraform.
+
+    Terraform plans run one at a time, because terraform clouds share the
+    .terraform/terraform.tfstate link in the terraform repo. Each cloud is
+    only planned once, however many clusters it hosts.
+
+    Attributes:
+        clusters: Clusters to report on
+        new_charts: Callable creating the charts collection for a cluster name
+        max_workers: Maximum number of clusters checked at once
+    """
+
+    def __init__(self, clusters, new_charts, max_workers=4):
+        self.clusters = clusters
+        self.new_charts = new_charts
+        self.max_workers = max_workers
+        self._cloud_plans = {}
+        self._terraform_lock = threading.Lock()
+
+
+    def report(self):
+        """Checks every cluster
+
+        Returns:
+            A list of dicts, one per cluster, sorted by cluster name. Keys:
+              cluster, cloud, branch: identify the cluster
+              releases: number of releases in the cluster's Landscaper YAML
+              changed_releases: names of releases which differ from deployed
+              infrastructure: in-sync, changes, n/a (not terraform) or error
+              errors: list of problems encountered checking the cluster
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            rows = list(executor.map(self.cluster_status, self.clusters))
+        return sorted(rows, key=lambda r: r['cluster'])
+
+
+    def cluster_status(self, cluster):
+        """Checks a single cluster. Problems are reported, not raised.
+
+        Returns:
+            A dict (see report())
+        """
+        row = {
+            'cluster': cluster.name,
+            'cloud': getattr(cluster, 'cloud_id', None),
+            'branch': getattr(cluster, 'landscaper_branch', None),
+            'releases': None,
+            'changed_releases': None,
+            'infrastructure': 'n/a',
+            'errors': [],
+        }
+        try:
+            charts = self.new_charts(cluster.name)
+            row['releases'] = len(charts.charts)
+            row['changed_releases'] = sorted(charts.changed_releases(
+                max_workers=self.max_workers))
+        except (Exception, SystemExit) as e:
+            logging.error("Failed to compare releases of {0}: {1}".format(
+                cluster.name, e))
+            row['errors'].append("releases: {0}".format(e))
+        try:
+            row['infrastructure'] = self.cloud_status(cluster.cloud)
+        except (Exception, SystemExit) as e:
+            logging.error("Failed to plan cloud of {0}: {1}".format(
+                cluster.name, e))
+            row['infrastructure'] = 'error'
+            row['errors'].append("infrastructure: {0}".format(e))
+        return row
+
+
+    def cloud_status(self, cloud):
+        """Plans a cloud, once per report. A failed plan isn't retried for
+        the cloud's other clusters
+
+        Returns:
+            in-sync, changes or n/a
+
+        Raises:
+            The plan's error, for every cluster of a cloud which failed to plan
+        """
+        if not isinstance(cloud, TerraformCloud):
+            return 'n/a'
+        with self._terraform_lock:
+            if cloud.name not in self._cloud_plans:
+                try:
+                    has_changes = cloud.plan_has_changes()
+                    self._cloud_plans[cloud.name] = 'changes' if has_changes else 'in-sync'
+                except (Exception, SystemExit) as e:
+                    self._cloud_plans[cloud.name] = e
+            cloud_plan = self._cloud_plans[cloud.name]
+        if isinstance(cloud_plan, BaseException):
+            raise cloud_plan
+        return cloud_plan
+
+
+def format_status_matrix(rows):
+    """Formats a fleet status report as a table
+
+    Args:
+        rows: FleetStatus.report() output
+
+    Returns:
+        A new-line separated str, one line per cluster
+    """
+    table = [['CLUSTER', 'CLOUD', 'BRANCH', 'RELEASES', 'CHANGED', 'INFRASTRUCTURE']]
+    for row in rows:
+        changed = '?'
+        if row['changed_releases'] is not None:
+            changed = str(len(row['changed_releases']))
+        releases = '?' if row['releases'] is None else str(row['releases'])
+        table.append([row['cluster'], str(row['cloud']), str(row['branch']),
+                      releases, changed, row['infrastructure']])
+    widths = [max([len(line[i]) for line in table]) for i in range(len(table[0]))]
+    output_lines = []
+    for line in table:
+        output_lines.append('  '.join([cell.ljust(width) for cell, width in zip(line, widths)]).rstrip())
+    return '\n'.join(output_lines)
+
+
+def format_status_json(rows):
+    """Formats a fleet status report as JSON"""
+    return json.dumps(rows, indent=2, sort_keys=True)
@@ -0,0 +1,44 @@
+import pytest
+
+from .backend_sqlite import SQLiteBackend
+from .vaultexport import walk_vault
+
+def new_backend(tmpdir):
+	backend = SQLiteBackend(str(tmpdir.join('landscape.db')))
+	backend.write('/secret/landscape/clouds/minikube', {'provisioner': 'minikube'})
+	backend.write('/secret/landscape/clusters/minikube', {'cloud_id': 'minikube'})
+	backend.write('/secret/landscape/clusters/prod', {'cloud_id': 'gke'})
+	backend.write('/secret/landscape/clusters-old/prod', {'cloud_id': 'gke'})
+	return backend
+
+def test_list_and_read(tmpdir):
+	backend = new_backend(tmpdir)
+	assert backend.list('/secret/landscape')['data']['keys'] == ['clouds/', 'clusters-old/', 'clusters/']
+	assert backend.list('/secret/landscape/clusters/')['data']['keys'] == ['minikube', 'prod']
+	assert backend.list('/secret/landscape/clusters/prod') is None
+	assert backend.read('secret/landscape/clusters/prod')['data'] == {'cloud_id': 'gke'}
+	assert backend.read('/secret/landscape/clusters') is None
+
+def test_write_increments_version(tmpdir):
+	backend = new_backend(tmpdir)
+	assert backend.current_version('/secret/landscape/clusters/prod') == 1
+	backend.write('/secret/landscape/clusters/prod', {'cloud_id': 'eks'})
+	assert backend.current_version('/secret/landscape/clusters/prod') == 2
+	assert backend.get_vault_data('/secret/landscape/clusters/prod') == {'cloud_id': 'eks'}
+	assert backend.current_version('/secret/landscape/clusters/missing') is None
+
+def test_dump_vault_from_prefix(tmpdir):
+	backend = new_backend(tmpdir)
+	assert backend.dump_vault_from_prefix('/secret/landscape/clusters') == {
+		'clusters': {'minikube': {'cloud_id': 'minikube'}, 'prod': {'cloud_id': 'gke'}}
+	}
+	assert backend.dump_vault_from_prefix('/secret/landscape/clouds/minikube',
+	                                      strip_root_key=True) == {'provisioner': 'minikube'}
+	with pytest.raises(ValueError):
+		backend.dump_vault_from_prefix('/secret/landscape/charts')
+
+def test_walk(tmpdir):
+	backend = new_backend(tmpdir)
+	secrets = dict(walk_vault(backend, '/secret/landscape/clusters', max_workers=2))
+	assert sorted(secrets) == ['/secret/landscape/clusters/minikube',
+	                           '/secret/landscape/clusters/prod']
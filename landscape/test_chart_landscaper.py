@@ -0,0 +1,18 @@
+from .chart_landscaper import landscaper_yaml_errors
+
+def test_landscaper_yaml_errors_valid():
+	chart_info = {
+        'name': 'jenkins',
+        'namespace': 'jenkins',
+        'release': {'chart': 'stable/jenkins:0.1.0', 'version': '0.1.0'},
+        'secrets': ['admin-password'],
+    }
+	assert landscaper_yaml_errors(chart_info) == []
+
+def test_landscaper_yaml_errors_invalid():
+	chart_info = {'name': 'jenkins', 'release': {'chart': 'stable/jenkins'}, 'secrets': 'x'}
+	assert landscaper_yaml_errors(chart_info) == [
+        'missing or non-string namespace',
+        'missing release.version',
+        'secrets is not a list of names',
+    ]
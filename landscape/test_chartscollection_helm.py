@@ -0,0 +1,11 @@
+from .chart_landscaper import LandscaperChart
+from .chartscollection_helm import helm_upgrade_argv
+
+def test_helm_upgrade_argv():
+	chart = LandscaperChart(name='jenkins', namespace='jenkins', filepath='jenkins.yaml',
+		release={'chart': 'stable/jenkins:0.1.0', 'version': '0.1.2'})
+	assert helm_upgrade_argv(chart, 'minikube', '/tmp/values.yaml') == [
+        'helm', 'upgrade', '--install', 'jenkins-jenkins', 'stable/jenkins',
+        '--namespace=jenkins', '--kube-context=minikube',
+        '--values=/tmp/values.yaml', '--version=0.1.0',
+    ]
@@ -0,0 +1,56 @@
+import subprocess
+
+import hvac
+
+from . import chartscollection_landscaper
+from .chartscollection_landscaper import LandscaperChartsCollection
+from .metrics import RunMetrics
+
+class FakeCloud(object):
+	provisioner = 'minikube'
+
+class FakeCluster(object):
+	namespace_subscriptions = []
+	landscaper_branch = 'master'
+	cloud = FakeCloud()
+
+class FakeClusterChartsCollection(LandscaperChartsCollection):
+	cluster = FakeCluster()
+
+def test_restrict_to_changes_since(tmpdir, monkeypatch, caplog):
+	metrics = RunMetrics()
+	monkeypatch.setattr(chartscollection_landscaper, 'run_metrics', metrics)
+	def git(*args):
+		subprocess.check_call(['git', '-c', 'user.name=landscape', '-c', 'user.email=landscape@localhost'] + list(args), cwd=str(tmpdir))
+	def chart_yaml(name, namespace):
+		return 'name: {0}\nnamespace: {1}\nrelease:\n  chart: stable/{0}:0.1.0\n'.format(name, namespace)
+	git('init', '-q')
+	tmpdir.join('all', 'jenkins.yaml').write(chart_yaml('jenkins', 'jenkins'), ensure=True)
+	tmpdir.join('all', 'nginx.yaml').write(chart_yaml('nginx', 'web'))
+	tmpdir.join('minikube', 'kube-dns.yaml').write(chart_yaml('kube-dns', 'kube-system'), ensure=True)
+	tmpdir.join('all', 'approver.yaml').write(chart_yaml('approver', 'auto-approve-csrs'))
+	git('add', '.')
+	git('commit', '-q', '-m', 'charts')
+	charts = FakeClusterChartsCollection(str(tmpdir), context_name='minikube', namespace_selection=[])
+	# moving a chart to another namespace changes both
+	tmpdir.join('all', 'nginx.yaml').write(chart_yaml('nginx', 'frontend'))
+	assert charts.restrict_to_changes_since('HEAD') == ['frontend']
+	assert charts.namespaces_changed_since('HEAD') == set(['web', 'frontend'])
+	# the whole priority group applies first
+	tmpdir.join('minikube', 'kube-dns.yaml').write(chart_yaml('kube-dns2', 'kube-system'))
+	assert charts.restrict_to_changes_since('HEAD') == ['auto-approve-csrs', 'kube-system', 'frontend']
+	assert 'No charts left in web since HEAD' in caplog.text
+	# skipped namespaces are counted from all of them, however often it's called
+	assert 'landscape_incremental_namespaces{cluster="minikube",mode="changed_since",outcome="skipped"} 4' in metrics.exposition('charts converge', True)
+
+class ForbiddenSecretsChartsCollection(FakeClusterChartsCollection):
+	def vault_secrets_for_chart(self, chart_namespace, chart_name, git_branch=None):
+		raise hvac.exceptions.Forbidden('permission denied')
+
+def test_preflight_reports_vault_errors(tmpdir):
+	tmpdir.join('all', 'jenkins.yaml').write('name: jenkins\nnamespace: jenkins\n'
+		'release:\n  chart: stable/jenkins:0.1.0\n  version: 0.1.0\nsecrets:\n  - admin-password\n', ensure=True)
+	charts = ForbiddenSecretsChartsCollection(str(tmpdir), context_name='minikube',
+		namespace_selection=[])
+	[problem] = charts.preflight()
+	assert 'permission denied' in problem
@@ -0,0 +1,16 @@
+from .checkpoint import (ConvergeCheckpoint, files_fingerprint)
+
+def test_checkpoint_changed_fingerprint_is_not_done(tmpdir):
+	checkpoint_file = str(tmpdir.join('checkpoint.json'))
+	ConvergeCheckpoint(checkpoint_file).record('namespace:minikube/jenkins', 'done', 'abc')
+	checkpoint = ConvergeCheckpoint(checkpoint_file, resume=True)
+	assert checkpoint.is_done('namespace:minikube/jenkins', 'abc')
+	assert not checkpoint.is_done('namespace:minikube/jenkins', 'def')
+	assert not ConvergeCheckpoint(checkpoint_file).is_done('namespace:minikube/jenkins', 'abc')
+
+def test_files_fingerprint_changes_with_contents(tmpdir):
+	chart_file = tmpdir.join('jenkins.yaml')
+	chart_file.write('name: jenkins')
+	fingerprint = files_fingerprint([str(chart_file)])
+	chart_file.write('name: jenkins2')
+	assert files_fingerprint([str(chart_file)]) != fingerprint
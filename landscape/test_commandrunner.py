@@ -0,0 +1,63 @@
+import subprocess
+import sys
+import threading
+import time
+
+from .commandrunner import (CommandRunner, CommandResult, _read_only,
+                            _kubernetes_throttled)
+
+def test_run_captures_output_and_env():
+	runner = CommandRunner()
+	result = runner.run([sys.executable, '-c',
+		'import os; print(os.environ["LANDSCAPE_TEST"])'],
+		env={'LANDSCAPE_TEST': 'per-command'}, echo=False)
+	assert result.output == 'per-command'
+	assert not result.failed
+	assert runner.summary().startswith('Commands: 1 run, 0 failed')
+
+def test_run_timeout_kills_command():
+	runner = CommandRunner()
+	result = runner.run([sys.executable, '-c', 'import time; time.sleep(30)'],
+		timeout=0.5, echo=False)
+	assert result.timed_out
+	assert result.failed
+	assert result.duration < 30
+
+def test_missing_executable_fails():
+	result = CommandRunner().run(['landscape-no-such-command'], echo=False)
+	assert result.returncode == 127
+
+def test_only_read_only_commands_are_retried():
+	assert _read_only(['kubectl', '--context=minikube', 'get', 'pods'])
+	assert _read_only(['helm', 'list', '--output=json'])
+	assert not _read_only(['kubectl', 'create', 'namespace', 'ns-502'])
+	assert not _read_only(['landscaper', 'apply', '--namespace=jenkins'])
+	throttled = CommandResult(['kubectl', 'get'], 1, '',
+		'Error from server (TooManyRequests): the server has received too many requests', 0, 1)
+	assert _kubernetes_throttled(throttled)
+	not_found = CommandResult(['kubectl', 'get'], 1, '',
+		'Error from server (NotFound): secrets "tls-502" not found', 0, 1)
+	assert not _kubernetes_throttled(not_found)
+
+def test_cancel_all_kills_started_commands():
+	runner = CommandRunner()
+	proc = runner.start(['cat'])
+	proc.stdin.write(b'ping\n')
+	proc.stdin.flush()
+	assert proc.stdout.readline() == b'ping\n'
+	runner.cancel_all()
+	assert runner.finish(proc).cancelled
+	assert runner.start(['cat']) is None
+
+def test_cancel_all_during_start_kills_command(monkeypatch):
+	runner = CommandRunner()
+	popen = subprocess.Popen
+	def slow_popen(*args, **kwargs):
+		threading.Thread(target=runner.cancel_all).start()
+		time.sleep(0.2)
+		return popen(*args, **kwargs)
+	monkeypatch.setattr(subprocess, 'Popen', slow_popen)
+	result = runner.run([sys.executable, '-c', 'import time; time.sleep(30)'],
+		echo=False)
+	assert result.cancelled
+	assert result.duration < 30
@@ -0,0 +1,75 @@
+import _thread
+import sys
+import threading
+import time
+
+from .convergegraph import (ConvergeGraph, parse_concurrency)
+from .checkpoint import ConvergeCheckpoint
+from .commandrunner import command_runner
+
+def test_converge_graph_runs_requirements_first():
+	converged = []
+	graph = ConvergeGraph(max_workers=2)
+	graph.add('namespace:minikube/jenkins', 'namespace',
+		lambda: converged.append('jenkins'), requires=['cluster:minikube'])
+	graph.add('cluster:minikube', 'cluster', lambda: converged.append('minikube'))
+	assert graph.run() == []
+	assert converged == ['minikube', 'jenkins']
+
+def test_converge_graph_skips_after_failure():
+	graph = ConvergeGraph()
+	graph.add('cluster:minikube', 'cluster', lambda: sys.exit('failed'))
+	graph.add('namespace:minikube/jenkins', 'namespace', lambda: None,
+		requires=['cluster:minikube'])
+	assert [str(n) for n in graph.run()] == ['cluster:minikube']
+	assert graph['namespace:minikube/jenkins'].state == 'skipped'
+
+def test_converge_graph_resumes_from_checkpoint(tmpdir):
+	checkpoint_file = str(tmpdir.join('checkpoint.json'))
+	converged = []
+	def flaky():
+		if 'jenkins' not in converged:
+			converged.append('jenkins')
+			sys.exit('failed')
+		converged.append('jenkins-retry')
+	graph = ConvergeGraph(checkpoint=ConvergeCheckpoint(checkpoint_file))
+	graph.add('cluster:minikube', 'cluster', lambda: converged.append('minikube'))
+	graph.add('namespace:minikube/jenkins', 'namespace', flaky,
+		requires=['cluster:minikube'])
+	assert len(graph.run()) == 1
+	resumed = ConvergeGraph(checkpoint=ConvergeCheckpoint(checkpoint_file, resume=True))
+	resumed.add('cluster:minikube', 'cluster', lambda: converged.append('minikube'))
+	resumed.add('namespace:minikube/jenkins', 'namespace', flaky,
+		requires=['cluster:minikube'])
+	assert resumed.run() == []
+	assert converged == ['minikube', 'jenkins', 'jenkins-retry']
+
+def test_converge_graph_retries():
+	attempts = []
+	graph = ConvergeGraph(retries=1, retry_backoff=0)
+	graph.add('cluster:minikube', 'cluster',
+		lambda: attempts.append(1) or len(attempts) > 1 or sys.exit('failed'))
+	assert graph.run() == []
+	assert len(attempts) == 2
+
+def test_parse_concurrency():
+	assert parse_concurrency('cloud=2,namespace=8') == {'cloud': 2, 'namespace': 8}
+
+def test_converge_graph_stops_retrying_on_ctrl_c():
+	attempts = []
+	def fail():
+		attempts.append(True)
+		sys.exit('failed')
+	graph = ConvergeGraph(retries=3, retry_backoff=30)
+	graph.add('cluster:minikube', 'cluster', fail)
+	threading.Timer(0.2, _thread.interrupt_main).start()
+	started = time.time()
+	try:
+		graph.run()
+		assert False, 'KeyboardInterrupt not raised'
+	except KeyboardInterrupt:
+		pass
+	finally:
+		command_runner._cancelled = False
+	assert time.time() - started < 10
+	assert len(attempts) == 1
@@ -0,0 +1,32 @@
+import subprocess
+
+from .gittree import (GitObjectStore, parse_tree)
+from .commandrunner import command_runner
+
+def test_parse_tree():
+	tree_data = b'40000 all\x00' + b'\x01' * 20 + b'100644 one.yaml\x00' + b'\xab' * 20
+	assert parse_tree(tree_data) == [
+		('40000', 'all', '01' * 20),
+		('100644', 'one.yaml', 'ab' * 20),
+	]
+
+def test_git_object_store_reads_branch_without_checkout(tmpdir):
+	def git(*args):
+		subprocess.check_call(['git', '-c', 'user.name=landscape', '-c', 'user.email=landscape@localhost'] + list(args), cwd=str(tmpdir))
+	git('init', '-q')
+	tmpdir.join('all', 'jenkins.yaml').write('name: jenkins', ensure=True)
+	git('add', '.')
+	git('commit', '-q', '-m', 'jenkins')
+	git('checkout', '-q', '-b', 'feature')
+	tmpdir.join('all', 'jenkins.yaml').write('name: jenkins2')
+	git('commit', '-q', '-a', '-m', 'jenkins2')
+	git('checkout', '-q', '-')
+	store = GitObjectStore(str(tmpdir))
+	all_tree = store.subtree(store.resolve_tree(['feature']), 'all')
+	[(yaml_path, blob)] = store.yaml_blobs(all_tree)
+	assert yaml_path == 'jenkins.yaml'
+	assert store.read_blob(blob) == b'name: jenkins2'
+	store.close()
+	cat_file = command_runner.results[-1]
+	assert cat_file.argv == ['git', 'cat-file', '--batch']
+	assert not cat_file.failed
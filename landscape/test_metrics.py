@@ -0,0 +1,46 @@
+import http.server
+import threading
+
+from .convergegraph import ConvergeGraph
+from .metrics import RunMetrics
+
+def test_exposition(tmpdir):
+	metrics = RunMetrics()
+	graph = ConvergeGraph(max_workers=2)
+	graph.add('cluster:minikube', 'cluster', lambda: None)
+	graph.add('namespace:minikube/jenkins', 'namespace', lambda: None,
+	          requires=['cluster:minikube'])
+	graph.run()
+	metrics.add_graph(graph)
+	metrics.increment('landscape_incremental_namespaces', 3,
+	                  mode='changed_since', outcome='skipped', cluster='minikube')
+	textfile = tmpdir.join('landscape.prom')
+	metrics.write_textfile(str(textfile), 'charts converge', True)
+	lines = textfile.read().splitlines()
+	assert 'landscape_run_success{command="charts converge"} 1' in lines
+	assert 'landscape_converge_steps{cluster="minikube",kind="namespace",namespace="jenkins",state="done"} 1' in lines
+	assert 'landscape_converge_step_duration_seconds_count{cluster="minikube",kind="cluster"} 1' in lines
+	assert 'landscape_converge_step_duration_seconds_bucket{cluster="minikube",kind="cluster",le="+Inf"} 1' in lines
+	assert 'landscape_incremental_namespaces{cluster="minikube",mode="changed_since",outcome="skipped"} 3' in lines
+	assert '# TYPE landscape_vault_request_duration_seconds histogram' in lines
+	# counts are of one run, so they're gauges
+	assert '# TYPE landscape_converge_steps gauge' in lines
+	assert tmpdir.listdir() == [textfile]
+
+def test_push():
+	pushed = []
+	class Pushgateway(http.server.BaseHTTPRequestHandler):
+		def do_PUT(self):
+			pushed.append((self.path, self.rfile.read(int(self.headers['Content-Length']))))
+			self.send_response(202)
+			self.end_headers()
+		def log_message(self, *args):
+			pass
+	server = http.server.HTTPServer(('127.0.0.1', 0), Pushgateway)
+	threading.Thread(target=server.handle_request).start()
+	url = 'http://127.0.0.1:{0}/'.format(server.server_address[1])
+	assert RunMetrics().push(url, 'cluster list', False)
+	server.server_close()
+	assert pushed[0][0].startswith('/metrics/job/landscape/instance/')
+	assert b'landscape_run_success{command="cluster list"} 0' in pushed[0][1]
+	assert not RunMetrics().push('http://127.0.0.1:1', 'cluster list', False, timeout=1)
@@ -0,0 +1,33 @@
+import pstats
+import threading
+import time
+
+from .profiler import (RunProfiler, PER_THREAD_PROFILES)
+
+def busy_worker():
+	deadline = time.time() + 0.2
+	while time.time() < deadline:
+		sum(range(1000))
+
+def test_profiles_worker_threads(tmpdir):
+	profiler = RunProfiler(str(tmpdir.join('profiles', 'run')), sample_interval=0.005,
+	                       memory_top=5)
+	profiler.start()
+	worker = threading.Thread(target=busy_worker)
+	worker.start()
+	worker.join()
+	written = profiler.stop()
+	assert [p.split('/')[-1] for p in written] == ['run.pstats', 'run.collapsed', 'run.memory.txt']
+
+	profiled_functions = [f[2] for f in pstats.Stats(written[0]).stats]
+	if PER_THREAD_PROFILES:
+		assert 'busy_worker' in profiled_functions
+	worker_stacks = [line for line in tmpdir.join('profiles', 'run.collapsed').readlines()
+	                 if 'landscape.test_profiler:busy_worker' in line]
+	assert worker_stacks
+	assert worker_stacks[0].startswith('Thread-')
+	assert tmpdir.join('profiles', 'run.memory.txt').read().startswith('Traced memory:')
+
+def test_profile_without_stats(tmpdir):
+	profiler = RunProfiler(str(tmpdir.join('run')))
+	assert profiler._write_pstats([]) is None
@@ -0,0 +1,11 @@
+from .releaseinventory import (chart_version_name, values_hash)
+
+def test_chart_version_name():
+	assert chart_version_name({'chart': 'stable/jenkins:0.1.0', 'version': '0.1.0'}) == 'jenkins-0.1.0'
+	assert chart_version_name({'chart': 'stable/jenkins:0.1.0', 'version': '2.3.0'}) == 'jenkins-0.1.0'
+	assert chart_version_name({'chart': 'stable/jenkins:0.1.0'}) == 'jenkins-0.1.0'
+
+def test_values_hash_ignores_key_order():
+	assert values_hash({'a': 1, 'b': {'c': 2}}) == values_hash({'b': {'c': 2}, 'a': 1})
+	assert values_hash(None) == values_hash({})
+	assert values_hash({'a': 1}) != values_hash({'a': '1'})
@@ -0,0 +1,18 @@
+from .chart_landscaper import LandscaperChart
+from .secretindex import (SecretIndex, chart_secrets_path)
+
+def test_secret_index_consumers():
+	jenkins = LandscaperChart(name='jenkins', namespace='jenkins', filepath='jenkins.yaml',
+		release={'chart': 'stable/jenkins:0.1.0'}, secrets=['admin-password'])
+	nginx = LandscaperChart(name='nginx', namespace='web', filepath='nginx.yaml',
+		release={'chart': 'stable/nginx:0.1.0'})
+	secret_index = SecretIndex()
+	secret_index.add('minikube', 'master', [jenkins, nginx])
+	secret_index.add('gke-prod', 'prod', [jenkins])
+	assert secret_index.paths() == [chart_secrets_path('master', 'jenkins', 'jenkins'),
+		chart_secrets_path('prod', 'jenkins', 'jenkins')]
+	assert secret_index.consumers('/secret/landscape/charts/master/jenkins/jenkins') == [('minikube', 'jenkins')]
+	assert secret_index.consumers('secret/landscape/charts/prod/jenkins/jenkins/admin-password') == [('gke-prod', 'jenkins')]
+	assert secret_index.consumers('/secret/landscape/charts') == [('gke-prod', 'jenkins'), ('minikube', 'jenkins')]
+	assert secret_index.consumers('/secret/landscape/charts/master/web/nginx') == []
+	assert secret_index.consumers('/secret/landscape/charts/master/jenk') == []
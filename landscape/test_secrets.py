@@ -0,0 +1,27 @@
+from .secrets import (parse_vault_write_commands, diff_vault_secrets)
+
+def test_parse_vault_write_commands():
+	script = """# jenkins
+vault write /secret/a admin-password='p4ss word' \\
+    user=admin
+vault write -format=json /secret/b cert="-----BEGIN
+-----END"; vault write /secret/a admin-password=new
+"""
+	assert parse_vault_write_commands(script) == {
+        '/secret/a': {'admin-password': 'new'},
+        '/secret/b': {'cert': '-----BEGIN\n-----END'},
+    }
+
+def test_parse_vault_write_commands_rejects_separate_flag_values():
+	assert parse_vault_write_commands('vault write -force -- /secret/c k=v') == {'/secret/c': {'k': 'v'}}
+	try:
+		parse_vault_write_commands('vault write -format json /secret/x k=v')
+		assert False, 'ValueError not raised'
+	except ValueError as e:
+		assert '-format=<value>' in str(e)
+
+def test_diff_vault_secrets():
+	changes = diff_vault_secrets({'/a': {'k': '1'}, '/b': None, '/c': {'k': '1'}},
+                                 {'/a': {'k': '2'}, '/b': {'k': '1'}, '/c': {'k': '1'}})
+	assert [c['change'] for c in changes] == ['changed', 'added', 'unchanged']
+	assert changes[0]['changed_keys'] == ['k']
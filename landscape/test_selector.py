@@ -0,0 +1,29 @@
+import pytest
+
+from .selector import (AttributeIndex, parse_selector)
+
+clusters = {
+	'minikube': {'cloud_id': 'minikube', 'landscaper_branch': 'master', 'namespace_subscriptions': ['jenkins']},
+	'prod': {'cloud_id': 'gke', 'landscaper_branch': 'prod', 'namespace_subscriptions': [], 'deprecated': 'true'},
+	'staging': {'cloud_id': 'gke', 'landscaper_branch': 'master', 'namespace_subscriptions': ['jenkins', 'web']},
+}
+
+@pytest.mark.parametrize('selector_text,selected', [
+	('', ['minikube', 'prod', 'staging']),
+	('cloud_id=gke', ['prod', 'staging']),
+	('cloud_id==gke,landscaper_branch!=prod', ['staging']),
+	('namespace_subscriptions=jenkins', ['minikube', 'staging']),
+	('namespace_subscriptions', ['minikube', 'staging']),
+	('!deprecated', ['minikube', 'staging']),
+	('cloud_id=aws', []),
+])
+def test_selector_select_and_matches(selector_text, selected):
+	selector = parse_selector(selector_text)
+	index = AttributeIndex(clusters.items())
+	assert sorted(selector.select(index)) == selected
+	assert sorted([n for n, a in clusters.items() if selector.matches(a)]) == selected
+
+def test_parse_selector_rejects_invalid_terms():
+	with pytest.raises(ValueError):
+		parse_selector('cloud_id=gke,=master')
+	assert str(parse_selector(' cloud_id = gke , !deprecated')) == 'cloud_id=gke,!deprecated'
@@ -0,0 +1,34 @@
+from .cloud_terraform import TerraformCloud
+from .status import (FleetStatus, format_status_matrix)
+
+def test_format_status_matrix():
+	rows = [
+		{'cluster': 'minikube', 'cloud': 'minikube', 'branch': 'master', 'releases': 12,
+		 'changed_releases': ['jenkins-jenkins'], 'infrastructure': 'n/a', 'errors': []},
+		{'cluster': 'staging', 'cloud': 'staging-123', 'branch': 'master', 'releases': None,
+		 'changed_releases': None, 'infrastructure': 'error', 'errors': ['releases: failed']},
+	]
+	assert format_status_matrix(rows).splitlines() == [
+		'CLUSTER   CLOUD        BRANCH  RELEASES  CHANGED  INFRASTRUCTURE',
+		'minikube  minikube     master  12        1        n/a',
+		'staging   staging-123  master  ?         ?        error',
+	]
+
+class BrokenTerraformCloud(TerraformCloud):
+	plans = 0
+	def plan_has_changes(self):
+		BrokenTerraformCloud.plans += 1
+		raise ChildProcessError('terraform plan failed for staging-123')
+
+class FakeCluster(object):
+	def __init__(self, name, cloud):
+		self.name = name
+		self.cloud = cloud
+
+def test_failed_cloud_plan_is_not_repeated():
+	cloud = BrokenTerraformCloud('staging-123', path_to_terraform_repo='terraform')
+	clusters = [FakeCluster('staging-a', cloud), FakeCluster('staging-b', cloud)]
+	rows = FleetStatus(clusters, new_charts=lambda name: None).report()
+	assert BrokenTerraformCloud.plans == 1
+	assert [r['infrastructure'] for r in rows] == ['error', 'error']
+	assert rows[1]['errors'][-1] == 'infrastructure: terraform plan failed for staging-123'
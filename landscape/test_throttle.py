@@ -0,0 +1,68 @@
+import threading
+import time
+
+from .throttle import AdaptiveThrottle
+
+class Overloaded(Exception):
+	pass
+
+def test_throttle_retries_and_halves_concurrency():
+	throttle = AdaptiveThrottle('test', max_concurrency=8, retries=2, backoff=0.01)
+	attempts = []
+	def request():
+		attempts.append(True)
+		if len(attempts) < 3:
+			raise Overloaded()
+		return 'ok'
+	assert throttle.call(request, is_throttled_error=lambda e: isinstance(e, Overloaded)) == 'ok'
+	assert len(attempts) == 3
+	assert throttle.stats()['retries'] == 2
+	assert throttle.limit < 8
+
+def test_throttle_does_not_retry_other_errors():
+	throttle = AdaptiveThrottle('test', retries=2, backoff=0.01)
+	attempts = []
+	def request():
+		attempts.append(True)
+		raise ValueError()
+	try:
+		throttle.call(request, is_throttled_error=lambda e: isinstance(e, Overloaded))
+	except ValueError:
+		pass
+	assert len(attempts) == 1
+
+def test_throttle_limits_concurrency():
+	throttle = AdaptiveThrottle('test', max_concurrency=2)
+	running = []
+	peak = []
+	lock = threading.Lock()
+	def request():
+		with lock:
+			running.append(True)
+			peak.append(len(running))
+		time.sleep(0.01)
+		with lock:
+			running.pop()
+	threads = [threading.Thread(target=throttle.call, args=(request,)) for _ in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert max(peak) == 2
+
+def test_throttle_frees_slot_early():
+	throttle = AdaptiveThrottle('test', max_concurrency=1)
+	started = threading.Event()
+	finished = threading.Event()
+	def long_request(free_slot):
+		free_slot()
+		started.set()
+		finished.wait(5)
+	worker = threading.Thread(target=throttle.call, args=(long_request,),
+	                          kwargs={'hold_slot': False})
+	worker.start()
+	started.wait(5)
+	# the slot was freed once the long request started
+	assert throttle.call(lambda: 'ok') == 'ok'
+	finished.set()
+	worker.join()
@@ -0,0 +1,18 @@
+from .timeline import (Timeline, timeline, traced)
+
+def test_span_recorded_on_exception():
+	t = Timeline()
+	try:
+		with t.span('failing', 'test'):
+			raise SystemExit(1)
+	except SystemExit:
+		pass
+	assert [e['name'] for e in t.events] == ['failing']
+	assert t.events[0]['ph'] == 'X'
+
+def test_traced_span_args():
+	@traced('test', lambda namespace: {'namespace': namespace})
+	def apply_namespace(namespace):
+		return namespace
+	assert apply_namespace('jenkins') == 'jenkins'
+	assert timeline.events[-1]['args'] == {'namespace': 'jenkins'}
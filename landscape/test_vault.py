@@ -1,4 +1,5 @@
-from .vault import kubeconfig_context_entry
+from .vault import (kubeconfig_context_entry, gen_k8sconf, merge_k8sconf,
+                    k8sconf_context_to_vault_data)
 
 def test_kubeconfig_context_entry_minikube():
 	mock_context_entry = {
@@ -9,3 +10,18 @@ def test_kubeconfig_context_entry_minikube():
         }
     }
 	assert kubeconfig_context_entry('minikube') == mock_context_entry
+
+def test_merge_k8sconf_keeps_other_contexts():
+	existing = gen_k8sconf('gke_project', 'https://gke', 'ca', 'cert', 'key')
+	merged = merge_k8sconf(existing, gen_k8sconf('minikube', 'https://minikube', 'ca', 'cert', 'key'))
+	assert [c['name'] for c in merged['contexts']] == ['gke_project', 'minikube']
+	assert merged['current-context'] == 'gke_project'
+
+def test_k8sconf_context_to_vault_data_round_trip():
+	k8sconf = gen_k8sconf('minikube', 'https://minikube', 'ca', 'cert', 'key')
+	assert k8sconf_context_to_vault_data(k8sconf, 'minikube', '.') == {
+        'api_server': 'https://minikube',
+        'ca_cert': 'ca',
+        'client_cert': 'cert',
+        'client_key': 'key',
+    }
@@ -0,0 +1,45 @@
+from .backend import (configure_backend, secrets_backend)
+from .vaultexport import (walk_vault, bounded_map, import_vault)
+
+class FakeVaultClient(object):
+	tree = {
+		'/secret/landscape': ['clouds/', 'clusters/'],
+		'/secret/landscape/clouds': ['minikube'],
+		'/secret/landscape/clusters': ['minikube', 'prod'],
+	}
+	def list(self, vault_path):
+		if vault_path in self.tree:
+			return {'data': {'keys': self.tree[vault_path]}}
+		return None
+	def read(self, vault_path):
+		return {'data': {'name': vault_path.split('/')[-1]}}
+
+def test_walk_vault():
+	secrets = dict(walk_vault(FakeVaultClient(), '/secret/landscape', max_workers=2))
+	assert secrets == {
+		'/secret/landscape/clouds/minikube': {'name': 'minikube'},
+		'/secret/landscape/clusters/minikube': {'name': 'minikube'},
+		'/secret/landscape/clusters/prod': {'name': 'prod'},
+	}
+
+def test_bounded_map_reports_failures():
+	def invert(n):
+		return 1.0 / n
+	results = dict(bounded_map(invert, iter([1, 0, 2]), max_workers=2))
+	assert results[1] == (1.0, None)
+	assert results[2] == (0.5, None)
+	assert isinstance(results[0][1], ZeroDivisionError)
+
+def test_import_vault_reports_bad_lines(tmpdir):
+	import_path = str(tmpdir.join('secrets.jsonl'))
+	tmpdir.join('secrets.jsonl').write(
+		'{"path": "/secret/landscape/clouds/minikube", "data": {"provisioner": "minikube"}}\n'
+		'{"path": "/secret/landscape/clouds/trunc\n'
+		'\n'
+		'{"path": "/secret/landscape/clouds/nodata"}\n')
+	configure_backend('sqlite:///' + str(tmpdir.join('replica.db')))
+	try:
+		assert import_vault(import_path) == (1, 0, [import_path + ':2', import_path + ':4'])
+		assert secrets_backend().get_vault_data('/secret/landscape/clouds/minikube') == {'provisioner': 'minikube'}
+	finally:
+		configure_backend('vault')
@@ -0,0 +1,13 @@
+from .vaulttrace import (VaultRequestTracer, percentile)
+
+def test_percentile_nearest_rank():
+	assert percentile([1, 2, 3, 4], 50) == 2
+	assert percentile([1, 2, 3, 4], 95) == 4
+	assert percentile([], 50) == 0
+
+def test_duplicate_reads():
+	tracer = VaultRequestTracer()
+	for path in ['/secret/a', '/secret/a', '/secret/b']:
+		tracer.trace('read', path, lambda: {'data': {}})
+	tracer.trace('list', '/secret/a', lambda: None)
+	assert tracer.duplicate_reads() == {'/secret/a': 2}
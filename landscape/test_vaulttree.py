@@ -0,0 +1,34 @@
+from .vaulttree import VaultTree
+
+class FakeVaultClient(object):
+	def __init__(self):
+		self.requests = []
+	def list(self, vault_path):
+		self.requests.append(('list', vault_path))
+		return {'data': {'keys': ['minikube', 'prod/']}}
+	def get_vault_data(self, vault_path):
+		self.requests.append(('read', vault_path))
+		return {'cloud_id': 'minikube'}
+	def dump_vault_from_prefix(self, vault_path, strip_root_key=False):
+		self.requests.append(('dump', vault_path))
+		return {'gke': {'cloud_id': 'gke'}}
+
+def test_vault_tree_reads_lazily():
+	tree = VaultTree()
+	tree._vault_client = FakeVaultClient()
+	nodes = tree.children('/secret/landscape/clusters')
+	assert [n.name for n in nodes] == ['minikube', 'prod']
+	assert tree._vault_client.requests == [('list', '/secret/landscape/clusters')]
+	assert not nodes[0].loaded
+	tree.prefetch(nodes)
+	assert nodes[0]['cloud_id'] == 'minikube'
+	assert nodes[1].data == {'gke': {'cloud_id': 'gke'}}
+	# listed again, and read again by path, without requests
+	nodes[1].data['gke']['cloud_id'] = 'modified'
+	assert tree.read('/secret/landscape/clusters/prod')['gke']['cloud_id'] == 'gke'
+	tree.children('/secret/landscape/clusters/')
+	assert sorted(tree._vault_client.requests) == [
+		('dump', '/secret/landscape/clusters/prod'),
+		('list', '/secret/landscape/clusters'),
+		('read', '/secret/landscape/clusters/minikube'),
+	]
@@ -0,0 +1,202 @@
+import logging
+import random
+import threading
+import time
+
+
+class AdaptiveThrottle(object):
+    """Client-side rate and concurrency limit for a backend (Vault, Kubernetes)
+
+    Requests wait for a token (refilled at `rate` per second, up to `burst`)
+    and for a concurrency slot. The concurrency limit adapts AIMD-style: it
+    grows by one after each limit's worth of successful requests, and is
+    halved (at most once per backoff period) when a request is throttled
+    (e.g., HTTP 429 or 5xx) or slower than target_latency. Throttled
+    requests are retried after a jittered exponential backoff.
+
+    A single instance per backend is shared by every thread, so parallel
+    converge steps slow down together instead of overwhelming the backend.
+
+    Attributes:
+        name: Backend name, for logging
+        rate: Requests started per second, or None for no limit
+        burst: Requests which may start at once after an idle period
+        max_concurrency: Upper bound of the concurrency limit
+        min_concurrency: Lower bound of the concurrency limit
+        target_latency: Seconds above which a request counts as congested,
+            or None to only react to throttled requests
+        retries: Times a throttled request is retried
+        backoff: Seconds before the first retry. Doubles for each retry,
+            and the actual wait is a random fraction of it
+    """
+
+    def __init__(self, name, rate=None, burst=None, max_concurrency=32,
+                 min_concurrency=1, target_latency=None, retries=4,
+                 backoff=0.5):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max_concurrency
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.target_latency = target_latency
+        self.retries = retries
+        self.backoff = backoff
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled = time.time()
+        self._successes = 0
+        self._last_decrease = 0
+        self._condition = threading.Condition()
+        self._stats = {'requests': 0, 'throttled': 0, 'retries': 0, 'waited': 0.0}
+
+
+    @property
+    def limit(self):
+        """Current concurrency limit (int)"""
+        with self._condition:
+            return int(self._limit)
+
+
+    def call(self, request_fn, is_throttled_error=None,
+             is_throttled_result=None, description=None, hold_slot=True):
+        """Runs a request within the limits, retrying it if throttled
+
+        Args:
+            request_fn: Callable performing the request
+            is_throttled_error: Callable returning True if an exception
+                raised by request_fn means the backend is overloaded
+            is_throttled_result: Callable returning True if a value returned
+                by request_fn means the backend is overloaded
+            description: What the request is, for logging
+            hold_slot: Hold the concurrency slot until request_fn returns.
+                If False, request_fn is called with a function which frees
+                the slot early (e.g., once a long-running command has
+                started)
+
+        Returns:
+            The return value of request_fn. If it's still throttled after
+            all retries, the last return value.
+
+        Raises:
+            Whatever request_fn raises, once retries are exhausted (or
+            immediately, for errors which aren't throttling).
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+            started = time.time()
+            free_slot = self._slot_releaser()
+            try:
+                if hold_slot:
+                    result = request_fn()
+                else:
+                    result = request_fn(free_slot)
+            except Exception as e:
+                free_slot()
+                throttled = bool(is_throttled_error and is_throttled_error(e))
+                self._adapt(time.time() - started, throttled)
+                if not throttled or attempt >= self.retries:
+                    raise
+                reason = e
+            else:
+                free_slot()
+                throttled = bool(is_throttled_result and is_throttled_result(result))
+                self._adapt(time.time() - started, throttled)
+                if not throttled or attempt >= self.retries:
+                    return result
+                reason = 'throttled'
+            delay = random.uniform(0, self.backoff * 2 ** attempt)
+            attempt += 1
+            logging.warn("{0} request {1} failed ({2}). Retry {3} of {4} in {5:.1f}s".format(
+                self.name, description or '', reason, attempt, self.retries, delay))
+            with self._condition:
+                self._stats['retries'] += 1
+            time.sleep(delay)
+
+
+    def stats(self):
+        """Counts of requests, throttled requests and retries, seconds spent
+        waiting for the throttle, and the current concurrency limit (dict)
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats['limit'] = int(self._limit)
+        return stats
+
+
+    def _acquire(self):
+        """Waits for a token and a concurrency slot"""
+        started = time.time()
+        with self._condition:
+            while True:
+                self._refill()
+                has_slot = self._in_flight < int(self._limit)
+                if has_slot and self._tokens >= 1:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    self._stats['requests'] += 1
+                    self._stats['waited'] += time.time() - started
+                    return
+                wait = None
+                if has_slot:
+                    wait = (1 - self._tokens) / self.rate
+                self._condition.wait(wait)
+
+
+    def _refill(self):
+        now = time.time()
+        if self.rate is None:
+            self._tokens = float(self.burst)
+        else:
+            self._tokens = min(float(self.burst),
+                               self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+
+    def _slot_releaser(self):
+        """A function freeing the slot taken by _acquire. Only the first call
+        has an effect
+        """
+        freed = []
+        def free_slot():
+            with self._condition:
+                if not freed:
+                    freed.append(True)
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+        return free_slot
+
+
+    def _adapt(self, latency, throttled):
+        """Adapts the concurrency limit to a request's outcome"""
+        with self._condition:
+            congested = throttled or (self.target_latency is not None and
+                                      latency > self.target_latency)
+            now = time.time()
+            if throttled:
+                self._stats['throttled'] += 1
+            if congested:
+                self._successes = 0
+                # requests in flight when the backend pushed back report it
+                # too. Only react once
+                if now - self._last_decrease > self.backoff:
+                    self._limit = max(float(self.min_concurrency), self._limit / 2)
+                    self._last_decrease = now
+                    logging.debug("{0} congested. Concurrency limit {1}".format(
+                        self.name, int(self._limit)))
+            else:
+                self._successes += 1
+                if self._successes >= int(self._limit):
+                    self._successes = 0
+                    self._limit = min(float(self.max_concurrency), self._limit + 1)
+            self._condition.notify_all()
+
+
+# Vault requests are short. Slow ones mean Vault is struggling
+vault_throttle = AdaptiveThrottle('Vault', rate=200, max_concurrency=32,
+                                  target_latency=2.0)
+# kubectl, helm and landscaper commands can legitimately take minutes, so
+# only throttling errors count, and commands only hold a slot while starting
+kubernetes_throttle = AdaptiveThrottle('Kubernetes', rate=10,
+                                       max_concurrency=16, backoff=2.0)
@@ -0,0 +1,133 @@
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+
+class Timeline(object):
+    """Collects timed spans for a landscape run
+
+    Spans are exported in the Chrome trace-event format, which can be loaded
+    into chrome://tracing or https://ui.perfetto.dev
+
+    Attributes:
+        started: Epoch time the timeline was created. Span timestamps are
+            relative to it.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._events = []
+        self._thread_names = {}
+        self._lock = threading.Lock()
+
+
+    @contextlib.contextmanager
+    def span(self, name, category='landscape', **span_args):
+        """Times the enclosed block as a single complete ("X") event
+
+        Args:
+            name: Name of the span, shown on the timeline
+            category: Category of the span (e.g., cloud, cluster, subprocess)
+            span_args: Extra arguments, shown when the span is selected
+
+        Returns:
+            A context manager. The span is recorded even if the block raises
+            an exception (including SystemExit).
+        """
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.add_event(name, category, started, time.time(), span_args)
+
+
+    def add_event(self, name, category, started, finished, span_args=None):
+        """Records a span which was timed elsewhere
+
+        Args:
+            name: Name of the span
+            category: Category of the span
+            started: Epoch time the span started
+            finished: Epoch time the span finished
+            span_args: dict of arguments to attach to the span
+
+        Returns:
+            None.
+        """
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': int((started - self.started) * 1000000),
+            'dur': int((finished - started) * 1000000),
+            'pid': os.getpid(),
+            'tid': thread.ident,
+            'args': span_args or {},
+        }
+        with self._lock:
+            self._events.append(event)
+            self._thread_names[thread.ident] = thread.name
+
+
+    @property
+    def events(self):
+        """A copy of the spans recorded so far (list of dicts)"""
+        with self._lock:
+            return list(self._events)
+
+
+    def write_chrome_trace(self, trace_path):
+        """Writes spans to a trace-event JSON file
+
+        Args:
+            trace_path: Path to the file to write
+
+        Returns:
+            None.
+        """
+        with self._lock:
+            trace_events = list(self._events)
+            thread_names = dict(self._thread_names)
+        for tid, thread_name in thread_names.items():
+            trace_events.append({
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': os.getpid(),
+                'tid': tid,
+                'args': {'name': thread_name},
+            })
+        with open(trace_path, 'w') as trace_file:
+            json.dump({'traceEvents': trace_events,
+                       'displayTimeUnit': 'ms'}, trace_file)
+        logging.info("Wrote trace to {0}".format(trace_path))
+
+
+def traced(category, span_args=None):
+    """Decorator recording each call of a function as a span on the timeline
+
+    Args:
+        category: Category of the span
+        span_args: Optional callable, taking the same arguments as the
+            decorated function and returning a dict of span arguments
+
+    Returns:
+        A decorator
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            extra_args = {}
+            if span_args:
+                extra_args = span_args(*args, **kwargs)
+            with timeline.span(fn.__qualname__, category, **extra_args):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+timeline = Timeline()
@@ -1,3 +1,4 @@
+import concurrent.futures
 import hvac
 import os
 import sys
@@ -5,6 +6,9 @@ import yaml
 import base64
 import logging
 
+from .vaulttrace import vault_request_tracer
+from .throttle import vault_throttle
+
 def kubeconfig_context_entry(context_name):
     """
     Generates a kubeconfig context entry
@@ -72,7 +76,7 @@ def kubeconfig_user_entry(context_name, client_cert, client_key):
     return user_entry
 
 
-def write_kubeconfig(cfg_path):
+def write_kubeconfig(cfg_path, max_workers=4):
     """
     Writes a kubernetes client configuration file with values from Vault
 
@@ -83,55 +87,64 @@ def write_kubeconfig(cfg_path):
         client_cert='client_cert_value' \
         client_key='client_key_value' \
         api_server='https://kubernetes.default.svc.cluster.local'
+
+    Every context is read concurrently and merged into a single kubeconfig.
+    Entries already in cfg_path which aren't in Vault (e.g., gke_ contexts)
+    are kept.
     
     Args:
         cfg_path (str): Path to the kubeconfig file being written
+        max_workers (int): Maximum concurrent Vault reads
 
     Returns:
         None
     """
-    vault_root = '/secret/k8s_contexts'
-    vault_addr = os.environ.get('VAULT_ADDR')
-    vault_cacert = os.environ.get('VAULT_CACERT')
-    vault_token = os.environ.get('VAULT_TOKEN')
-    vault_client = hvac.Client(url=vault_addr,
-                                token=vault_token,
-                                verify=vault_cacert)
+    vault_client = VaultClient()
+    try:
+        contexts = vault_client.list_vault_prefix(KUBECONFIG_VAULT_ROOT)['keys']
+    except (ValueError, hvac.exceptions.InvalidRequest):
+        sys.exit("Failed to list {0} in Vault. Check VAULT_ vars".format(
+            KUBECONFIG_VAULT_ROOT))
+    print("Reading {0} kubeconfig contexts from {1}".format(
+        len(contexts), KUBECONFIG_VAULT_ROOT))
+    context_paths = [KUBECONFIG_VAULT_ROOT + '/' + c for c in contexts]
+    try:
+        vault_clustercfgs = read_vault_paths(vault_client, context_paths,
+                                             max_workers)
+    except hvac.exceptions.InvalidRequest:
+        sys.exit("Failed to read from Vault. Check VAULT_ vars")
 
     k8sconfig_contents = {}
-    for context in vault_client.list(vault_root)['data']['keys']:
-        clustercfg_root = vault_root + '/' + context
-        print("Reading kubeconfig settings from {0}".format(clustercfg_root))
-        try:
-            vault_clustercfg = vault_client.read(clustercfg_root)
-        except hvac.exceptions.InvalidRequest:
-            sys.exit("Failed to read from Vault. Check VAULT_ vars")
-
-        if not vault_clustercfg:
+    expanded_cfg_path = os.path.expanduser(cfg_path)
+    if os.path.exists(expanded_cfg_path):
+        with open(expanded_cfg_path) as kubeconfig:
+            k8sconfig_contents = yaml.safe_load(kubeconfig) or {}
+    for context, context_path in zip(contexts, context_paths):
+        vault_data = vault_clustercfgs[context_path]
+        if not vault_data:
             sys.exit("No entry {0} found in Vault path {1}".format(context,
-                                                                    vault_root))
-
-        vault_data = vault_clustercfg['data']
-
-        server_addr = vault_data['api_server']
-        server_cacert = vault_data['ca_cert']
-        client_cert = vault_data['client_cert']
-        client_key = vault_data['client_key']
-
+                                                                    KUBECONFIG_VAULT_ROOT))
         context_contents = gen_k8sconf(k8s_context=context,
-                                api_server=server_addr,
-                                ca_cert=server_cacert,
-                                client_auth_cert=client_cert,
-                                client_auth_key=client_key)
-        k8sconfig_contents.update(context_contents)
-    expanded_cfg_path = os.path.expanduser(cfg_path)
-    cfg_dir = '/'.join(expanded_cfg_path.split('/')[0:-1])
-    if not os.path.exists(cfg_dir):
+                                api_server=vault_data['api_server'],
+                                ca_cert=vault_data['ca_cert'],
+                                client_auth_cert=vault_data['client_cert'],
+                                client_auth_key=vault_data['client_key'])
+        k8sconfig_contents = merge_k8sconf(k8sconfig_contents, context_contents)
+
+    cfg_dir = os.path.dirname(expanded_cfg_path)
+    if cfg_dir and not os.path.exists(cfg_dir):
         print("Creating directory {0}".format(cfg_dir))
         os.makedirs(cfg_dir)
-    with open(expanded_cfg_path, 'w') as kubeconfig:
+    # write a private temporary file, then rename it, so that kubectl never
+    # reads a partially-written kubeconfig
+    tmp_cfg_path = expanded_cfg_path + '.tmp'
+    tmp_cfg_fd = os.open(tmp_cfg_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o600)
+    with os.fdopen(tmp_cfg_fd, 'w') as kubeconfig:
         kubeconfig.write(yaml.dump(k8sconfig_contents,default_flow_style=False))
-        print("Wrote kubeconfig to {0}".format(expanded_cfg_path))
+    os.rename(tmp_cfg_path, expanded_cfg_path)
+    print("Wrote {0} contexts to kubeconfig {1}".format(
+        len(contexts), expanded_cfg_path))
 
 
 def gen_k8sconf(k8s_context=None, api_server=None, ca_cert=None,
@@ -172,97 +185,167 @@ def gen_k8sconf(k8s_context=None, api_server=None, ca_cert=None,
     return contents
 
 
-def read_kubeconfig(cfg_path):
+def merge_k8sconf(base_contents, new_contents):
+    """
+    Merge two kubeconfig objects
+
+    contexts, clusters and users entries from new_contents replace entries
+    of the same name in base_contents. Other entries are kept.
+
+    Args:
+        base_contents (dict): kubeconfig data to merge into
+        new_contents (dict): kubeconfig data to merge
+
+    Returns: merged kubeconfig data (dict). current-context is kept from
+        base_contents, if it had one.
+    """
+    merged = dict(base_contents)
+    for key in ['apiVersion', 'kind', 'preferences']:
+        merged.setdefault(key, new_contents[key])
+    for section in ['clusters', 'contexts', 'users']:
+        entries = list(merged.get(section) or [])
+        for new_entry in new_contents[section]:
+            entries = [e for e in entries if e['name'] != new_entry['name']]
+            entries.append(new_entry)
+        merged[section] = sorted(entries, key=lambda e: e['name'])
+    if not merged.get('current-context'):
+        merged['current-context'] = new_contents['current-context']
+    return merged
+
+
+def read_kubeconfig(cfg_path, max_workers=4):
     """
     Reads the current kubeconfig file and places it into Vault
+
+    Contexts are written to /secret/k8s_contexts/<context> concurrently.
+    Contexts already in Vault with the same values aren't written.
+
+    Args:
+        cfg_path (str): Path to the kubeconfig file being read
+        max_workers (int): Maximum concurrent Vault requests
+
+    Returns:
+        None
     """
-    k8sconfig_contents = {}
-    with open(cfg_path, 'r') as stream:
+    expanded_cfg_path = os.path.expanduser(cfg_path)
+    with open(expanded_cfg_path, 'r') as stream:
         try:
-            k8sconfig_contents = yaml.load(stream)
+            k8sconfig_contents = yaml.safe_load(stream)
         except yaml.YAMLError as exc:
-            print(exc)
-
-    contexts = k8sconfig_contents['contexts']
-    clusters = k8sconfig_contents['clusters']
-    users = k8sconfig_contents['users']
+            sys.exit("ERROR: could not parse {0}: {1}".format(cfg_path, exc))
 
-    for context in contexts:
-        # kubeconfig context entries
+    desired_contexts = {}
+    for context in k8sconfig_contents.get('contexts') or []:
         context_name = context['name']
         # gke clusters are set with GOOGLE_CREDENTIALS, not here
         if context_name.startswith('gke_'):
             continue
-        context_cluster = context['context']['cluster']
-        context_user = context['context']['user']
-        # kubeconfig cluster entries
-        cluster_cacert = ''
-        client_auth_cert = ''
-        client_auth_key = ''
-        cluster_cfg = [d for d in clusters if d['name'] == context_cluster][0]
-        cluster_server = cluster_cfg['cluster']['server']
-        if 'certificate-authority-data' in cluster_cfg['cluster']:
-            ca_cert_data = cluster_cfg['cluster']['certificate-authority-data']
-            cluster_cacert = base64.b64encode(bytes(ca_cert_data, 'utf-8')).decode('ascii')
-        elif 'certificate-authority' in cluster_cfg['cluster']:
-            cacert_file = cluster_cfg['cluster']['certificate-authority']
-            if cacert_file.startswith('/'):
-                cacert_path = cacert_file
-            else:
-                cacert_path = os.path.expanduser('~/.kube/' + cacert_file)
-            with open(cacert_path, 'r') as stream:
-                try:
-                    cluster_cacert = yaml.load(stream)
-                except yaml.YAMLError as exc:
-                    print(exc)
-        else:
-            raise "no user certificate-authority(-data) entry in kubeconfig"
-        # kubeconfig user entries
-        user_cfg = [d for d in users if d['name'] == context_user][0]
-        print("user_cfg={0}".format(user_cfg))
-        if 'client-certificate-data' in user_cfg['user']:
-            client_cert_data = user_cfg['user']['client-certificate-data']
-            client_key_data = user_cfg['user']['client-key-data']
-            client_auth_cert = base64.b64encode(bytes(client_cert_data, 'utf-8')).decode('ascii')
-            client_auth_key = base64.b64encode(bytes(client_key_data, 'utf-8')).decode('ascii')
-        elif 'client-certificate' in user_cfg['user']:
-            client_cert_file = user_cfg['user']['client-certificate']
-            client_key_file = user_cfg['user']['client-key']
-            # client cert
-            if client_cert_file.startswith('/'):
-                client_cert_path = client_cert_file
-            else:
-                client_cert_path = os.path.expanduser('~/.kube/' + client_cert_file)
-            with open(client_cert_path, 'r') as stream:
-                try:
-                    client_auth_cert = yaml.load(stream)
-                except yaml.YAMLError as exc:
-                    print(exc)
-            # client key
-            if client_key_file.startswith('/'):
-                client_key_path = client_key_file
-            else:
-                client_key_path = os.path.expanduser('~/.kube/' + client_key_file)
-            with open(client_key_path, 'r') as stream:
-                try:
-                    client_auth_key = yaml.load(stream)
-                except yaml.YAMLError as exc:
-                    print(exc)
+        context_path = KUBECONFIG_VAULT_ROOT + '/' + context_name
+        desired_contexts[context_path] = k8sconf_context_to_vault_data(
+                                                k8sconfig_contents,
+                                                context_name,
+                                                os.path.dirname(expanded_cfg_path))
+
+    vault_client = VaultClient()
+    current_contexts = read_vault_paths(vault_client, desired_contexts.keys(),
+                                        max_workers)
+    changed_paths = sorted([p for p in desired_contexts
+                            if current_contexts[p] != desired_contexts[p]])
+    for context_path in changed_paths:
+        print("Writing {0}".format(context_path))
+    failed_paths = write_vault_paths(vault_client,
+                                     [(p, desired_contexts[p]) for p in changed_paths],
+                                     max_workers)
+    print("Kubeconfig contexts: {0} written, {1} unchanged".format(
+        len(changed_paths) - len(failed_paths),
+        len(desired_contexts) - len(changed_paths)))
+    if failed_paths:
+        sys.exit("ERROR: failed to write Vault paths: {}".format(
+            ', '.join(failed_paths)))
+
+
+def k8sconf_context_to_vault_data(k8sconfig_contents, context_name, cfg_dir):
+    """
+    Extract the Vault representation of a kubeconfig context
 
-    raise "read_kubeconfig not implemented"
+    The inverse of gen_k8sconf. Certificates and keys are stored PEM-encoded,
+    whether the kubeconfig embeds them (-data) or refers to files.
+
+    Args:
+        k8sconfig_contents (dict): kubeconfig data
+        context_name (str): context to extract
+        cfg_dir (str): directory relative file references are resolved from
+
+    Returns: Vault data (dict) with api_server, ca_cert, client_cert and
+        client_key keys
+
+    Raises:
+        ValueError: if the context is incomplete
+    """
+    context = _k8sconf_entry(k8sconfig_contents, 'contexts', context_name)
+    cluster_cfg = _k8sconf_entry(k8sconfig_contents, 'clusters',
+                                 context['context']['cluster'])['cluster']
+    user_cfg = _k8sconf_entry(k8sconfig_contents, 'users',
+                              context['context']['user'])['user']
+    return {
+        'api_server': cluster_cfg['server'],
+        'ca_cert': _k8sconf_pem(cluster_cfg, 'certificate-authority', cfg_dir),
+        'client_cert': _k8sconf_pem(user_cfg, 'client-certificate', cfg_dir),
+        'client_key': _k8sconf_pem(user_cfg, 'client-key', cfg_dir),
+    }
+
+
+def _k8sconf_entry(k8sconfig_contents, section, name):
+    for entry in k8sconfig_contents.get(section) or []:
+        if entry['name'] == name:
+            return entry
+    raise ValueError("no {0} entry named {1} in kubeconfig".format(section,
+                                                                   name))
+
+
+def _k8sconf_pem(entry, attribute, cfg_dir):
+    if attribute + '-data' in entry:
+        return base64.b64decode(entry[attribute + '-data']).decode('utf-8')
+    elif attribute in entry:
+        pem_path = os.path.join(cfg_dir, os.path.expanduser(entry[attribute]))
+        with open(pem_path, 'r') as pem_file:
+            return pem_file.read()
+    raise ValueError("no {0}(-data) entry in kubeconfig".format(attribute))
+
+
+KUBECONFIG_VAULT_ROOT = '/secret/k8s_contexts'
+
+# hvac errors for HTTP 429 and 5xx responses. Older hvac versions lack some
+VAULT_THROTTLED_ERRORS = tuple([getattr(hvac.exceptions, error_name)
+                                for error_name in ['RateLimitExceeded',
+                                                   'InternalServerError',
+                                                   'BadGateway',
+                                                   'VaultDown']
+                                if hasattr(hvac.exceptions, error_name)])
+
+
+def _vault_throttled(error):
+    return isinstance(error, VAULT_THROTTLED_ERRORS)
 
 
 class VaultClient(object):
     """Connects to and authenticates with Vault
 
+    Paths are always given KV version 1 style (e.g., /secret/landscape/clouds).
+    With VAULT_KV_VERSION=2 they're mapped to the KV version 2 data and
+    metadata endpoints of the mount (e.g., /secret/data/landscape/clouds),
+    and responses are returned KV version 1 style.
+
     Attributes:
         __vault_client (hvac.Client): Client connected to Vault
+        kv_version (int): KV secrets engine version, 1 or 2
 
     """
     def __init__(self):
         vault_addr = os.environ.get('VAULT_ADDR')
         vault_cacert = os.environ.get('VAULT_CACERT')
         vault_token = os.environ.get('VAULT_TOKEN')
+        self.kv_version = int(os.environ.get('VAULT_KV_VERSION', '1'))
         self.logger = logging.getLogger(__name__)
         logging.debug(" - VAULT_ADDR is {0}".format(vault_addr))
         logging.debug(" - VAULT_CACERT is {0}".format(vault_cacert))
@@ -275,12 +358,138 @@ class VaultClient(object):
             raise ValueError(missing_fmt_string.format('VAULT_TOKEN'))
         if vault_addr.startswith('https://') and not vault_cacert:
             raise ValueError(missing_fmt_string.format('VAULT_CACERT'))
+        if self.kv_version not in (1, 2):
+            raise ValueError("VAULT_KV_VERSION must be 1 or 2")
 
         self.__vault_client = hvac.Client(url=vault_addr,
                                     token=vault_token,
                                     verify=vault_cacert)
 
 
+    def list(self, vault_path):
+        """
+        List subkeys at a Vault path. Requests are recorded for --vault-trace
+
+        Args:
+            vault_path (str): path to list
+
+        Returns:
+            Vault response (dict), or None if there are no subkeys
+        """
+        return self._request('list', vault_path,
+                    lambda: self.__vault_client.list(
+                        self._kv_path(vault_path, 'metadata')))
+
+
+    def read(self, vault_path):
+        """
+        Read a Vault path. Requests are recorded for --vault-trace
+
+        Args:
+            vault_path (str): path to read
+
+        Returns:
+            Vault response (dict), or None if the path doesn't exist
+        """
+        return self._request('read', vault_path,
+                    lambda: self._kv1_response(self.__vault_client.read(
+                        self._kv_path(vault_path, 'data'))))
+
+
+    def write(self, vault_path, data):
+        """
+        Write data to a Vault path, replacing what was there.
+        Requests are recorded for --vault-trace
+
+        Args:
+            vault_path (str): path to write
+            data (dict): keys and values to write
+
+        Returns:
+            Vault response (dict), or None
+        """
+        if self.kv_version == 2:
+            return self._request('write', vault_path,
+                        lambda: self.__vault_client.write(
+                            self._kv_path(vault_path, 'data'), data=data))
+        return self._request('write', vault_path,
+                    lambda: self.__vault_client.write(vault_path, **data))
+
+
+    def read_metadata(self, vault_path):
+        """
+        Read the KV version 2 metadata of a Vault path, without its data.
+        Requests are recorded for --vault-trace
+
+        Args:
+            vault_path (str): path whose metadata to read
+
+        Returns:
+            Metadata (dict) with current_version and versions keys, or None
+            if the path doesn't exist or the mount is KV version 1
+        """
+        if self.kv_version != 2:
+            return None
+        response = self._request('metadata', vault_path,
+                    lambda: self.__vault_client.read(
+                        self._kv_path(vault_path, 'metadata')))
+        if response and 'data' in response:
+            return response['data']
+        return None
+
+
+    def current_version(self, vault_path):
+        """
+        KV version 2 version of a Vault path
+
+        Returns:
+            The current version (int), or None if the path doesn't exist or
+            the mount is KV version 1
+        """
+        metadata = self.read_metadata(vault_path)
+        if metadata:
+            return metadata.get('current_version')
+        return None
+
+
+    def _request(self, operation, vault_path, request_fn):
+        """Makes a request through vault_throttle, recording it for --vault-trace
+
+        Requests rejected because Vault is overloaded (HTTP 429 and 5xx)
+        are retried.
+        """
+        return vault_request_tracer.trace(operation, vault_path,
+                    lambda: vault_throttle.call(request_fn,
+                                is_throttled_error=_vault_throttled,
+                                description="{0} {1}".format(operation,
+                                                             vault_path)))
+
+
+    def _kv_path(self, vault_path, endpoint):
+        """Maps a path to a KV version 2 endpoint (data or metadata)
+
+        e.g., /secret/landscape/clouds becomes /secret/data/landscape/clouds
+        """
+        if self.kv_version != 2:
+            return vault_path
+        mount, _, secret_path = vault_path.lstrip('/').partition('/')
+        return '/{0}/{1}/{2}'.format(mount, endpoint, secret_path)
+
+
+    def _kv1_response(self, response):
+        """Unwraps a KV version 2 read response
+
+        The secret's data becomes data, and its version metadata becomes
+        metadata
+        """
+        if self.kv_version != 2 or not response or 'data' not in response:
+            return response
+        return {
+            'data': response['data'].get('data') or {},
+            'metadata': response['data'].get('metadata') or {},
+        }
+
+
     def dump_vault_from_prefix(self, path_prefix, strip_root_key=False):
         """
         Dump Vault data at prefix into dict.
@@ -295,9 +504,16 @@ class VaultClient(object):
         Returns:
             Data from Vault at prefix (dict)
         """
+        return vault_request_tracer.trace('dump', path_prefix,
+                    lambda: self._dump_vault_from_prefix(path_prefix,
+                                                         strip_root_key))
+
+
+    def _dump_vault_from_prefix(self, path_prefix, strip_root_key=False):
+        """Recursive implementation of dump_vault_from_prefix"""
         all_values_at_prefix = {}
         logging.debug(" - reading vault subkeys at {0}".format(path_prefix))
-        subkeys_at_prefix = self.__vault_client.list(path_prefix)
+        subkeys_at_prefix = self.list(path_prefix)
         logging.debug(" - subkeys are {0}".format(subkeys_at_prefix))
 
         # use last vault key (delimited by '/') as dict index
@@ -309,7 +525,7 @@ class VaultClient(object):
         if subkeys_at_prefix:
             for subkey in subkeys_at_prefix['data']['keys']:
                 prefixed_key = path_prefix + '/' + subkey
-                sub_vault_key = self.dump_vault_from_prefix(prefixed_key)
+                sub_vault_key = self._dump_vault_from_prefix(prefixed_key)
                 all_values_at_prefix[prefix_keyname].update(sub_vault_key)
         else:
             vault_item_data = self.get_vault_data(path_prefix)
@@ -339,7 +555,7 @@ class VaultClient(object):
         vault_error_read_str = 'Vault read at path: {0} error: {1}'
         vault_error_data_str = 'Vault data missing at path: {0}'
         try:
-            vault_item_contents = self.__vault_client.read(vault_path)
+            vault_item_contents = self.read(vault_path)
         except ValueError as e:
             raise ValueError(vault_error_read_str.format(vault_path, e))
 
@@ -363,7 +579,7 @@ class VaultClient(object):
         vault_error_read_str = 'Vault read at path: {0} error: {1}'
         vault_error_data_str = 'Vault data missing at path: {0}'
         try:
-            vault_item_list = self.__vault_client.list(vault_path)
+            vault_item_list = self.list(vault_path)
         except ValueError as e:
             raise ValueError(vault_error_read_str.format(vault_path, e))
 
@@ -371,3 +587,52 @@ class VaultClient(object):
             return vault_item_list['data']
         else:
             raise ValueError(vault_error_data_str.format(vault_path))
+
+
+def read_vault_paths(vault_client, vault_paths, max_workers=4):
+    """Reads Vault paths concurrently
+
+    Args:
+        vault_client: A VaultClient, shared by all requests
+        vault_paths: Paths to read
+        max_workers: Maximum concurrent requests
+
+    Returns:
+        A dict mapping each path to its data (dict), or None if it's missing.
+    """
+    def read_data(vault_path):
+        response = vault_client.read(vault_path)
+        if response and 'data' in response:
+            return response['data']
+        return None
+
+    vault_paths = list(vault_paths)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(vault_paths, executor.map(read_data, vault_paths)))
+
+
+def write_vault_paths(vault_client, path_data_pairs, max_workers=4):
+    """Writes Vault paths concurrently
+
+    Args:
+        vault_client: A VaultClient, shared by all requests
+        path_data_pairs: list of (path, data dict) tuples to write
+        max_workers: Maximum concurrent requests
+
+    Returns:
+        A list of paths which failed to be written.
+    """
+    failed_paths = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        writes = {}
+        for vault_path, data in path_data_pairs:
+            writes[executor.submit(vault_client.write, vault_path, data)] = vault_path
+        for write in concurrent.futures.as_completed(writes):
+            vault_path = writes[write]
+            if write.exception():
+                logging.error("Failed to write {0}: {1}".format(
+                    vault_path, write.exception()))
+                failed_paths.append(vault_path)
+            else:
+                logging.info("Wrote {0}".format(vault_path))
+    return sorted(failed_paths)
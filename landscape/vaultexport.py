@@ -0,0 +1,253 @@
+import concurrent.futures
+import contextlib
+import gzip
+import io
+import json
+import logging
+import os
+
+from .backend import secrets_backend
+from .commandrunner import command_runner
+
+
+def export_vault(vault_prefix, export_path, max_workers=4, gpg_recipient=None):
+    """Streams every secret under a Vault prefix to a JSONL file
+
+    Each line is {"path": <Vault path>, "data": <secret data>}. The tree is
+    listed and read concurrently, with at most a few requests per worker
+    in flight, and each secret is written as soon as it's read, so memory
+    use doesn't grow with the size of the tree.
+
+    export_path ending in .gz is gzip-compressed. Ending in .gpg, it's
+    encrypted for gpg_recipient (e.g., secrets.jsonl.gz.gpg).
+
+    Args:
+        vault_prefix: The Vault path to export, e.g. /secret/landscape
+        export_path: The file to write. Created readable only by the
+            current user
+        max_workers: Maximum concurrent Vault requests
+        gpg_recipient: gpg key to encrypt for (required for .gpg)
+
+    Returns:
+        The number of secrets exported (int)
+    """
+    vault_client = secrets_backend()
+    vault_prefix = '/' + vault_prefix.strip('/')
+    exported = 0
+    with _open_export_stream(export_path, gpg_recipient) as export_stream:
+        for vault_path, vault_data in walk_vault(vault_client, vault_prefix,
+                                                 max_workers):
+            export_stream.write(json.dumps({'path': vault_path,
+                                            'data': vault_data},
+                                           sort_keys=True) + '\n')
+            exported += 1
+    logging.info("Exported {0} secrets under {1} to {2}".format(
+        exported, vault_prefix, export_path))
+    return exported
+
+
+def import_vault(import_path, max_workers=4, dry_run=False):
+    """Writes the secrets in an export_vault file into Vault
+
+    Lines are read as they're written to Vault, with at most a few writes
+    per worker in flight. Secrets whose data is already in Vault aren't
+    written.
+
+    Args:
+        import_path: File written by export_vault
+        max_workers: Maximum concurrent Vault requests
+        dry_run: Report which secrets would be written, without writing
+
+    Returns:
+        A tuple of (number written, number unchanged, list of failed paths).
+        Lines which aren't secrets fail as <import_path>:<line number>
+    """
+    vault_client = secrets_backend()
+
+    def import_secret(entry):
+        current = vault_client.read(entry['path'])
+        if current and current.get('data') == entry['data']:
+            return False
+        logging.info("Writing {0}".format(entry['path']))
+        if not dry_run:
+            vault_client.write(entry['path'], entry['data'])
+        return True
+
+    written = 0
+    unchanged = 0
+    failed_paths = []
+
+    def read_entries(import_stream):
+        """Parses each line once, before it's imported. Lines which aren't
+        secrets are reported, and skipped
+        """
+        for line_number, line in enumerate(import_stream, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                if not isinstance(entry, dict) or \
+                        not isinstance(entry.get('path'), str) or \
+                        not isinstance(entry.get('data'), dict):
+                    raise ValueError("expected path and data keys")
+            except ValueError as e:
+                logging.error("Line {0} of {1} isn't a secret: {2}".format(
+                    line_number, import_path, e))
+                failed_paths.append("{0}:{1}".format(import_path, line_number))
+                continue
+            yield entry
+
+    with _open_import_stream(import_path) as import_stream:
+        for entry, (changed, error) in bounded_map(import_secret,
+                                                   read_entries(import_stream),
+                                                   max_workers):
+            if error:
+                logging.error("Failed to write {0}: {1}".format(entry['path'], error))
+                failed_paths.append(entry['path'])
+            elif changed:
+                written += 1
+            else:
+                unchanged += 1
+    return written, unchanged, failed_paths
+
+
+def walk_vault(vault_client, vault_prefix, max_workers=4):
+    """Lists and reads every secret under a prefix, concurrently
+
+    Yields:
+        (Vault path, data dict) tuples, in the order they're read
+    """
+    def visit(vault_path, is_directory):
+        if is_directory:
+            listing = vault_client.list(vault_path)
+            if listing and 'data' in listing:
+                return 'list', listing['data']['keys']
+        response = vault_client.read(vault_path)
+        if response and 'data' in response:
+            return 'read', response['data']
+        return 'missing', None
+
+    max_in_flight = max_workers * 4
+    # the prefix itself may be a directory or a secret
+    pending_paths = [(vault_prefix, True)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+        while pending_paths or in_flight:
+            while pending_paths and len(in_flight) < max_in_flight:
+                vault_path, is_directory = pending_paths.pop()
+                in_flight[executor.submit(visit, vault_path, is_directory)] = vault_path
+            done, _ = concurrent.futures.wait(
+                in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                vault_path = in_flight.pop(future)
+                result_type, result = future.result()
+                if result_type == 'list':
+                    # Vault lists directories with a trailing slash
+                    pending_paths += [(vault_path + '/' + k.rstrip('/'), k.endswith('/'))
+                                      for k in result]
+                elif result_type == 'read':
+                    yield vault_path, result
+
+
+def bounded_map(fn, items, max_workers=4):
+    """Maps fn over items concurrently, with a bounded number in flight
+
+    Unlike Executor.map, items are consumed as results complete, so items
+    can be a stream of any length.
+
+    Yields:
+        (item, (result, exception)) tuples, in completion order
+    """
+    max_in_flight = max_workers * 4
+    items = iter(items)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+        exhausted = False
+        while not exhausted or in_flight:
+            while not exhausted and len(in_flight) < max_in_flight:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight[executor.submit(fn, item)] = item
+            if not in_flight:
+                break
+            done, _ = concurrent.futures.wait(
+                in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                if future.exception():
+                    yield item, (None, future.exception())
+                else:
+                    yield item, (future.result(), None)
+
+
+@contextlib.contextmanager
+def _open_export_stream(export_path, gpg_recipient):
+    """A text stream writing (and optionally compressing/encrypting) a file"""
+    gpg = None
+    if export_path.endswith('.gpg'):
+        if not gpg_recipient:
+            raise ValueError("Pass --gpg-recipient to encrypt {0}".format(export_path))
+        gpg = _start_gpg(['gpg', '--batch', '--yes', '--encrypt',
+                          '--recipient', gpg_recipient,
+                          '--output', export_path])
+        binary_stream = gpg.stdin
+    else:
+        export_fd = os.open(export_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                            0o600)
+        binary_stream = os.fdopen(export_fd, 'wb')
+    try:
+        if _is_gzipped(export_path):
+            compressed_stream = gzip.GzipFile(fileobj=binary_stream, mode='wb')
+            with io.TextIOWrapper(compressed_stream, encoding='utf-8') as text_stream:
+                yield text_stream
+        else:
+            with io.TextIOWrapper(binary_stream, encoding='utf-8') as text_stream:
+                yield text_stream
+    finally:
+        if not binary_stream.closed:
+            binary_stream.close()
+        if gpg and command_runner.finish(gpg).failed:
+            raise ChildProcessError("gpg failed to encrypt {0}".format(export_path))
+
+
+@contextlib.contextmanager
+def _open_import_stream(import_path):
+    """A text stream reading (and optionally decrypting/decompressing) a file"""
+    gpg = None
+    if import_path.endswith('.gpg'):
+        gpg = _start_gpg(['gpg', '--batch', '--decrypt', import_path])
+        binary_stream = gpg.stdout
+    else:
+        binary_stream = open(import_path, 'rb')
+    try:
+        if _is_gzipped(import_path):
+            decompressed_stream = gzip.GzipFile(fileobj=binary_stream, mode='rb')
+            with io.TextIOWrapper(decompressed_stream, encoding='utf-8') as text_stream:
+                yield text_stream
+        else:
+            with io.TextIOWrapper(binary_stream, encoding='utf-8') as text_stream:
+                yield text_stream
+    finally:
+        if not binary_stream.closed:
+            binary_stream.close()
+        if gpg and command_runner.finish(gpg).failed:
+            raise ChildProcessError("gpg failed to decrypt {0}".format(import_path))
+
+
+def _start_gpg(argv):
+    """Starts gpg through command_runner, which records it and kills it on
+    cancel_all()
+    """
+    gpg = command_runner.start(argv)
+    if gpg is None:
+        raise ChildProcessError("Could not run {0}".format(' '.join(argv[0:3])))
+    return gpg
+
+
+def _is_gzipped(path):
+    if path.endswith('.gpg'):
+        path = path[:-len('.gpg')]
+    return path.endswith('.gz')
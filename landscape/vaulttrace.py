@@ -0,0 +1,220 @@
+import json
+import logging
+import math
+import threading
+import time
+
+
+class VaultRequestTracer(object):
+    """Records every request VaultClient makes to Vault.
+
+    A single module-level instance (vault_request_tracer) is shared by all
+    VaultClient objects, so a whole landscape command can be summarized at
+    exit, regardless of how many clients were created along the way.
+
+    Attributes:
+        prefix_depth: Number of path components used to group requests
+    """
+
+    def __init__(self, prefix_depth=3):
+        self.prefix_depth = prefix_depth
+        self._records = []
+        self._lock = threading.Lock()
+
+
+    def trace(self, operation, vault_path, request_fn):
+        """Runs a Vault request, recording its latency and response size.
+
+        Args:
+            operation: Request type (list, read, write, dump)
+            vault_path: Vault path being requested
+            request_fn: Callable performing the request
+
+        Returns:
+            The return value of request_fn.
+
+        Raises:
+            Whatever request_fn raises. The failed request is still recorded.
+        """
+        started = time.time()
+        response = None
+        error = None
+        try:
+            response = request_fn()
+            return response
+        except Exception as e:
+            error = e.__class__.__name__
+            raise
+        finally:
+            finished = time.time()
+            self.record(operation, vault_path, started, finished,
+                        self._response_size(response), error)
+
+
+    def record(self, operation, vault_path, started, finished, nbytes,
+               error=None):
+        """Appends a single request record
+
+        Args:
+            operation: Request type (list, read, write, dump)
+            vault_path: Vault path being requested
+            started: Epoch time the request started
+            finished: Epoch time the request finished
+            nbytes: Size of the JSON-encoded response
+            error: Exception class name, if the request failed
+
+        Returns:
+            None.
+        """
+        entry = {
+            'operation': operation,
+            'path': vault_path,
+            'started': started,
+            'latency': finished - started,
+            'bytes': nbytes,
+            'error': error,
+        }
+        with self._lock:
+            self._records.append(entry)
+        logging.debug(" - vault {0} {1} took {2:.3f}s".format(
+            operation, vault_path, entry['latency']))
+
+
+    @property
+    def records(self):
+        """A copy of the requests recorded so far (list of dicts)"""
+        with self._lock:
+            return list(self._records)
+
+
+    def requests(self):
+        """Recorded requests to Vault, excluding dump_vault_from_prefix calls
+        which are made up of list and read requests themselves.
+        """
+        return [r for r in self.records if r['operation'] != 'dump']
+
+
+    def prefix_for_path(self, vault_path):
+        """Truncates a Vault path to prefix_depth components
+
+        e.g., /secret/landscape/charts/master/jenkins becomes
+        /secret/landscape/charts for a prefix_depth of 3
+        """
+        components = [c for c in vault_path.split('/') if c]
+        return '/' + '/'.join(components[0:self.prefix_depth])
+
+
+    def duplicate_reads(self):
+        """Paths read more than once
+
+        Returns:
+            A dict mapping Vault paths to the number of times they were read.
+        """
+        read_counts = {}
+        for entry in self.requests():
+            if entry['operation'] == 'read':
+                read_counts[entry['path']] = read_counts.get(entry['path'], 0) + 1
+        return {p: n for p, n in read_counts.items() if n > 1}
+
+
+    def summary(self):
+        """Generates a human-readable report of Vault requests
+
+        Returns:
+            A multi-line str containing per-prefix request counts, latency
+            percentiles, duplicate reads and total time spent in Vault.
+        """
+        entries = self.requests()
+        if not entries:
+            return 'Vault trace: no requests'
+
+        latencies = sorted([e['latency'] for e in entries])
+        total_time = sum(latencies)
+        total_bytes = sum([e['bytes'] for e in entries])
+        wall_start = min([e['started'] for e in entries])
+        wall_end = max([e['started'] + e['latency'] for e in entries])
+
+        lines = []
+        lines.append("Vault trace: {0} requests, {1} bytes, {2:.3f}s in Vault " \
+                     "({3:.3f}s wall)".format(len(entries), total_bytes,
+                                             total_time, wall_end - wall_start))
+        lines.append("  latency p50={0:.3f}s p95={1:.3f}s max={2:.3f}s".format(
+            percentile(latencies, 50),
+            percentile(latencies, 95),
+            latencies[-1]))
+
+        by_prefix = {}
+        for entry in entries:
+            prefix = self.prefix_for_path(entry['path'])
+            by_prefix.setdefault(prefix, []).append(entry)
+        lines.append('  requests per prefix:')
+        for prefix in sorted(by_prefix.keys()):
+            prefix_entries = by_prefix[prefix]
+            prefix_latencies = sorted([e['latency'] for e in prefix_entries])
+            op_counts = {}
+            for entry in prefix_entries:
+                op_counts[entry['operation']] = op_counts.get(entry['operation'], 0) + 1
+            ops = ' '.join(["{0}={1}".format(op, op_counts[op]) for op in sorted(op_counts)])
+            lines.append("    {0}: {1} ({2}) p50={3:.3f}s p95={4:.3f}s " \
+                         "total={5:.3f}s".format(prefix,
+                                                 len(prefix_entries),
+                                                 ops,
+                                                 percentile(prefix_latencies, 50),
+                                                 percentile(prefix_latencies, 95),
+                                                 sum(prefix_latencies)))
+
+        duplicates = self.duplicate_reads()
+        wasted_reads = sum(duplicates.values()) - len(duplicates)
+        lines.append("  duplicate reads: {0} paths, {1} redundant requests".format(
+            len(duplicates), wasted_reads))
+        for dup_path in sorted(duplicates, key=lambda p: -duplicates[p]):
+            lines.append("    {0}x {1}".format(duplicates[dup_path], dup_path))
+
+        errors = [e for e in entries if e['error']]
+        if errors:
+            lines.append("  failed requests: {0}".format(len(errors)))
+        return '\n'.join(lines)
+
+
+    def write_jsonl(self, jsonl_path):
+        """Writes one JSON object per recorded request (including dumps)
+
+        Args:
+            jsonl_path: File to write records to
+
+        Returns:
+            None.
+        """
+        with open(jsonl_path, 'w') as jsonl_file:
+            for entry in self.records:
+                jsonl_file.write(json.dumps(entry, sort_keys=True) + '\n')
+        logging.info("Wrote Vault trace to {0}".format(jsonl_path))
+
+
+    def _response_size(self, response):
+        if not response:
+            return 0
+        try:
+            return len(json.dumps(response))
+        except (TypeError, ValueError):
+            return 0
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already-sorted list
+
+    Args:
+        sorted_values: A sorted list of numbers
+        pct: The percentile to compute (0-100)
+
+    Returns:
+        The value at the requested percentile, or 0 for an empty list.
+    """
+    if not sorted_values:
+        return 0
+    rank = int(math.ceil(pct / 100.0 * len(sorted_values))) - 1
+    rank = max(0, min(rank, len(sorted_values) - 1))
+    return sorted_values[rank]
+
+
+vault_request_tracer = VaultRequestTracer()
@@ -0,0 +1,165 @@
+import concurrent.futures
+import copy
+import logging
+import threading
+
+from .backend import secrets_backend
+
+
+class VaultNode(object):
+    """A Vault path found by listing its parent. Its data is read on first use
+
+    Attributes:
+        path: The Vault path, e.g. /secret/landscape/clusters/minikube
+        name: The last component of the path, e.g. minikube
+    """
+
+    def __init__(self, tree, path):
+        self._tree = tree
+        self.path = path
+        self.name = path.rstrip('/').split('/')[-1]
+
+
+    def __repr__(self):
+        return "VaultNode({0})".format(self.path)
+
+
+    @property
+    def data(self):
+        """The node's data (dict), read from Vault once per run"""
+        return self._tree.read(self.path)
+
+
+    @property
+    def loaded(self):
+        """True if the node's data has been read"""
+        return self._tree.is_cached(self.path)
+
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+
+class VaultTree(object):
+    """A lazily-read view of Vault, shared by the whole run
+
+    Listing a prefix only lists it, returning a VaultNode for each subkey.
+    Leaf data is read when a node is first used, and cached, so a path is
+    read at most once however many times clouds and clusters are loaded.
+    prefetch() reads many nodes concurrently, for selections which need
+    their data.
+
+    Only use the tree for data which doesn't change during a run. Writes
+    (e.g., secrets overwrite-vault-with-lastpass) go to Vault directly.
+
+    Attributes:
+        max_workers: Maximum concurrent reads, for prefetch()
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._vault_client = None
+        self._lock = threading.Lock()
+        self._children = {}
+        self._data = {}
+        self._leaves = set()
+
+
+    @property
+    def vault_client(self):
+        """Backend client (see backend.secrets_backend), created on first use"""
+        with self._lock:
+            if self._vault_client is None:
+                self._vault_client = secrets_backend()
+            return self._vault_client
+
+
+    def children(self, vault_prefix):
+        """Lists a prefix, without reading its subkeys
+
+        Args:
+            vault_prefix: The Vault path to list
+
+        Returns:
+            A list of VaultNodes, sorted by name
+        """
+        vault_prefix = vault_prefix.rstrip('/')
+        with self._lock:
+            if vault_prefix in self._children:
+                return self._children[vault_prefix]
+        listing = self.vault_client.list(vault_prefix)
+        subkeys = []
+        if listing and 'data' in listing:
+            subkeys = listing['data']['keys']
+        nodes = []
+        leaves = []
+        for subkey in sorted(subkeys):
+            node_path = vault_prefix + '/' + subkey.rstrip('/')
+            nodes.append(VaultNode(self, node_path))
+            # Vault lists directories with a trailing slash
+            if not subkey.endswith('/'):
+                leaves.append(node_path)
+        with self._lock:
+            self._leaves.update(leaves)
+            self._children[vault_prefix] = nodes
+        return nodes
+
+
+    def node(self, vault_path):
+        """A VaultNode for a path, e.g. a cloud or cluster loaded by name"""
+        return VaultNode(self, vault_path.rstrip('/'))
+
+
+    def read(self, vault_path):
+        """Data at a Vault path, read once per run
+
+        Paths listed as leaves are read with a single request. Other paths
+        are dumped (see VaultClient.dump_vault_from_prefix).
+
+        Returns:
+            A copy of the data (dict), safe to modify
+        """
+        vault_path = vault_path.rstrip('/')
+        with self._lock:
+            if vault_path in self._data:
+                return copy.deepcopy(self._data[vault_path])
+            is_leaf = vault_path in self._leaves
+        if is_leaf:
+            vault_data = self.vault_client.get_vault_data(vault_path)
+        else:
+            vault_data = self.vault_client.dump_vault_from_prefix(
+                vault_path, strip_root_key=True)
+        with self._lock:
+            self._data[vault_path] = vault_data
+        return copy.deepcopy(vault_data)
+
+
+    def is_cached(self, vault_path):
+        """True if a path's data has been read"""
+        with self._lock:
+            return vault_path.rstrip('/') in self._data
+
+
+    def prefetch(self, nodes):
+        """Reads the data of many nodes concurrently
+
+        Args:
+            nodes: VaultNodes. Nodes already read are skipped
+
+        Returns:
+            None.
+        """
+        unread_paths = [n.path for n in nodes if not n.loaded]
+        if not unread_paths:
+            return
+        logging.debug("Prefetching {0} Vault paths".format(len(unread_paths)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # list() re-raises the first failure
+            list(executor.map(self.read, unread_paths))
+
+
+vault_tree = VaultTree()